@@ -0,0 +1,286 @@
+"""
+On-disk archive of historical bars, partitioned by symbol, timeframe and
+month:
+
+    ARCHIVE_DIR/<SYMBOL>/<TF>/<YYYY-MM>/{ts,open,high,low,close,volume}.npy
+
+Each partition stores one plain .npy file per column (ts as int64 ns since
+epoch UTC, OHLCV as float64), sorted by ts with no duplicates. Reads open
+the files with mmap_mode="r", so slicing a range touches only the pages it
+needs and a range inside one month comes back as views of the mapped
+files, without parsing or copying.
+
+Open maps and directory listings are cached per BarArchive and revalidated
+with one stat, so repeated range reads do not reopen files.
+
+Partitions are rewritten whole (old bars merged with new, new wins) into a
+temporary directory and swapped in, so an interrupted ingest leaves either
+the old or the new month on disk.
+
+Ingest from local dumps (CSV, pickle or Parquet -- the latter needs
+pyarrow) or from the Alpaca API:
+
+    python archive.py ingest BTC/USD 1Hour dump_1h.csv [more.parquet ...]
+    python archive.py download BTC/USD 1Hour 2021-01-01 [2024-01-01]
+    python archive.py info BTC/USD 1Hour
+"""
+import argparse
+import os
+import shutil
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from alpaca.data.timeframe import TimeFrame, TimeFrameUnit
+from config import ARCHIVE_DIR, IS_CRYPTO
+
+COLUMNS = ("open", "high", "low", "close", "volume")
+_UNITS = {u.value: u for u in TimeFrameUnit}
+
+
+def tf_key(tf: TimeFrame | str) -> str:
+    """
+    Directory name of a timeframe ("1Hour", "4Hour", "15Min", ...).
+    """
+    return getattr(tf, "value", tf)
+
+
+def parse_tf(key: str) -> TimeFrame:
+    for name, unit in _UNITS.items():
+        if key.endswith(name) and key[:-len(name)].isdigit():
+            return TimeFrame(amount=int(key[:-len(name)]), unit=unit)
+    raise ValueError(f"unknown timeframe {key!r} (e.g. 1Hour, 4Hour, 15Min)")
+
+
+def _ns(ts) -> int:
+    ts = pd.Timestamp(ts)
+    ts = ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+    return ts.as_unit("ns").value
+
+
+def _month(ns: int) -> str:
+    return pd.Timestamp(ns, tz="UTC").strftime("%Y-%m")
+
+
+class BarArchive:
+    def __init__(self, root: Path | str = ARCHIVE_DIR):
+        self.root = Path(root)
+        self._months: dict[Path, tuple[int, list[str]]] = {}
+        self._maps: dict[Path, tuple[int, dict]] = {}
+
+    def _dir(self, symbol: str, tf) -> Path:
+        return self.root / symbol.replace("/", "") / tf_key(tf)
+
+    def partitions(self, symbol: str, tf) -> list[str]:
+        """
+        Months on disk for a series, oldest first ("YYYY-MM").
+        """
+        base = self._dir(symbol, tf)
+        try:
+            mtime = base.stat().st_mtime_ns  # changes on every swap
+        except FileNotFoundError:
+            return []
+        hit = self._months.get(base)
+        if hit is None or hit[0] != mtime:
+            months = sorted(p.name for p in base.iterdir()
+                            if not p.name.startswith(".")
+                            and (p / "ts.npy").exists())
+            hit = self._months[base] = (mtime, months)
+        return hit[1]
+
+    def _load(self, symbol: str, tf, month: str) -> dict[str, np.ndarray]:
+        part = self._dir(symbol, tf) / month
+        mtime = (part / "ts.npy").stat().st_mtime_ns
+        hit = self._maps.get(part)
+        if hit is None or hit[0] != mtime:
+            cols = {c: np.load(part / f"{c}.npy", mmap_mode="r")
+                    for c in ("ts",) + COLUMNS}
+            hit = self._maps[part] = (mtime, cols)
+        return hit[1]
+
+    # ---- writes ----
+
+    def _write_partition(self, symbol: str, tf, month: str,
+                         cols: dict[str, np.ndarray]):
+        part = self._dir(symbol, tf) / month
+        tmp = part.with_name(f".{month}.tmp")
+        old = part.with_name(f".{month}.old")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        for c, arr in cols.items():
+            np.save(tmp / f"{c}.npy", arr)
+        self._maps.pop(part, None)
+        if part.exists():
+            os.replace(part, old)
+        os.replace(tmp, part)
+        shutil.rmtree(old, ignore_errors=True)
+
+    def write(self, symbol: str, tf, df: pd.DataFrame) -> int:
+        """
+        Merge an OHLCV frame (UTC DatetimeIndex) into the archive; bars
+        already stored at the same timestamps are replaced. Returns the
+        number of bars written.
+        """
+        if df.empty:
+            return 0
+        df = df[~df.index.duplicated(keep="last")].sort_index()
+        ts = df.index.as_unit("ns").asi8
+        months = df.index.strftime("%Y-%m").to_numpy()
+        for month in pd.unique(months):
+            sel = months == month
+            new = {"ts": ts[sel]}
+            new.update({c: df[c].to_numpy(np.float64)[sel] for c in COLUMNS})
+            if (self._dir(symbol, tf) / month / "ts.npy").exists():
+                old = self._load(symbol, tf, month)
+                keep = ~np.isin(old["ts"], new["ts"])
+                merged = {c: np.concatenate([old[c][keep], new[c]])
+                          for c in new}
+                order = np.argsort(merged["ts"], kind="stable")
+                new = {c: a[order] for c, a in merged.items()}
+            self._write_partition(symbol, tf, month, new)
+        return len(df)
+
+    # ---- reads ----
+
+    def arrays(self, symbol: str, tf, start=None,
+               end=None) -> dict[str, np.ndarray]:
+        """
+        {"ts", "open", ..., "volume"} for bars with start <= ts < end.
+        Within a single month these are read-only views of the mapped
+        files; spanning months concatenates the slices.
+        """
+        lo = None if start is None else _ns(start)
+        hi = None if end is None else _ns(end)
+        months = self.partitions(symbol, tf)
+        if lo is not None:
+            first = _month(lo)
+            months = [m for m in months if m >= first]
+        if hi is not None:
+            last = _month(hi)
+            months = [m for m in months if m <= last]
+        pieces = []
+        for month in months:
+            cols = self._load(symbol, tf, month)
+            ts = cols["ts"]
+            i = 0 if lo is None else int(np.searchsorted(ts, lo, "left"))
+            j = len(ts) if hi is None else int(np.searchsorted(ts, hi, "left"))
+            if j > i:
+                pieces.append({c: a[i:j] for c, a in cols.items()})
+        if not pieces:
+            return {"ts": np.empty(0, np.int64),
+                    **{c: np.empty(0) for c in COLUMNS}}
+        if len(pieces) == 1:
+            return pieces[0]
+        return {c: np.concatenate([p[c] for p in pieces]) for c in pieces[0]}
+
+    def read(self, symbol: str, tf, start=None, end=None) -> pd.DataFrame:
+        """
+        Same bars as a fetch_bars-style frame (lower-case OHLCV, UTC index).
+        """
+        cols = self.arrays(symbol, tf, start, end)
+        index = pd.DatetimeIndex(pd.to_datetime(cols["ts"], utc=True),
+                                 name="timestamp")
+        return pd.DataFrame({c: cols[c] for c in COLUMNS}, index=index)
+
+    def span(self, symbol: str, tf) -> tuple[pd.Timestamp, pd.Timestamp] | None:
+        """
+        (first, last) bar timestamps stored for a series.
+        """
+        months = self.partitions(symbol, tf)
+        if not months:
+            return None
+        first = self._load(symbol, tf, months[0])["ts"]
+        last = self._load(symbol, tf, months[-1])["ts"]
+        return (pd.Timestamp(int(first[0]), tz="UTC"),
+                pd.Timestamp(int(last[-1]), tz="UTC"))
+
+
+# ---- ingestion ----
+
+def read_dump(path: str, symbol: str) -> pd.DataFrame:
+    """
+    A local bar dump as an OHLCV frame: CSV/pickle as backtest reads them,
+    or Parquet (pyarrow/fastparquet required), including raw Alpaca `.df`
+    frames indexed by (symbol, timestamp).
+    """
+    from backtest import _read_bars
+    from data import _normalize_bars
+    df = _read_bars(str(path))
+    if not isinstance(df.index, (pd.MultiIndex, pd.DatetimeIndex)):
+        df.index = pd.to_datetime(df.index, utc=True)
+    return _normalize_bars(df, symbol).sort_index()
+
+
+def ingest_files(archive: BarArchive, symbol: str, tf,
+                 paths: list[str]) -> int:
+    n = 0
+    for path in paths:
+        n += archive.write(symbol, tf, read_dump(path, symbol))
+    return n
+
+
+def download(archive: BarArchive, symbol: str, tf: TimeFrame,
+             start: datetime, end: datetime | None = None,
+             is_crypto: bool = IS_CRYPTO, chunk_days: int = 31,
+             resume: bool = True, client=None) -> int:
+    """
+    Pull [start, end) from the API in `chunk_days` requests, writing each
+    chunk as it arrives. With `resume`, starts from the newest archived
+    bar instead (re-fetching it, in case it was still forming).
+    """
+    from data import fetch_bars
+    end = end or datetime.now(timezone.utc)
+    if resume:
+        have = archive.span(symbol, tf)
+        if have is not None and have[1] > start:
+            start = have[1].to_pydatetime()
+    n = 0
+    while start < end:
+        stop = min(start + timedelta(days=chunk_days), end)
+        df = fetch_bars(symbol, tf, 0, is_crypto, start=start, end=stop,
+                        client=client)
+        n += archive.write(symbol, tf, df)
+        start = stop
+    return n
+
+
+def _utc(s: str) -> datetime:
+    return pd.Timestamp(s, tz="UTC").to_pydatetime()
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Partitioned bar archive.")
+    p.add_argument("--root", default=str(ARCHIVE_DIR))
+    sub = p.add_subparsers(dest="cmd", required=True)
+    ing = sub.add_parser("ingest", help="merge local CSV/pickle/Parquet dumps")
+    ing.add_argument("symbol")
+    ing.add_argument("tf")
+    ing.add_argument("paths", nargs="+")
+    dl = sub.add_parser("download", help="fetch a date range from the API")
+    dl.add_argument("symbol")
+    dl.add_argument("tf")
+    dl.add_argument("start")
+    dl.add_argument("end", nargs="?")
+    dl.add_argument("--no-resume", action="store_true")
+    info = sub.add_parser("info", help="show stored months and bar range")
+    info.add_argument("symbol")
+    info.add_argument("tf")
+    args = p.parse_args()
+
+    archive = BarArchive(args.root)
+    tf = parse_tf(args.tf)
+    if args.cmd == "ingest":
+        n = ingest_files(archive, args.symbol, tf, args.paths)
+        print(f"ingested {n} bars")
+    elif args.cmd == "download":
+        n = download(archive, args.symbol, tf, _utc(args.start),
+                     _utc(args.end) if args.end else None,
+                     resume=not args.no_resume)
+        print(f"downloaded {n} bars")
+    months = archive.partitions(args.symbol, tf)
+    span = archive.span(args.symbol, tf)
+    if span is None:
+        print(f"{args.symbol} {tf_key(tf)}: empty")
+    else:
+        print(f"{args.symbol} {tf_key(tf)}: {len(months)} months, "
+              f"{span[0]} .. {span[1]}")
@@ -0,0 +1,218 @@
+"""
+Vectorized backtester for the live strategy.
+
+Signals come from the same strategy.compute_signals the bot trades on.
+Trades are then simulated the way main.process_signals executes them:
+
+- entry at the close of a bar whose entry_dir != 0, skipped when
+  ATR/close exceeds the volatility cap or the size rounds to zero
+- size = atr_position_size(equity, ATR, close) * CMO multiplier, capped
+  at MAX_QTY, with equity compounding on realized PnL
+- bracket exits at TP=3*ATR / SL=ATR_TRAIL_MULT*ATR (broker.bracket_prices);
+  if both are touched in one bar the stop is assumed to fill first, and a
+  bar opening through a level fills at the open
+- an opposite signal flattens at that bar's close and reverses
+
+Unlike the live loop, a same-direction signal while a trade is open does
+not stack a second bracket: one position is held at a time.
+
+Exit detection is a NumPy scan over forward windows per trade, so the cost
+is dominated by compute_signals itself.
+"""
+import sys
+from dataclasses import dataclass, field
+import numpy as np
+import pandas as pd
+from config import (
+    BASE_EQUITY, ATR_TRAIL_MULT, VOL_SPIKE_CAP, CMO_SIZE_FLOOR, MAX_QTY,
+    CMO_THRESHOLD, ADX_THRESHOLD
+)
+from broker import atr_position_size, bracket_prices, cmo_size_multiplier
+from strategy import compute_signals
+
+_SCAN_CHUNK = 256
+
+
+@dataclass
+class BacktestResult:
+    trades: pd.DataFrame
+    equity: pd.Series
+    stats: dict = field(default_factory=dict)
+
+    def summary(self) -> str:
+        return " ".join(f"{k}={v:.4g}" if isinstance(v, float) else
+                        f"{k}={v}" for k, v in self.stats.items())
+
+
+def _find_exit(i: int, side: int, tp: float, sl: float,
+               opn, high, low, entry_dir):
+    """
+    First bar after `i` where the bracket or an opposite signal closes the
+    trade. Returns (bar index, exit price or None for close, reason).
+    """
+    n = len(high)
+    start = i + 1
+    while start < n:
+        stop = min(n, start + _SCAN_CHUNK)
+        h = high[start:stop]
+        lo = low[start:stop]
+        if side == 1:
+            sl_hit = lo <= sl
+            tp_hit = h >= tp
+        else:
+            sl_hit = h >= sl
+            tp_hit = lo <= tp
+        opp = entry_dir[start:stop] == -side
+        any_hit = sl_hit | tp_hit | opp
+        if any_hit.any():
+            k = int(np.argmax(any_hit))
+            j = start + k
+            o = opn[j]
+            if sl_hit[k]:
+                gap = (o <= sl) if side == 1 else (o >= sl)
+                return j, (o if gap else sl), "stop"
+            if tp_hit[k]:
+                gap = (o >= tp) if side == 1 else (o <= tp)
+                return j, (o if gap else tp), "target"
+            return j, None, "reverse"
+        start = stop
+    return n - 1, None, "end"
+
+
+def simulate(index: pd.Index,
+             opn: np.ndarray,
+             high: np.ndarray,
+             low: np.ndarray,
+             close: np.ndarray,
+             atr: np.ndarray,
+             cmo_prev: np.ndarray,
+             entry_dir: np.ndarray,
+             equity: float = BASE_EQUITY,
+             atr_trail_mult: float = ATR_TRAIL_MULT,
+             vol_spike_cap: float = VOL_SPIKE_CAP,
+             cmo_size_floor: float = CMO_SIZE_FLOOR,
+             cmo_threshold: float = CMO_THRESHOLD) -> BacktestResult:
+    """
+    Core simulation over plain arrays (shared with the parameter sweep).
+    """
+    start_equity = float(equity)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        tradable = (entry_dir != 0) & (atr / close <= vol_spike_cap) & \
+            np.isfinite(atr)
+    candidates = np.flatnonzero(tradable)
+
+    rows = []
+    pnl_at = np.zeros(len(close))
+    pos = 0
+    while pos < len(candidates):
+        i = int(candidates[pos])
+        side = int(entry_dir[i])
+        base_qty = atr_position_size(equity, float(atr[i]), float(close[i]))
+        mult = cmo_size_multiplier(float(cmo_prev[i]), cmo_size_floor,
+                                   cmo_threshold)
+        qty = min(base_qty * mult, MAX_QTY)
+        if qty <= 0:
+            pos += 1
+            continue
+
+        entry = float(close[i])
+        tp, sl = bracket_prices(side, entry, float(atr[i]), atr_trail_mult)
+        j, price, reason = _find_exit(i, side, tp, sl,
+                                      opn, high, low, entry_dir)
+        exit_price = float(close[j]) if price is None else float(price)
+        pnl = side * qty * (exit_price - entry)
+        equity += pnl
+        pnl_at[j] += pnl
+        rows.append((index[i], index[j], side, qty, entry,
+                     exit_price, reason, pnl))
+
+        if reason == "end":
+            break
+        # next entry: first candidate at/after the exit bar (a reversal or
+        # a fresh signal on the bar that stopped us out)
+        pos = int(np.searchsorted(candidates, j, side="left"))
+
+    trades = pd.DataFrame(rows, columns=[
+        "entry_ts", "exit_ts", "side", "qty", "entry_price",
+        "exit_price", "reason", "pnl"
+    ])
+    curve = pd.Series(start_equity + np.cumsum(pnl_at), index=index,
+                      name="equity")
+    return BacktestResult(trades, curve, _stats(trades, curve, start_equity))
+
+
+def _stats(trades: pd.DataFrame, curve: pd.Series,
+           start_equity: float) -> dict:
+    peak = np.maximum.accumulate(curve.to_numpy()) if len(curve) else \
+        np.array([start_equity])
+    dd = (peak - curve.to_numpy()) / peak if len(curve) else np.array([0.0])
+    pnl = trades["pnl"].to_numpy()
+    gains = pnl[pnl > 0].sum()
+    losses = -pnl[pnl < 0].sum()
+    end_equity = float(curve.iloc[-1]) if len(curve) else start_equity
+    return {
+        "trades": int(len(trades)),
+        "total_pnl": float(pnl.sum()),
+        "return_pct": (end_equity / start_equity - 1.0) * 100.0,
+        "max_drawdown_pct": float(dd.max()) * 100.0,
+        "win_rate": float((pnl > 0).mean()) if len(pnl) else 0.0,
+        "profit_factor": float(gains / losses) if losses > 0 else
+        (float("inf") if gains > 0 else 0.0),
+    }
+
+
+def backtest_signals(sig: pd.DataFrame, **kwargs) -> BacktestResult:
+    """
+    Simulate trades on a compute_signals frame.
+    """
+    return simulate(
+        sig.index,
+        sig["open"].to_numpy(dtype=np.float64),
+        sig["high"].to_numpy(dtype=np.float64),
+        sig["low"].to_numpy(dtype=np.float64),
+        sig["close"].to_numpy(dtype=np.float64),
+        sig["ATR"].to_numpy(dtype=np.float64),
+        sig["CMO_prev"].fillna(0.0).to_numpy(dtype=np.float64),
+        sig["entry_dir"].to_numpy(dtype=np.int64),
+        **kwargs,
+    )
+
+
+def run_backtest(df_1h: pd.DataFrame, df_4h: pd.DataFrame,
+                 adx_threshold: float = ADX_THRESHOLD,
+                 cmo_threshold: float = CMO_THRESHOLD,
+                 **kwargs) -> BacktestResult:
+    """
+    compute_signals + simulate over full 1h/4h histories.
+    """
+    sig = compute_signals(df_1h, df_4h, adx_threshold, cmo_threshold)
+    return backtest_signals(sig, cmo_threshold=cmo_threshold, **kwargs)
+
+
+def _read_bars(path: str) -> pd.DataFrame:
+    if path.endswith(".pkl"):
+        df = pd.read_pickle(path)
+    elif path.endswith(".parquet"):
+        df = pd.read_parquet(path)  # needs pyarrow or fastparquet
+    else:
+        df = pd.read_csv(path, index_col=0)
+        df.index = pd.to_datetime(df.index, utc=True)
+    return df.rename(columns=str.lower).sort_index()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "--archive":
+        # python backtest.py --archive SYMBOL [START [END]]
+        from archive import BarArchive
+        arc, rng = BarArchive(), sys.argv[3:5]
+        bars = [arc.read(sys.argv[2], tf, *rng) for tf in ("1Hour", "4Hour")]
+    elif len(sys.argv) == 3:
+        bars = [_read_bars(sys.argv[1]), _read_bars(sys.argv[2])]
+    else:
+        print("usage: python backtest.py BARS_1H.(csv|pkl|parquet) BARS_4H.(...)\n"
+              "       python backtest.py --archive SYMBOL [START [END]]")
+        sys.exit(2)
+    res = run_backtest(*bars)
+    print(res.summary())
+    if not res.trades.empty:
+        print(res.trades.tail(20).to_string(index=False))
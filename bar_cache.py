@@ -0,0 +1,187 @@
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import pandas as pd
+from alpaca.data.timeframe import TimeFrame
+from config import BAR_CACHE_DIR, BAR_CACHE_OVERLAP, USE_ARCHIVE
+from data import fetch_bars, fetch_bars_multi, lookback_days
+
+_UNIT_DELTAS = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1),
+}
+
+
+def tf_delta(tf: TimeFrame) -> timedelta:
+    """
+    Duration of one bar of `tf` (months are approximated as 30 days).
+    """
+    unit = _UNIT_DELTAS.get(tf.unit.name.lower(), timedelta(days=30))
+    return unit * tf.amount
+
+
+def _cache_path(cache_dir: Path, symbol: str, tf: TimeFrame) -> Path:
+    safe = symbol.replace("/", "")
+    return cache_dir / f"{safe}_{tf.value}.pkl"
+
+
+class BarCache:
+    """
+    Per symbol/timeframe OHLCV store.
+
+    The first call for a series does a full lookback download; after that
+    each call only requests bars from the last cached timestamp onwards
+    (minus `overlap` bars, so a revised last bar overwrites the stale one),
+    merges them in and trims the frame to the same window `fetch_bars`
+    would have returned. A gap longer than the lookback window falls back
+    to a full download.
+
+    `client` may be any object exposing get_crypto_bars/get_stock_bars,
+    which lets the cache run against a local fake historical client.
+    With an `archive` (archive.BarArchive), a series with nothing cached
+    yet starts from the archived bars in the window, so a cold start only
+    downloads what is newer than the archive.
+    """
+
+    def __init__(self,
+                 cache_dir: Path | None = BAR_CACHE_DIR,
+                 client=None,
+                 overlap: int = BAR_CACHE_OVERLAP,
+                 archive=None):
+        self.cache_dir = cache_dir
+        self.client = client
+        self.overlap = max(1, int(overlap))
+        self.archive = archive
+        self._frames: dict[tuple[str, str], pd.DataFrame] = {}
+
+    def _load(self, symbol: str, tf: TimeFrame,
+              window_start: datetime | None = None) -> pd.DataFrame:
+        key = (symbol, tf.value)
+        df = self._frames.get(key)
+        if df is None and self.cache_dir is not None:
+            path = _cache_path(self.cache_dir, symbol, tf)
+            if path.exists():
+                try:
+                    df = pd.read_pickle(path)
+                except Exception as e:
+                    print(f"[bar_cache] Ignoring unreadable {path.name}: {e}")
+                    df = None
+        if df is None and self.archive is not None:
+            df = self.archive.read(symbol, tf, start=window_start)
+        return df if df is not None else pd.DataFrame()
+
+    def _store(self, symbol: str, tf: TimeFrame, df: pd.DataFrame):
+        self._frames[(symbol, tf.value)] = df
+        if self.cache_dir is None:
+            return
+        # write-then-rename so a crash never leaves a torn cache file
+        path = _cache_path(self.cache_dir, symbol, tf)
+        tmp = path.with_suffix(".tmp")
+        df.to_pickle(tmp)
+        os.replace(tmp, path)
+
+    def _since(self, cached: pd.DataFrame, window_start: datetime):
+        """
+        Where an incremental request should start, or None when the cached
+        series is missing/too old and needs a full download.
+        """
+        if cached.empty or cached.index[-1] < window_start:
+            return None
+        # Re-request the trailing `overlap` bars so revisions of the
+        # last (possibly still forming) bar replace the cached values;
+        # anything missing between then and now is backfilled too.
+        return cached.index[max(0, len(cached) - self.overlap)]
+
+    def _merge(self, symbol: str, tf: TimeFrame, cached: pd.DataFrame,
+               fresh: pd.DataFrame, window_start: datetime) -> pd.DataFrame:
+        if fresh.empty:
+            merged = cached
+        elif cached.empty:
+            merged = fresh
+        else:
+            merged = pd.concat([cached, fresh])
+            merged = merged[~merged.index.duplicated(keep="last")]
+            merged = merged.sort_index()
+        if merged.empty:
+            return merged
+        merged = merged[merged.index >= window_start]
+        self._store(symbol, tf, merged)
+        return merged.copy()
+
+    def get(self,
+            symbol: str,
+            tf: TimeFrame,
+            lookback: int,
+            is_crypto: bool,
+            now: datetime | None = None) -> pd.DataFrame:
+        """
+        Return the same frame `fetch_bars(symbol, tf, lookback, is_crypto)`
+        would, downloading only the bars not already cached.
+        """
+        now = now or datetime.now(timezone.utc)
+        window_start = now - timedelta(days=lookback_days(tf, lookback))
+        cached = self._load(symbol, tf, window_start)
+        since = self._since(cached, window_start)
+        start = window_start if since is None else since.to_pydatetime()
+        fresh = fetch_bars(symbol, tf, lookback, is_crypto,
+                           start=start, end=now, client=self.client)
+        return self._merge(symbol, tf, cached, fresh, window_start)
+
+    def get_many(self,
+                 symbols: list[str],
+                 tf: TimeFrame,
+                 lookback: int,
+                 is_crypto: bool,
+                 now: datetime | None = None) -> dict[str, pd.DataFrame]:
+        """
+        Multi-symbol `get` issuing one batched request that starts at the
+        oldest bar any of the symbols still needs.
+        """
+        now = now or datetime.now(timezone.utc)
+        window_start = now - timedelta(days=lookback_days(tf, lookback))
+        cached = {s: self._load(s, tf, window_start) for s in symbols}
+        starts = []
+        for s in symbols:
+            since = self._since(cached[s], window_start)
+            starts.append(window_start if since is None
+                          else since.to_pydatetime())
+        fresh = fetch_bars_multi(symbols, tf, lookback, is_crypto,
+                                 start=min(starts), end=now,
+                                 client=self.client)
+        return {
+            s: self._merge(s, tf, cached[s], fresh[s], window_start)
+            for s in symbols
+        }
+
+    def clear(self, symbol: str | None = None):
+        """
+        Drop cached series (all, or only those of `symbol`).
+        """
+        for key in list(self._frames):
+            if symbol is None or key[0] == symbol:
+                del self._frames[key]
+        if self.cache_dir is None:
+            return
+        pattern = "*.pkl" if symbol is None else \
+            f"{symbol.replace('/', '')}_*.pkl"
+        for path in self.cache_dir.glob(pattern):
+            path.unlink(missing_ok=True)
+
+
+_default_cache: BarCache | None = None
+
+
+def get_bar_cache() -> BarCache:
+    """
+    Process-wide cache used by data.get_1h_and_4h.
+    """
+    global _default_cache
+    if _default_cache is None:
+        archive = None
+        if USE_ARCHIVE:
+            from archive import BarArchive
+            archive = BarArchive()
+        _default_cache = BarCache(archive=archive)
+    return _default_cache
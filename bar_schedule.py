@@ -0,0 +1,82 @@
+"""
+Bar-close scheduling for the polling loops.
+
+The strategy acts once per 1h bar, on the first poll that sees a new bar
+label. Rather than re-fetching history and rebuilding every signal each
+POLL_SECONDS, the loops sleep until the next bar boundary, confirm with a
+one-request latest-bar probe that the new bar is visible, and only then do
+the full fetch + compute. If the bar is late (no trades yet) the probe is
+retried every PROBE_RETRY_SECONDS for PROBE_WINDOW_SECONDS, then at the
+old POLL_SECONDS cadence until it shows up.
+
+SCHEDULE = "fixed" restores the plain POLL_SECONDS loop.
+"""
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+from config import (
+    IS_CRYPTO, POLL_SECONDS, SCHEDULE, BAR_CLOSE_DELAY_SECONDS,
+    PROBE_RETRY_SECONDS, PROBE_WINDOW_SECONDS
+)
+
+BAR = timedelta(hours=1)
+
+
+def bar_label(now: datetime, period: timedelta = BAR) -> pd.Timestamp:
+    """
+    Start label of the bar containing `now` (Alpaca labels bars by start).
+    """
+    return pd.Timestamp(now).tz_convert("UTC").floor(period)
+
+
+def next_bar_open(now: datetime, period: timedelta = BAR) -> pd.Timestamp:
+    return bar_label(now, period) + period
+
+
+def is_new_bar(label: pd.Timestamp, last_processed_iso: str | None) -> bool:
+    return last_processed_iso is None or label.isoformat() > last_processed_iso
+
+
+def symbols_with_new_bar(symbols: list[str], last_processed: dict,
+                         period: timedelta = BAR,
+                         is_crypto: bool = IS_CRYPTO) -> list[str]:
+    """
+    The symbols whose latest minute bar falls in a bar newer than the one
+    last processed. A failed probe returns every symbol so the caller
+    falls back to the full fetch.
+    """
+    from data import latest_bar_ts
+    try:
+        latest = latest_bar_ts(symbols, is_crypto)
+    except Exception:
+        return list(symbols)
+    return [s for s in symbols
+            if s not in latest or
+            is_new_bar(bar_label(latest[s], period), last_processed.get(s))]
+
+
+def has_new_bar(symbol: str, last_processed_iso: str | None,
+                period: timedelta = BAR) -> bool:
+    return bool(symbols_with_new_bar([symbol], {symbol: last_processed_iso},
+                                     period))
+
+
+def seconds_to_next_poll(last_processed: list[str | None],
+                         now: datetime | None = None,
+                         period: timedelta = BAR) -> float:
+    """
+    How long to sleep after a poll, given the last processed bar of each
+    symbol: until the next bar opens (+BAR_CLOSE_DELAY_SECONDS) when all
+    are current, otherwise a short re-probe.
+    """
+    if SCHEDULE != "bar_close":
+        return POLL_SECONDS
+    now = now or datetime.now(timezone.utc)
+    label = bar_label(now, period)
+    until_next = (next_bar_open(now, period) - pd.Timestamp(now)
+                  ).total_seconds() + BAR_CLOSE_DELAY_SECONDS
+    if not any(is_new_bar(label, last) for last in last_processed):
+        return until_next
+    since_open = (pd.Timestamp(now) - label).total_seconds()
+    retry = PROBE_RETRY_SECONDS if since_open < PROBE_WINDOW_SECONDS \
+        else POLL_SECONDS
+    return max(0.0, min(retry, until_next))
@@ -0,0 +1,126 @@
+"""
+Pooled vs. per-call Alpaca data clients against a local HTTP stub.
+
+The stub speaks the /v1beta3/crypto/us/bars API with HTTP/1.1 keep-alive,
+adds a fixed connection-setup delay (standing in for the TCP + TLS
+handshake to data.alpaca.markets) and a per-request server delay (round
+trip), then reports per-poll latency and connections opened for three
+patterns:
+
+  fresh   new client per fetch, 1h then 4h (the old fetch_bars behaviour)
+  pooled  clients.get_data_client reused, 1h then 4h
+  pooled+ reused client, 1h and 4h concurrently (data.get_1h_and_4h)
+
+    python benchmarks/bench_clients.py --handshake-ms 40 --rtt-ms 30
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from alpaca.data.historical import CryptoHistoricalDataClient  # noqa: E402
+from alpaca.data.timeframe import TimeFrame, TimeFrameUnit  # noqa: E402
+import clients  # noqa: E402
+from data import fetch_bars  # noqa: E402
+
+SYMBOL = "BTC/USD"
+
+
+def _payload(n: int) -> bytes:
+    t0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    bars = [{
+        "t": (t0 + timedelta(hours=i)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "o": 100.0 + i, "h": 101.0 + i, "l": 99.0 + i, "c": 100.5 + i,
+        "v": 1.0, "n": 1, "vw": 100.2 + i,
+    } for i in range(n)]
+    return json.dumps({"bars": {SYMBOL: bars},
+                       "next_page_token": None}).encode()
+
+
+def start_stub(handshake_s: float, rtt_s: float, n_bars: int = 450):
+    body = _payload(n_bars)
+    stats = {"connections": 0, "requests": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"   # keep-alive
+        disable_nagle_algorithm = True  # no 40ms delayed-ACK stalls
+
+        def setup(self):
+            super().setup()
+            with lock:
+                stats["connections"] += 1
+            time.sleep(handshake_s)     # connection establishment cost
+
+        def do_GET(self):
+            with lock:
+                stats["requests"] += 1
+            time.sleep(rtt_s)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stats
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--handshake-ms", type=float, default=40.0)
+    ap.add_argument("--rtt-ms", type=float, default=30.0)
+    ap.add_argument("--rounds", type=int, default=20)
+    args = ap.parse_args()
+
+    server, stats = start_stub(args.handshake_ms / 1e3, args.rtt_ms / 1e3)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    tf1h = TimeFrame(1, TimeFrameUnit.Hour)
+    tf4h = TimeFrame(4, TimeFrameUnit.Hour)
+
+    def fetch(tf, client):
+        return fetch_bars(SYMBOL, tf, 300, True, client=client)
+
+    def fresh():
+        fetch(tf1h, CryptoHistoricalDataClient(url_override=url))
+        fetch(tf4h, CryptoHistoricalDataClient(url_override=url))
+
+    pooled_client = clients.get_data_client(True, url_override=url)
+
+    def pooled():
+        fetch(tf1h, pooled_client)
+        fetch(tf4h, pooled_client)
+
+    pool = ThreadPoolExecutor(max_workers=2)
+
+    def pooled_concurrent():
+        a = pool.submit(fetch, tf1h, pooled_client)
+        b = pool.submit(fetch, tf4h, pooled_client)
+        a.result(), b.result()
+
+    for name, fn in (("fresh", fresh), ("pooled", pooled),
+                     ("pooled+", pooled_concurrent)):
+        fn()  # warm up (first pooled call opens the connections)
+        before = dict(stats)
+        t0 = time.perf_counter()
+        for _ in range(args.rounds):
+            fn()
+        per_poll = (time.perf_counter() - t0) / args.rounds
+        conns = stats["connections"] - before["connections"]
+        print(f"{name:<8} {per_poll * 1e3:8.2f} ms per 1h+4h poll   "
+              f"new connections: {conns / args.rounds:.2f} per poll")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
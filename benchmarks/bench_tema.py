@@ -0,0 +1,53 @@
+"""
+tema_batch vs. the per-span pandas tema, on the spans compute_signals uses
+and on a wider set like a sweep grid's.
+
+    python benchmarks/bench_tema.py [--sizes 10000 100000 1000000]
+"""
+import argparse
+import sys
+import timeit
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from indicators import tema, tema_batch  # noqa: E402
+
+SPANS = (10, 80, 20, 70)
+SWEEP_SPANS = (5, 10, 20, 40, 60, 80, 120, 200)
+
+
+def main(sizes=(300, 10_000, 1_000_000)):
+    for spans in (SPANS, SWEEP_SPANS):
+        print(f"spans {spans}")
+        _run(sizes, spans)
+
+
+def _run(sizes, spans):
+    rng = np.random.default_rng(0)
+    for n in sizes:
+        close = pd.Series(30_000 + np.cumsum(rng.normal(0, 50, n)))
+        arr = close.to_numpy()
+        out = np.empty((n, len(spans)))
+        reps = max(1, 20_000 // n) if n < 20_000 else 3
+
+        ref = np.column_stack([tema(close, s).to_numpy() for s in spans])
+        err = np.max(np.abs(tema_batch(arr, spans, out) - ref) / np.abs(ref))
+
+        t_pd = min(timeit.repeat(
+            lambda: [tema(close, s) for s in spans], number=reps, repeat=5
+        )) / reps
+        t_batch = min(timeit.repeat(
+            lambda: tema_batch(arr, spans, out), number=reps, repeat=5
+        )) / reps
+        print(f"n={n:>9,}  pandas tema x{len(spans)}: {t_pd * 1e3:9.3f} ms  "
+              f"tema_batch: {t_batch * 1e3:9.3f} ms  "
+              f"speedup {t_pd / t_batch:5.2f}x  max rel err {err:.1e}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--sizes", type=int, nargs="+",
+                    default=[300, 10_000, 1_000_000])
+    main(ap.parse_args().sizes)
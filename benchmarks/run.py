@@ -0,0 +1,189 @@
+"""
+Benchmark suite for the signal pipeline and the main loop.
+
+Times every indicator, the 4h->1h join, compute_signals, the incremental
+SignalState update, fetch_bars (against an offline fake client) and one
+main.poll_once iteration on synthetic data at several sizes, records peak
+traced memory, and writes machine-readable results so runs can be compared
+across commits:
+
+    python benchmarks/run.py --json bench.json
+    python benchmarks/run.py --sizes 300 10000 --compare bench.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import subprocess
+import sys
+import time
+import timeit
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import indicators  # noqa: E402
+import kernels  # noqa: E402
+import strategy  # noqa: E402
+import data  # noqa: E402
+import main as bot  # noqa: E402
+from alpaca.data.timeframe import TimeFrame, TimeFrameUnit  # noqa: E402
+from synthetic import (  # noqa: E402
+    synthetic_ohlc, to_4h, FakeHistoricalClient, FakeTradingClient
+)
+
+DEFAULT_SIZES = (300, 10_000, 1_000_000)
+MIN_REPEAT_SECONDS = 0.2
+
+
+def _cases(n: int) -> dict:
+    """
+    name -> zero-arg callable, all sharing one synthetic dataset of n 1h bars.
+    """
+    df_1h = synthetic_ohlc(n)
+    df_4h = to_4h(df_1h)
+    close = df_1h["close"]
+    sig = strategy.compute_signals(df_1h, df_4h)
+    one = sig[["open", "high", "low", "close", "volume",
+               "TEMA10", "TEMA80", "ADX", "CMO", "ATR"]]
+
+    tf1h = TimeFrame(1, TimeFrameUnit.Hour)
+    client = FakeHistoricalClient({("BENCH/USD", tf1h.value): df_1h})
+    start = df_1h.index[0].to_pydatetime()
+    end = df_1h.index[-1].to_pydatetime()
+
+    state = strategy.SignalState()
+    state.warm(df_1h, df_4h)
+    last_ts, last_bar = df_1h.index[-1], df_1h.iloc[-1].to_dict()
+
+    trading = FakeTradingClient()
+
+    def poll_once():
+        # the iteration minus network and disk: bars come from memory and
+        # the state/log writers are stubbed so runs don't touch state/ logs/
+        with contextlib.redirect_stdout(io.StringIO()):
+            bot.poll_once(trading, None, "BENCH/USD")
+
+    bot.get_1h_and_4h = lambda symbol: (df_1h, df_4h)
+    bot.has_new_bar = lambda *a, **k: True  # time the full path
+    bot.set_last_bar_ts = lambda *a, **k: None
+    bot.log_order = lambda *a, **k: None
+    bot.log_event = lambda *a, **k: None
+    bot._save_state = lambda *a, **k: None
+
+    return {
+        "indicators.tema[80]": lambda: indicators.tema(close, 80),
+        "indicators.tema_batch[10,80,20,70]":
+            lambda: indicators.tema_batch(close.to_numpy(), (10, 80, 20, 70)),
+        "indicators.compute_cmo": lambda: indicators.compute_cmo(close),
+        "indicators.compute_atr": lambda: indicators.compute_atr(df_1h),
+        "indicators.compute_adx": lambda: indicators.compute_adx(df_1h),
+        "indicators.compute_adx_wilder":
+            lambda: indicators.compute_adx_wilder(df_1h),
+        "kernels.adx_atr_cmo":
+            lambda: kernels.adx_atr_cmo(df_1h["high"], df_1h["low"],
+                                        df_1h["close"]),
+        "strategy._mtf_join_4h_onto_1h":
+            lambda: strategy._mtf_join_4h_onto_1h(one, df_4h),
+        "strategy.compute_signals":
+            lambda: strategy.compute_signals(df_1h, df_4h),
+        # poll mode: the newest (forming) bar revised in place
+        "strategy.SignalState.update_1h":
+            lambda: state.update_1h(last_ts, last_bar, closed=False),
+        "data.fetch_bars[fake client]":
+            lambda: data.fetch_bars("BENCH/USD", tf1h, n, True,
+                                    start=start, end=end, client=client),
+        "main.poll_once[offline]": poll_once,
+    }
+
+
+def _time(fn) -> dict:
+    fn()  # warm caches / lazy imports
+    t0 = time.perf_counter()
+    fn()
+    once = max(time.perf_counter() - t0, 1e-9)
+    number = max(1, int(MIN_REPEAT_SECONDS / once))
+    runs = [t / number for t in timeit.repeat(fn, number=number, repeat=5)]
+    return {
+        "best_s": min(runs),
+        "median_s": float(np.median(runs)),
+        "loops": number,
+    }
+
+
+def _peak_memory(fn) -> int:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def run(sizes=DEFAULT_SIZES, only: str | None = None) -> dict:
+    results = []
+    for n in sizes:
+        for name, fn in _cases(n).items():
+            if only and only not in name:
+                continue
+            row = {"case": name, "bars": n, **_time(fn),
+                   "peak_bytes": _peak_memory(fn)}
+            results.append(row)
+            print(f"{name:<40} n={n:>9,}  best {row['best_s'] * 1e3:10.3f} ms"
+                  f"  peak {row['peak_bytes'] / 2**20:8.2f} MiB", flush=True)
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "when": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict):
+    """
+    Print current/baseline time ratios for cases present in both runs.
+    """
+    base = {(r["case"], r["bars"]): r for r in baseline["results"]}
+    print(f"\nvs {baseline['meta'].get('commit')} (ratio < 1 is faster)")
+    for r in current["results"]:
+        b = base.get((r["case"], r["bars"]))
+        if b:
+            print(f"{r['case']:<40} n={r['bars']:>9,}  "
+                  f"time x{r['best_s'] / b['best_s']:6.2f}  "
+                  f"mem x{r['peak_bytes'] / max(b['peak_bytes'], 1):6.2f}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    ap.add_argument("--only", help="run only cases containing this text")
+    ap.add_argument("--json", help="write results to this file")
+    ap.add_argument("--compare", help="baseline results file to compare to")
+    args = ap.parse_args()
+
+    out = run(args.sizes, args.only)
+    if args.json:
+        Path(args.json).write_text(json.dumps(out, indent=2))
+    if args.compare:
+        compare(out, json.loads(Path(args.compare).read_text()))
@@ -0,0 +1,89 @@
+"""
+Synthetic OHLCV data and offline stand-ins for the Alpaca clients, shared
+by the benchmark scripts.
+"""
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+
+AGG = {"open": "first", "high": "max", "low": "min",
+       "close": "last", "volume": "sum"}
+
+
+def synthetic_ohlc(n: int, freq: str = "1h", seed: int = 0,
+                   end: str = "2026-01-01") -> pd.DataFrame:
+    """
+    Random-walk OHLCV frame with a UTC DatetimeIndex, shaped like
+    data.fetch_bars output.
+    """
+    rng = np.random.default_rng(seed)
+    idx = pd.date_range(end=end, periods=n, freq=freq, tz="UTC")
+    close = 30_000 + np.cumsum(rng.normal(0, 50, n))
+    wick = rng.uniform(0, 80, (2, n))
+    return pd.DataFrame({
+        "open": close + rng.normal(0, 20, n),
+        "high": close + wick[0],
+        "low": close - wick[1],
+        "close": close,
+        "volume": rng.uniform(1, 10, n),
+    }, index=idx)
+
+
+def to_4h(df_1h: pd.DataFrame) -> pd.DataFrame:
+    return df_1h.resample("4h").agg(AGG).dropna()
+
+
+class FakeHistoricalClient:
+    """
+    Serves bars from in-memory frames through the get_crypto_bars /
+    get_stock_bars interface (MultiIndex .df like alpaca-py returns).
+    """
+
+    def __init__(self, frames: dict):
+        # {(symbol, timeframe.value): frame}
+        self.frames = frames
+        self.requests = 0
+
+    def _bars(self, req):
+        self.requests += 1
+        symbols = req.symbol_or_symbols
+        symbols = [symbols] if isinstance(symbols, str) else symbols
+        start = pd.Timestamp(req.start)
+        end = pd.Timestamp(req.end)
+        start = start.tz_localize("UTC") if start.tzinfo is None else start
+        end = end.tz_localize("UTC") if end.tzinfo is None else end
+        parts = []
+        for s in symbols:
+            df = self.frames[(s, req.timeframe.value)]
+            df = df[(df.index >= start) & (df.index <= end)]
+            df = df.set_axis(pd.MultiIndex.from_product(
+                [[s], df.index], names=["symbol", "timestamp"]))
+            parts.append(df)
+        return SimpleNamespace(df=pd.concat(parts))
+
+    get_crypto_bars = _bars
+    get_stock_bars = _bars
+
+
+class FakeTradingClient:
+    """
+    Minimal TradingClient stand-in: flat account, accepts every order.
+    """
+
+    def __init__(self, equity: float = 10_000.0):
+        self.equity = equity
+
+    def get_account(self):
+        return SimpleNamespace(equity=str(self.equity), cash=str(self.equity))
+
+    def get_open_position(self, symbol):
+        raise LookupError(symbol)
+
+    def close_position(self, symbol):
+        return None
+
+    def submit_order(self, order_data=None):
+        return SimpleNamespace(id="bench")
+
+    def get_clock(self):
+        return SimpleNamespace(is_open=True)
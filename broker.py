@@ -7,6 +7,10 @@ from alpaca.trading.requests import (
     TakeProfitRequest,
     StopLossRequest
 )
+from logger import log_event
+from metrics import timed
+from scheduler import call
+import broker_cache
 from config import (
     API_KEY,
     API_SECRET,
@@ -15,7 +19,9 @@ from config import (
     MIN_ATR,
     VOL_TARGET,
     MAX_QTY,
-    ATR_TRAIL_MULT
+    ATR_TRAIL_MULT,
+    CMO_THRESHOLD,
+    CMO_SIZE_FLOOR
 )
 
 
@@ -24,34 +30,43 @@ def make_trading_client() -> TradingClient:
     return TradingClient(API_KEY, API_SECRET, paper=PAPER)
 
 
+@timed("broker.get_equity")
 def get_equity(trading: TradingClient) -> float:
-    acct = trading.get_account()
+    acct = broker_cache.account(trading, lambda: call(
+        "account", trading.get_account, key=("account", id(trading))))
     try:
         return float(acct.equity)
     except Exception:
         return float(acct.cash)
 
 
+@timed("broker.get_position")
 def get_position_side_qty(trading: TradingClient, symbol: str):
     """
     Return (side, qty): side ∈ {-1,0,1}, qty absolute.
     """
     try:
-        pos = trading.get_open_position(symbol)
-        qty = float(pos.qty)
-        side = 1 if qty > 0 else -1
-        return side, abs(qty)
+        qty = broker_cache.positions(trading, lambda: call(
+            "account", trading.get_all_positions,
+            key=("positions", id(trading)))).get(symbol.replace("/", ""), 0.0)
     except Exception:
         return 0, 0.0
+    if qty == 0:
+        return 0, 0.0
+    return (1 if qty > 0 else -1), abs(qty)
 
 
+@timed("broker.flatten_if_opposite")
 def flatten_if_opposite(
         trading: TradingClient, symbol: str,
         desired_side: int
         ):
     current_side, _ = get_position_side_qty(trading, symbol)
     if current_side != 0 and current_side != desired_side:
-        trading.close_position(symbol)
+        try:
+            call("orders", trading.close_position, symbol)
+        finally:
+            broker_cache.order_event(trading)
 
 
 def atr_position_size(equity: float, atr: float, price: float) -> float:
@@ -81,6 +96,55 @@ def atr_position_size(equity: float, atr: float, price: float) -> float:
     return float(max(0, math.floor(qty)))
 
 
+def cmo_size_multiplier(cmo_prev: float,
+                        size_floor: float = CMO_SIZE_FLOOR,
+                        cmo_threshold: float = CMO_THRESHOLD) -> float:
+    """
+    Momentum-based size scaling from CMO_prev: |CMO|/threshold in 0..1,
+    never below `size_floor`.
+    """
+    cmo_thr = max(10, cmo_threshold)     # avoid being too strict
+    raw_mult = min(abs(cmo_prev) / cmo_thr, 1.0)      # 0..1
+    return max(raw_mult, size_floor)     # enforce a floor
+
+
+def bracket_prices(side: int, last_close: float, atr: float,
+                   sl_mult: float = ATR_TRAIL_MULT) -> tuple[float, float]:
+    """
+    (take_profit, stop_loss) for a bracket entry:
+    TP=±3*ATR, SL=∓sl_mult*ATR around the last close.
+    """
+    if side == 1:
+        return (round(last_close + 3 * atr, 2),
+                round(last_close - sl_mult * atr, 2))
+    return (round(last_close - 3 * atr, 2),
+            round(last_close + sl_mult * atr, 2))
+
+
+def bracket_order_request(symbol: str, side: int, qty: float,
+                          last_close: float, atr: float) -> MarketOrderRequest:
+    tp_price, sl_price = bracket_prices(side, last_close, atr)
+    return MarketOrderRequest(
+        symbol=symbol,
+        qty=qty,
+        side=OrderSide.BUY if side == 1 else OrderSide.SELL,
+        time_in_force=TimeInForce.GTC,
+        take_profit=TakeProfitRequest(limit_price=tp_price),
+        stop_loss=StopLossRequest(stop_price=sl_price)
+    )
+
+
+def market_order_request(symbol: str, side: int,
+                         qty: float) -> MarketOrderRequest:
+    return MarketOrderRequest(
+        symbol=symbol,
+        qty=qty,
+        side=OrderSide.BUY if side == 1 else OrderSide.SELL,
+        time_in_force=TimeInForce.GTC
+    )
+
+
+@timed("broker.submit_order")
 def submit_bracket_market(trading: TradingClient,
                           symbol: str, side: int, qty: float,
                           last_close: float, atr: float):
@@ -91,34 +155,19 @@ def submit_bracket_market(trading: TradingClient,
     if qty <= 0 or side not in (-1, 1):
         return None
 
-    if side == 1:
-        tp_price = round(last_close + 3 * atr, 2)
-        sl_price = round(last_close - ATR_TRAIL_MULT * atr, 2)
-        order_side = OrderSide.BUY
-    else:
-        tp_price = round(last_close - 3 * atr, 2)
-        sl_price = round(last_close + ATR_TRAIL_MULT * atr, 2)
-        order_side = OrderSide.SELL
-
     try:
-        return trading.submit_order(order_data=MarketOrderRequest(
-            symbol=symbol,
-            qty=qty,
-            side=order_side,
-            time_in_force=TimeInForce.GTC,
-            take_profit=TakeProfitRequest(limit_price=tp_price),
-            stop_loss=StopLossRequest(stop_price=sl_price)
-        ))
+        return call("orders", trading.submit_order,
+                    order_data=bracket_order_request(
+                        symbol, side, qty, last_close, atr))
     except Exception as e:
         print(f"[WARN] Bracket rejected({e}). Submitting simple market order.")
-        return trading.submit_order(order_data=MarketOrderRequest(
-            symbol=symbol,
-            qty=qty,
-            side=order_side,
-            time_in_force=TimeInForce.GTC
-        ))
+        return call("orders", trading.submit_order,
+                    order_data=market_order_request(symbol, side, qty))
+    finally:
+        broker_cache.order_event(trading)
 
 
+@timed("broker.is_market_open")
 def is_market_open(trading: TradingClient) -> bool:
     """
     For equities only. Crypto trades 24/7, so return True in that case.
@@ -126,7 +175,9 @@ def is_market_open(trading: TradingClient) -> bool:
     if IS_CRYPTO:
         return True
     try:
-        clock = trading.get_clock()
+        clock = broker_cache.clock(trading, lambda: call(
+            "clock", trading.get_clock, key=("clock", id(trading))))
         return bool(clock.is_open)
-    except Exception:
+    except Exception as e:
+        log_event(f"clock unavailable after retries ({e}); assuming open")
         return True  # fail-open
@@ -0,0 +1,139 @@
+"""
+Short-lived cache of the broker state read on the trading hot path.
+
+Every entry decision used to cost a get_account (equity) and a
+get_open_position (flatten check) round trip, per symbol. For equities,
+every poll also asked for the market clock, which can only change at a
+session boundary. Here:
+
+- the clock is kept until its own next_open / next_close, whichever is
+  first (capped by CLOCK_TTL_SECONDS);
+- account equity and all positions are kept until the next 1h bar opens
+  (capped by ACCOUNT_TTL_SECONDS / POSITION_TTL_SECONDS), since the
+  strategy decides once per bar. Positions come from one
+  get_all_positions call, shared by every symbol;
+- anything that moves them drops them: broker.py invalidates the account
+  and positions after closing or submitting an order, and execution.py
+  does so on fills from the trade-updates stream.
+
+Entries are per trading client, and a failed load is never cached.
+"""
+import contextlib
+import threading
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+from bar_schedule import next_bar_open
+from config import (
+    BROKER_CACHE, ACCOUNT_TTL_SECONDS, POSITION_TTL_SECONDS, CLOCK_TTL_SECONDS
+)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def until_next_bar(ttl: float, now: datetime | None = None) -> datetime:
+    now = now or _now()
+    return min(next_bar_open(now).to_pydatetime(), now + timedelta(seconds=ttl))
+
+
+def until_clock_changes(clock, ttl: float = CLOCK_TTL_SECONDS,
+                        now: datetime | None = None) -> datetime:
+    """
+    When a market clock can next change: its next open or close.
+    """
+    now = now or _now()
+    expiry = now + timedelta(seconds=ttl)
+    for attr in ("next_open", "next_close"):
+        ts = getattr(clock, attr, None)
+        if ts is not None:
+            ts = pd.Timestamp(ts)
+            ts = ts.tz_localize("UTC") if ts.tzinfo is None else ts
+            if ts > now:
+                expiry = min(expiry, ts.to_pydatetime())
+    return expiry
+
+
+class BrokerStateCache:
+    def __init__(self, enabled: bool = BROKER_CACHE):
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._items: dict = {}
+        self._lock = threading.Lock()
+        self._generation = 0  # bumped by invalidate
+
+    @contextlib.contextmanager
+    def bypass(self):
+        """
+        Always load (simulated clients, whose clock is not wall time).
+        """
+        enabled, self.enabled = self.enabled, False
+        try:
+            yield
+        finally:
+            self.enabled = enabled
+
+    def get(self, trading, name: str, load, expires):
+        """
+        The cached `name` for `trading`, or load() kept until
+        expires(value) (a UTC datetime).
+        """
+        if not self.enabled:
+            return load()
+        key = (id(trading), name)
+        with self._lock:
+            item = self._items.get(key)
+            generation = self._generation
+        if item is not None and _now() < item[1]:
+            self.hits += 1
+            return item[0]
+        self.misses += 1
+        value = load()
+        with self._lock:
+            # an order event during the load may have made `value` stale
+            if generation == self._generation:
+                self._items[key] = (value, expires(value))
+        return value
+
+    def invalidate(self, trading, *names: str):
+        """
+        Drop `names` (everything if none) for `trading`.
+        """
+        with self._lock:
+            self._generation += 1
+            if names:
+                for name in names:
+                    self._items.pop((id(trading), name), None)
+            else:
+                for key in [k for k in self._items if k[0] == id(trading)]:
+                    del self._items[key]
+
+
+cache = BrokerStateCache()
+
+
+def account(trading, load):
+    return cache.get(trading, "account", load,
+                     lambda _: until_next_bar(ACCOUNT_TTL_SECONDS))
+
+
+def positions(trading, load) -> dict[str, float]:
+    """
+    {symbol without "/": signed qty} from one load() of all positions.
+    """
+    return cache.get(
+        trading, "positions",
+        lambda: {p.symbol.replace("/", ""): float(p.qty) for p in load()},
+        lambda _: until_next_bar(POSITION_TTL_SECONDS))
+
+
+def clock(trading, load):
+    return cache.get(trading, "clock", load, until_clock_changes)
+
+
+def order_event(trading):
+    """
+    An order was sent or filled: equity and positions are stale.
+    """
+    cache.invalidate(trading, "account", "positions")
@@ -0,0 +1,74 @@
+"""
+Long-lived Alpaca clients.
+
+Every alpaca-py REST client owns a requests.Session, so building a new
+client per call throws away the pooled keep-alive connection and pays a
+fresh TCP + TLS handshake each time. These helpers build each client once
+per process and size its connection pool for the concurrent fetches done
+by data.get_1h_and_4h and the portfolio runner.
+"""
+import threading
+from requests.adapters import HTTPAdapter
+from alpaca.data.historical import (
+    CryptoHistoricalDataClient,
+    StockHistoricalDataClient
+)
+from config import API_KEY, API_SECRET, IS_CRYPTO, HTTP_POOL_SIZE
+
+_lock = threading.Lock()
+_clients: dict = {}
+
+
+def _pool_session(client, pool_size: int = HTTP_POOL_SIZE):
+    """
+    Widen the client's keep-alive pool so concurrent requests reuse
+    connections instead of opening (and discarding) extra ones.
+    """
+    # 429s go to scheduler.py (jittered backoff, shared budget) instead of
+    # alpaca-py's fixed-wait retry loop
+    if hasattr(client, "_retry"):
+        client._retry = 0
+    session = getattr(client, "_session", None)
+    if session is not None:
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+    return client
+
+
+def _get(key, factory):
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = _pool_session(factory())
+    return client
+
+
+def get_data_client(is_crypto: bool = IS_CRYPTO, url_override: str | None = None):
+    """
+    Shared historical data client for the asset class.
+    """
+    if is_crypto:
+        return _get(("crypto", url_override), lambda: CryptoHistoricalDataClient(
+            API_KEY, API_SECRET, url_override=url_override))
+    return _get(("stock", url_override), lambda: StockHistoricalDataClient(
+        API_KEY, API_SECRET, url_override=url_override))
+
+
+def get_trading_client():
+    """
+    Shared TradingClient (see broker.make_trading_client).
+    """
+    from broker import make_trading_client
+    return _get(("trading", None), make_trading_client)
+
+
+def reset_clients():
+    """
+    Drop cached clients (e.g. after rotating API keys).
+    """
+    with _lock:
+        _clients.clear()
@@ -0,0 +1,146 @@
+"""
+Array-backed signal store for many symbols.
+
+Instead of one DataFrame per symbol rebuilt by compute_signals on every
+poll, each symbol gets a fixed slot in preallocated NumPy blocks:
+
+    floats[symbol, column, i]   OHLCV, indicators, *_prev values
+    flags[symbol, column, i]    trend/entry flags as int8
+    ts[symbol, i]               bar start, ns since epoch (UTC)
+
+Each block's last axis is a ring buffer of `capacity` bars. New bars are
+run through a per-symbol strategy.SignalState and the resulting row is
+written in place, so a poll allocates nothing proportional to history.
+Float columns are float64 or float32 (COLUMNAR_PRECISION); indicators are
+always computed in float64 and only stored at the chosen precision.
+
+pandas appears only at the edges: `sync` takes fetched frames and
+`to_frame` exports a symbol for debugging.
+"""
+import numpy as np
+import pandas as pd
+from config import LOOKBACK_1H, COLUMNAR_PRECISION
+from strategy import SignalState
+
+FLOAT_COLS = (
+    "open", "high", "low", "close", "volume",
+    "TEMA10", "TEMA80", "ADX", "CMO", "ATR",
+    "4h_TEMA20", "4h_TEMA70",
+    "ADX_prev", "ADX_slope_prev", "CMO_prev",
+)
+FLAG_COLS = (
+    "ShortTrend", "LongTrend", "ShortTrend_prev", "LongTrend_prev",
+    "long_signal", "short_signal", "entry_dir", "gates",
+)
+_FLOAT_IDX = {c: i for i, c in enumerate(FLOAT_COLS)}
+_FLAG_IDX = {c: i for i, c in enumerate(FLAG_COLS)}
+_NAT = np.iinfo(np.int64).min
+
+
+class ColumnarStore:
+    def __init__(self, symbols: list[str], capacity: int = LOOKBACK_1H,
+                 precision: str = COLUMNAR_PRECISION):
+        self.symbols = list(symbols)
+        self.slot = {s: i for i, s in enumerate(self.symbols)}
+        self.capacity = capacity
+        n = len(self.symbols)
+        self.floats = np.full((n, len(FLOAT_COLS), capacity), np.nan,
+                              dtype=np.dtype(precision))
+        self.flags = np.zeros((n, len(FLAG_COLS), capacity), dtype=np.int8)
+        self.ts = np.full((n, capacity), _NAT, dtype=np.int64)
+        self.count = np.zeros(n, dtype=np.int64)  # bars written, ever
+        self.states = {s: SignalState() for s in self.symbols}
+
+    @property
+    def nbytes(self) -> int:
+        return self.floats.nbytes + self.flags.nbytes + self.ts.nbytes
+
+    # ---- writes ----
+
+    def _write(self, k: int, ts: pd.Timestamp, row: dict):
+        last = self.ts[k, (self.count[k] - 1) % self.capacity] \
+            if self.count[k] else _NAT
+        ts_ns = ts.value
+        if ts_ns != last:
+            self.count[k] += 1
+        i = (self.count[k] - 1) % self.capacity
+        self.ts[k, i] = ts_ns
+        f = self.floats[k]
+        for c, j in _FLOAT_IDX.items():
+            f[j, i] = row.get(c, np.nan)
+        g = self.flags[k]
+        for c, j in _FLAG_IDX.items():
+            g[j, i] = row[c]
+
+    def sync(self, symbol: str, df_1h: pd.DataFrame, df_4h: pd.DataFrame):
+        """
+        Feed the bars in freshly fetched frames that the store has not
+        seen yet (re-applying the newest stored bar, which may have been
+        revised). The first call, or one whose frames no longer line up
+        with the stored state (e.g. after a long outage), rebuilds the
+        symbol from the whole history.
+        """
+        k = self.slot[symbol]
+        state = self.states[symbol]
+        if state.ts_1h is not None and not state.matches(df_1h, df_4h):
+            state = self.reset(symbol)
+        for ts, row in state.replay(*state.unseen(df_1h, df_4h)):
+            self._write(k, ts, row)
+
+    def reset(self, symbol: str) -> SignalState:
+        k = self.slot[symbol]
+        self.floats[k] = np.nan
+        self.flags[k] = 0
+        self.ts[k] = _NAT
+        self.count[k] = 0
+        self.states[symbol] = SignalState()
+        return self.states[symbol]
+
+    # ---- reads ----
+
+    def _order(self, k: int) -> np.ndarray:
+        n = min(self.count[k], self.capacity)
+        end = self.count[k] % self.capacity
+        return (np.arange(end - n, end) % self.capacity)
+
+    def column(self, symbol: str, col: str) -> np.ndarray:
+        """
+        One column for a symbol, oldest to newest.
+        """
+        k = self.slot[symbol]
+        idx = self._order(k)
+        if col in _FLOAT_IDX:
+            return self.floats[k, _FLOAT_IDX[col], idx]
+        return self.flags[k, _FLAG_IDX[col], idx]
+
+    def latest(self, col: str) -> np.ndarray:
+        """
+        The newest value of `col` for every symbol (in `symbols` order).
+        """
+        i = (self.count - 1) % self.capacity
+        rows = np.arange(len(self.symbols))
+        if col in _FLOAT_IDX:
+            return self.floats[rows, _FLOAT_IDX[col], i]
+        return self.flags[rows, _FLAG_IDX[col], i]
+
+    def last_row(self, symbol: str) -> tuple[pd.Timestamp | None, dict]:
+        """
+        (bar start, {column: value}) of the newest bar, as process_row
+        takes it.
+        """
+        k = self.slot[symbol]
+        if not self.count[k]:
+            return None, {}
+        i = (self.count[k] - 1) % self.capacity
+        row = {c: float(self.floats[k, j, i]) for c, j in _FLOAT_IDX.items()}
+        row.update({c: int(self.flags[k, j, i]) for c, j in _FLAG_IDX.items()})
+        return pd.Timestamp(int(self.ts[k, i]), tz="UTC"), row
+
+    def to_frame(self, symbol: str) -> pd.DataFrame:
+        k = self.slot[symbol]
+        idx = self._order(k)
+        data = {c: self.floats[k, j, idx] for c, j in _FLOAT_IDX.items()}
+        data.update({c: self.flags[k, j, idx] for c, j in _FLAG_IDX.items()})
+        index = pd.DatetimeIndex(pd.to_datetime(self.ts[k, idx], utc=True),
+                                 name="ts")
+        return pd.DataFrame(data, index=index)
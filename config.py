@@ -13,6 +13,13 @@ PAPER = True  # paper trading
 # --- WHAT TO TRADE ---
 IS_CRYPTO = True
 SYMBOL = "BTC/USD" if IS_CRYPTO else "SPY"
+# More than one symbol switches main.py to the portfolio runner
+SYMBOLS = [SYMBOL]
+SIGNAL_WORKERS = 8          # pool size for per-symbol signal builds
+SIGNAL_POOL = "thread"      # "thread" or "process"
+COLUMNAR = False            # portfolio: keep signals in NumPy ring buffers
+COLUMNAR_PRECISION = "float64"  # or "float32" to halve their memory
+FANOUT_WORKERS = 2          # fanout.py run: strategy processes sharing one bar fetcher
 
 # --- STRATEGY / RISK ---
 BASE_EQUITY = 10_000
@@ -38,11 +45,59 @@ CMO_SIZE_FLOOR = 0.35  # min sizing multiplier when momentum is weak (0.0..1.0)
 LOOKBACK_1H = 300           # enough for TEMA(80)
 LOOKBACK_4H = 300           # enough for TEMA(70)
 POLL_SECONDS = 60
+SCHEDULE = "bar_close"       # "bar_close": wake at each 1h open; "fixed": every POLL_SECONDS
+BAR_CLOSE_DELAY_SECONDS = 2  # let the new bar reach the API before probing
+PROBE_RETRY_SECONDS = 10     # re-probe this often while the new bar is missing...
+PROBE_WINDOW_SECONDS = 300   # ...for this long after the boundary, then every POLL_SECONDS
+HTTP_POOL_SIZE = 10         # keep-alive connections per Alpaca client
+
+# Request scheduler (scheduler.py): token bucket per API, retries with jitter
+RATE_LIMITS = {
+    "trading": (180, 10),   # per minute, burst: orders + account + clock (Alpaca: 200/min)
+    "data": (180, 10),      # historical/latest bars (Alpaca free plan: 200/min)
+}
+RETRY_ATTEMPTS = 4          # retries after the first try (429 / 5xx / connection)
+RETRY_BASE_SECONDS = 0.5    # backoff: uniform(0, min(max, base * 2**attempt))
+RETRY_MAX_SECONDS = 8
+
+# Broker state cache (broker_cache.py): dropped on every order event
+BROKER_CACHE = True
+ACCOUNT_TTL_SECONDS = 3600  # equity: until the next 1h bar, at most this long
+POSITION_TTL_SECONDS = 3600 # positions: until the next 1h bar, at most this long
+CLOCK_TTL_SECONDS = 6 * 3600  # clock: until next open/close, at most this long
+
+# Bar ingestion: "poll" (REST every POLL_SECONDS) or "stream" (websocket)
+INGEST_MODE = "poll"
+STREAM_GAP_MINUTES = 15     # minute-bar gap treated as a reconnect
+STREAM_RETRY_SECONDS = 5
+
+# Local bar cache: fetch only bars newer than the last cached one
+USE_BAR_CACHE = True
+BAR_CACHE_OVERLAP = 2       # re-fetch this many trailing bars (revisions)
+USE_ARCHIVE = True          # seed an empty bar cache from ARCHIVE_DIR, if present
+SNAPSHOT = True             # persist signal state each bar close; resume from it on restart
+
+# --- EXECUTION ---
+ASYNC_EXECUTION = False     # orders via execution.AsyncExecutor + trade-updates stream
+EXEC_FLIP = "after_fill"    # flip: enter once the close fills, or "concurrent"
+EXEC_FILL_TIMEOUT = 10      # seconds to wait for that close fill before entering anyway
+EXEC_KEEP_DONE = 256        # finished orders kept for late/duplicate updates and latencies()
 
 # --- RISK GUARD (optional) ---
 ENABLE_DAILY_LOSS_GUARD = False
 MAX_DAILY_DRAWDOWN_PCT = 0.05  # pause for today if equity drop > 5%
 
+# ---- Logging ----
+LOG_QUEUE_SIZE = 10_000         # pending records before new ones are dropped
+LOG_BATCH = 512                 # records written per wake-up of the writer
+LOG_MAX_BYTES = 10 * 2**20      # rotate a log file past this size...
+LOG_ROTATE_DAILY = True         # ...or when the UTC date changes
+ORDER_JOURNAL = False           # also append fixed-size binary order records
+
+# ---- Metrics ----
+METRICS_FLUSH_SECONDS = 300     # write per-stage latency percentiles
+METRICS_PORT = None             # e.g. 9108 to serve /metrics locally
+
 # ---- Debug ----
 DEBUG_SIGNALS = True
 
@@ -50,10 +105,19 @@ DEBUG_SIGNALS = True
 ROOT = Path(__file__).resolve().parent
 LOG_DIR = ROOT / "logs"
 STATE_DIR = ROOT / "state"
+BAR_CACHE_DIR = STATE_DIR / "bars"
+ARCHIVE_DIR = ROOT / "archive"  # created by archive.py on first ingest
+SNAPSHOT_DIR = STATE_DIR / "snapshots"
 LOG_DIR.mkdir(exist_ok=True, parents=True)
 STATE_DIR.mkdir(exist_ok=True, parents=True)
+BAR_CACHE_DIR.mkdir(exist_ok=True, parents=True)
 
 LAST_BAR_FILE = STATE_DIR / "last_bar.txt"
 DAY_START_EQUITY_FILE = STATE_DIR / "day_start_equity.txt"
+STATE_DB = STATE_DIR / "state.sqlite3"
 ORDER_LOG = LOG_DIR / "orders.csv"
 EVENT_LOG = LOG_DIR / "events.log"
+ORDER_JOURNAL_FILE = LOG_DIR / "orders.bin"
+METRICS_FILE = LOG_DIR / "metrics.json"
+GATES_FILE = LOG_DIR / "gates.json"
+FANOUT_SOCKET = STATE_DIR / "bars.sock"
@@ -1,59 +1,74 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 import pandas as pd
-from alpaca.data.historical import (
-    CryptoHistoricalDataClient,
-    StockHistoricalDataClient
-)
 from alpaca.data.timeframe import TimeFrame, TimeFrameUnit
-from alpaca.data.requests import CryptoBarsRequest, StockBarsRequest
-from config import IS_CRYPTO, LOOKBACK_1H, LOOKBACK_4H
-
+from alpaca.data.requests import (
+    CryptoBarsRequest, StockBarsRequest,
+    CryptoLatestBarRequest, StockLatestBarRequest
+)
+from clients import get_data_client
+from metrics import timed
+from scheduler import call
+from config import IS_CRYPTO, LOOKBACK_1H, LOOKBACK_4H, USE_BAR_CACHE
 
-def fetch_bars(
-        symbol: str,
-        tf: TimeFrame,
-        lookback: int,
-        is_crypto: bool) -> pd.DataFrame:
 
-    end = datetime.now(timezone.utc)
-    # estimate days needed: lookback bars * bar duration
+def lookback_days(tf: TimeFrame, lookback: int) -> int:
+    """
+    Estimate the calendar days needed to cover `lookback` bars of `tf`.
+    """
     if tf.amount == 1 and tf.unit.name.lower() == "hour":
-        days_back = int((lookback * 1.5) / 24) + 2  # 1h bars
-    elif tf.amount == 4 and tf.unit.name.lower() == "hour":
-        days_back = int((lookback * 4 * 1.5) / 24) + 2  # 4h bars
-    else:
-        days_back = 30  # safe fallback
+        return int((lookback * 1.5) / 24) + 2  # 1h bars
+    if tf.amount == 4 and tf.unit.name.lower() == "hour":
+        return int((lookback * 4 * 1.5) / 24) + 2  # 4h bars
+    return 30  # safe fallback
+
 
-    start = end - timedelta(days=days_back)
+def _minute(ts: datetime) -> datetime:
+    return ts.replace(second=0, microsecond=0)
 
+
+@timed("data.request_bars")
+def _request_bars(
+        symbols,
+        tf: TimeFrame,
+        start: datetime,
+        end: datetime,
+        is_crypto: bool,
+        client=None) -> pd.DataFrame:
+    """
+    One historical-bars request for a symbol (str) or list of symbols.
+    """
+    client = client or get_data_client(is_crypto)
+    # same request within the same minute (windows end "now") -> one call
+    key = ("bars", tuple(symbols) if isinstance(symbols, list) else symbols,
+           str(tf), _minute(start), _minute(end), is_crypto, id(client))
     if is_crypto:
-        client = CryptoHistoricalDataClient()
         req = CryptoBarsRequest(
-            symbol_or_symbols=symbol,   # str avoids MultiIndex
+            symbol_or_symbols=symbols,   # str avoids MultiIndex
             timeframe=tf,
             start=start,
             end=end,
             feed="us",
         )
-        bars = client.get_crypto_bars(req).df
-    else:
-        client = StockHistoricalDataClient()
-        req = StockBarsRequest(
-            symbol_or_symbols=[symbol],
-            timeframe=tf,
-            start=start,
-            end=end,
-        )
-        bars = client.get_stock_bars(req).df
+        return call("data", client.get_crypto_bars, req, key=key).df
 
-    if bars.empty:
-        print(
-            f"[data] Empty bars for {symbol} tf={tf} (is_crypto={is_crypto})"
-        )
-        return pd.DataFrame()
+    req = StockBarsRequest(
+        symbol_or_symbols=symbols if isinstance(symbols, list) else [symbols],
+        timeframe=tf,
+        start=start,
+        end=end,
+    )
+    return call("data", client.get_stock_bars, req, key=key).df
 
+
+def _normalize_bars(bars: pd.DataFrame, symbol: str) -> pd.DataFrame:
+    """
+    Single-symbol, lower-case OHLCV frame with a UTC DatetimeIndex.
+    """
     # Flatten MultiIndex
     if isinstance(bars.index, pd.MultiIndex):
+        if symbol not in bars.index.get_level_values(0):
+            return pd.DataFrame()
         bars = bars.xs(symbol, level=0)
 
     bars = bars.rename(columns=str.lower)
@@ -66,9 +81,121 @@ def fetch_bars(
     return bars[['open', 'high', 'low', 'close', 'volume']]
 
 
+def fetch_bars(
+        symbol: str,
+        tf: TimeFrame,
+        lookback: int,
+        is_crypto: bool,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        client=None) -> pd.DataFrame:
+    """
+    Download OHLCV bars for one symbol. By default the window covers
+    `lookback` bars ending now; pass `start`/`end` to fetch a narrower
+    slice (the bar cache uses this to pull only the newest bars), and
+    `client` to reuse an existing (or fake) historical data client.
+    """
+    if end is None:
+        end = datetime.now(timezone.utc)
+    if start is None:
+        # estimate days needed: lookback bars * bar duration
+        start = end - timedelta(days=lookback_days(tf, lookback))
+
+    bars = _request_bars(symbol, tf, start, end, is_crypto, client)
+
+    if bars.empty:
+        print(
+            f"[data] Empty bars for {symbol} tf={tf} (is_crypto={is_crypto})"
+        )
+        return pd.DataFrame()
+
+    return _normalize_bars(bars, symbol)
+
+
+def fetch_bars_multi(
+        symbols: list[str],
+        tf: TimeFrame,
+        lookback: int,
+        is_crypto: bool,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        client=None) -> dict[str, pd.DataFrame]:
+    """
+    Like fetch_bars, but for many symbols in a single batched request.
+    Symbols with no bars map to an empty frame.
+    """
+    if end is None:
+        end = datetime.now(timezone.utc)
+    if start is None:
+        start = end - timedelta(days=lookback_days(tf, lookback))
+
+    bars = _request_bars(list(symbols), tf, start, end, is_crypto, client)
+
+    out = {}
+    for symbol in symbols:
+        df = pd.DataFrame() if bars.empty else _normalize_bars(bars, symbol)
+        if df.empty:
+            print(
+                f"[data] Empty bars for {symbol} tf={tf} "
+                f"(is_crypto={is_crypto})"
+            )
+        out[symbol] = df
+    return out
+
+
+# 1h and 4h series are independent requests; run them side by side
+_FETCH_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="bars")
+
+
+@timed("data.latest_bar")
+def latest_bar_ts(symbols, is_crypto: bool = IS_CRYPTO,
+                  client=None) -> dict[str, pd.Timestamp]:
+    """
+    {symbol: UTC timestamp of its latest minute bar}: one small request,
+    used to tell whether a new bar has opened before fetching history.
+    """
+    client = client or get_data_client(is_crypto)
+    if is_crypto:
+        bars = call("data", client.get_crypto_latest_bar,
+                    CryptoLatestBarRequest(symbol_or_symbols=symbols),
+                    key=("latest", str(symbols), id(client)))
+    else:
+        bars = call("data", client.get_stock_latest_bar,
+                    StockLatestBarRequest(symbol_or_symbols=symbols),
+                    key=("latest", str(symbols), id(client)))
+    out = {}
+    for symbol, bar in bars.items():
+        ts = pd.Timestamp(bar.timestamp)
+        out[symbol] = ts.tz_localize("UTC") if ts.tzinfo is None \
+            else ts.tz_convert("UTC")
+    return out
+
+
 def get_1h_and_4h(symbol: str):
     tf1h = TimeFrame(amount=1, unit=TimeFrameUnit.Hour)
     tf4h = TimeFrame(amount=4, unit=TimeFrameUnit.Hour)
-    df_1h = fetch_bars(symbol, tf1h, LOOKBACK_1H, IS_CRYPTO)
-    df_4h = fetch_bars(symbol, tf4h, LOOKBACK_4H, IS_CRYPTO)
-    return df_1h, df_4h
+    if USE_BAR_CACHE:
+        from bar_cache import get_bar_cache
+        fetch = get_bar_cache().get
+    else:
+        fetch = fetch_bars
+    f_1h = _FETCH_POOL.submit(fetch, symbol, tf1h, LOOKBACK_1H, IS_CRYPTO)
+    f_4h = _FETCH_POOL.submit(fetch, symbol, tf4h, LOOKBACK_4H, IS_CRYPTO)
+    return f_1h.result(), f_4h.result()
+
+
+def get_1h_and_4h_multi(symbols: list[str]) -> dict:
+    """
+    {symbol: (df_1h, df_4h)} using one batched request per timeframe.
+    """
+    tf1h = TimeFrame(amount=1, unit=TimeFrameUnit.Hour)
+    tf4h = TimeFrame(amount=4, unit=TimeFrameUnit.Hour)
+    if USE_BAR_CACHE:
+        from bar_cache import get_bar_cache
+        fetch = get_bar_cache().get_many
+    else:
+        fetch = fetch_bars_multi
+    f_1h = _FETCH_POOL.submit(fetch, symbols, tf1h, LOOKBACK_1H, IS_CRYPTO)
+    f_4h = _FETCH_POOL.submit(fetch, symbols, tf4h, LOOKBACK_4H, IS_CRYPTO)
+    by_1h, by_4h = f_1h.result(), f_4h.result()
+    return {s: (by_1h[s], by_4h[s]) for s in symbols}
@@ -0,0 +1,249 @@
+"""
+Entry-gate diagnostics: why (almost) no bar turns into a trade.
+
+Every signal row carries `gates`, the strategy.gate_mask bitmask of the
+entry gates that passed (1h/4h trend either way, ADX level, ADX slope,
+CMO above +thr / below -thr). `GateStats` counts bars per mask value, so
+every pass rate, signal count and near miss (all but one gate of a side
+passed) follows from 64 counters. It takes a whole signal frame in one
+vectorized pass or one live bar at a time, and also tracks how far the
+blocking ADX/CMO value was from its threshold on near misses.
+
+The live loop only hands each bar's mask to `record`; per-symbol stats are
+written to GATES_FILE every METRICS_FLUSH_SECONDS and on exit. For history:
+
+    python diagnostics.py BARS_1H.csv BARS_4H.csv [--json gates.json]
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from config import (
+    ADX_THRESHOLD, CMO_THRESHOLD, GATES_FILE, METRICS_FLUSH_SECONDS
+)
+from strategy import (
+    GATE_LONG_TREND, GATE_SHORT_TREND, GATE_ADX_LEVEL, GATE_ADX_RISING,
+    GATE_CMO_LONG, GATE_CMO_SHORT, LONG_GATES, SHORT_GATES, gate_mask
+)
+
+GATES = {
+    "long_trend": GATE_LONG_TREND,
+    "short_trend": GATE_SHORT_TREND,
+    "adx_level": GATE_ADX_LEVEL,
+    "adx_rising": GATE_ADX_RISING,
+    "cmo_long": GATE_CMO_LONG,
+    "cmo_short": GATE_CMO_SHORT,
+}
+SIDES = {"long": LONG_GATES, "short": SHORT_GATES}
+_N_MASKS = 64
+
+# "adx_level+cmo_long" style label per mask value, built once
+_LABELS = ["+".join(n for n, b in GATES.items() if m & b) or "none"
+           for m in range(_N_MASKS)]
+
+
+def describe(mask: int) -> str:
+    return _LABELS[int(mask)]
+
+
+def _masks(sig, adx_threshold: float, cmo_threshold: float) -> np.ndarray:
+    if "gates" in sig:
+        return np.asarray(sig["gates"], dtype=np.int64)
+    return np.asarray(gate_mask(sig, adx_threshold, cmo_threshold),
+                      dtype=np.int64)
+
+
+def gate_frame(sig: pd.DataFrame, adx_threshold: float = ADX_THRESHOLD,
+               cmo_threshold: float = CMO_THRESHOLD) -> pd.DataFrame:
+    """
+    One boolean column per gate for every bar of a signal frame.
+    """
+    m = _masks(sig, adx_threshold, cmo_threshold)
+    bits = np.array(list(GATES.values()), dtype=np.int64)
+    return pd.DataFrame((m[:, None] & bits) != 0, index=sig.index,
+                        columns=list(GATES))
+
+
+def _shortfalls(adx: np.ndarray, cmo: np.ndarray, adx_threshold: float,
+                cmo_threshold: float) -> dict:
+    """
+    How far ADX_prev / CMO_prev were from passing, per numeric gate.
+    """
+    return {
+        "adx_level": adx_threshold - adx,
+        "cmo_long": cmo_threshold - cmo,
+        "cmo_short": cmo + cmo_threshold,
+    }
+
+
+class GateStats:
+    """
+    Running gate counters for one symbol (or one history).
+    """
+
+    def __init__(self, adx_threshold: float = ADX_THRESHOLD,
+                 cmo_threshold: float = CMO_THRESHOLD):
+        self.adx_threshold = adx_threshold
+        self.cmo_threshold = cmo_threshold
+        self.counts = np.zeros(_N_MASKS, dtype=np.int64)
+        # near-miss shortfall per (side, numeric gate): [n, sum, min]
+        self.shortfall = {(side, g): [0, 0.0, np.inf] for side in SIDES
+                          for g in ("adx_level", f"cmo_{side}")}
+
+    def _add_shortfall(self, side: str, gate: str, values: np.ndarray):
+        values = values[values == values]
+        if values.size:
+            acc = self.shortfall[side, gate]
+            acc[0] += int(values.size)
+            acc[1] += float(values.sum())
+            acc[2] = min(acc[2], float(values.min()))
+
+    def add(self, mask: int, row=None):
+        """
+        Count one bar. With its signal `row`, near misses on ADX/CMO also
+        record the distance to the threshold.
+        """
+        mask = int(mask)
+        self.counts[mask] += 1
+        if row is None:
+            return
+        for side, need in SIDES.items():
+            missing = need & ~mask
+            if missing == GATE_ADX_LEVEL:
+                gate = "adx_level"
+            elif missing in (GATE_CMO_LONG, GATE_CMO_SHORT):
+                gate = f"cmo_{side}"
+            else:
+                continue
+            short = _shortfalls(float(row["ADX_prev"]), float(row["CMO_prev"]),
+                                self.adx_threshold, self.cmo_threshold)[gate]
+            self._add_shortfall(side, gate, np.array([short]))
+
+    def add_frame(self, sig: pd.DataFrame):
+        """
+        Count every bar of a signal frame at once.
+        """
+        m = _masks(sig, self.adx_threshold, self.cmo_threshold)
+        self.counts += np.bincount(m, minlength=_N_MASKS)
+        short = _shortfalls(sig["ADX_prev"].to_numpy(dtype=np.float64),
+                            sig["CMO_prev"].to_numpy(dtype=np.float64),
+                            self.adx_threshold, self.cmo_threshold)
+        for side, need in SIDES.items():
+            missing = need & ~m
+            for gate in ("adx_level", f"cmo_{side}"):
+                hit = missing == GATES[gate]
+                self._add_shortfall(side, gate, short[gate][hit])
+
+    def merge(self, other: "GateStats"):
+        self.counts += other.counts
+        for k, (n, total, low) in other.shortfall.items():
+            acc = self.shortfall[k]
+            acc[0] += n
+            acc[1] += total
+            acc[2] = min(acc[2], low)
+
+    def report(self) -> dict:
+        bars = int(self.counts.sum())
+        masks = np.arange(_N_MASKS)
+        passed = {g: int(self.counts[(masks & b) != 0].sum())
+                  for g, b in GATES.items()}
+        out = {
+            "bars": bars,
+            "thresholds": {"adx": self.adx_threshold,
+                           "cmo": self.cmo_threshold},
+            "pass_rate": {g: (n / bars if bars else 0.0)
+                          for g, n in passed.items()},
+            "signals": {side: int(self.counts[(masks & need) == need].sum())
+                        for side, need in SIDES.items()},
+            "near_miss": {},
+            "top_masks": {describe(m): int(self.counts[m])
+                          for m in np.argsort(-self.counts, kind="stable")[:5]
+                          if self.counts[m]},
+        }
+        for side, need in SIDES.items():
+            missing = need & ~masks
+            blocked = {g: int(self.counts[missing == GATES[g]].sum())
+                       for g in GATES if GATES[g] & need}
+            side_out = {"blocked_by": blocked}
+            for gate in ("adx_level", f"cmo_{side}"):
+                n, total, low = self.shortfall[side, gate]
+                if n:
+                    side_out[f"{gate}_shortfall"] = {
+                        "mean": total / n, "min": low}
+            out["near_miss"][side] = side_out
+        return out
+
+    def format_report(self) -> str:
+        r = self.report()
+        lines = [f"bars={r['bars']} signals long={r['signals']['long']} "
+                 f"short={r['signals']['short']} "
+                 f"thr ADX={self.adx_threshold} CMO={self.cmo_threshold}"]
+        lines.append("pass rate: " + "  ".join(
+            f"{g}={p:.1%}" for g, p in r["pass_rate"].items()))
+        for side, nm in r["near_miss"].items():
+            blocked = "  ".join(f"{g}={n}" for g, n in nm["blocked_by"].items())
+            lines.append(f"near miss {side}: {blocked}")
+            for k, v in nm.items():
+                if k.endswith("_shortfall"):
+                    lines.append(f"  {k}: mean={v['mean']:.2f} "
+                                 f"min={v['min']:.2f}")
+        return "\n".join(lines)
+
+
+# ---- live loop ----
+
+_live: dict[str, GateStats] = {}
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+path = GATES_FILE  # per-process file when several bots share LOG_DIR
+
+
+def record(symbol: str, mask: int, row=None):
+    """
+    Count one live bar for `symbol`; writes GATES_FILE when it is due.
+    """
+    with _lock:
+        stats = _live.get(symbol)
+        if stats is None:
+            stats = _live[symbol] = GateStats()
+        stats.add(mask, row)
+    if time.monotonic() - _last_flush >= METRICS_FLUSH_SECONDS:
+        flush()
+
+
+def flush(out=None):
+    global _last_flush
+    out = out or path
+    with _lock:
+        if not _live:
+            return
+        payload = {s: st.report() for s, st in sorted(_live.items())}
+    tmp = out.with_suffix(".tmp")
+    tmp.write_text(json.dumps(payload, indent=2))
+    os.replace(tmp, out)
+    _last_flush = time.monotonic()
+
+
+if __name__ == "__main__":
+    from backtest import _read_bars
+    from strategy import compute_signals
+
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("bars_1h")
+    ap.add_argument("bars_4h")
+    ap.add_argument("--adx", type=float, default=ADX_THRESHOLD)
+    ap.add_argument("--cmo", type=float, default=CMO_THRESHOLD)
+    ap.add_argument("--json", default=None, help="also write the report here")
+    args = ap.parse_args()
+
+    sig = compute_signals(_read_bars(args.bars_1h), _read_bars(args.bars_4h),
+                          adx_threshold=args.adx, cmo_threshold=args.cmo)
+    stats = GateStats(args.adx, args.cmo)
+    stats.add_frame(sig)
+    print(stats.format_report())
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(stats.report(), f, indent=2)
@@ -0,0 +1,393 @@
+"""
+Asynchronous order execution driven by Alpaca's trade-updates stream.
+
+broker.flatten_if_opposite / submit_bracket_market cost a position lookup,
+a close and one or two submits per signal, all blocking and serial, and
+nothing confirms what happened afterwards. `AsyncExecutor` instead:
+
+- keeps a local `PositionBook`, seeded once from get_all_positions and then
+  moved only by fills reported on the trade-updates websocket, so deciding
+  whether to flatten needs no REST round trip;
+- tracks every order it sends (`OrderTrack`): status, cumulative and
+  partial fills, average price, and the submit -> ack (REST accepted) and
+  submit -> fill latencies, also recorded as metrics `exec.submit_ack` and
+  `exec.submit_fill`. Only the last EXEC_KEEP_DONE finished orders are
+  kept;
+- pipelines a flip: the entry goes out as soon as the stream reports the
+  close filled (EXEC_FLIP="after_fill"), or together with the close
+  (EXEC_FLIP="concurrent").
+
+Fills are applied per order from the cumulative filled quantity, so REST
+responses and stream events for the same order (in either order, or
+repeated) never double count.
+
+`ExecutionService` runs an executor on its own event loop thread so the
+synchronous poll loops can use it (main.process_row with ASYNC_EXECUTION):
+flatten_and_enter returns a future at once instead of blocking the poll
+loop while a flip waits for its close to fill.
+`trading` is any TradingClient-like object and `stream` anything with
+subscribe_trade_updates(handler), async _run_forever() and stop_ws(), e.g.
+sim_broker.SimTradingClient and SimTradeStream.
+
+Unlike the bar stream (stream.py, which runs alpaca's public run() in a
+worker thread and ends it with stop()), the trade stream is driven on the
+executor's own loop: run() would start a loop of its own, and trade
+updates must be handled where the order tracks' asyncio Events live.
+`_run_trade_stream` / `_stop_trade_stream` are the only places that use
+that private coroutine API.
+"""
+import asyncio
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+import metrics
+from broker import bracket_order_request, market_order_request
+from config import (
+    API_KEY, API_SECRET, PAPER, EXEC_FLIP, EXEC_FILL_TIMEOUT, EXEC_KEEP_DONE,
+    STREAM_RETRY_SECONDS
+)
+from logger import log_event
+from scheduler import call
+import broker_cache
+
+TERMINAL = {"filled", "canceled", "expired", "rejected", "done_for_day",
+            "replaced"}
+
+
+def _value(x) -> str:
+    return str(getattr(x, "value", x)).lower()
+
+
+def _float(x, default: float = 0.0) -> float:
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return default
+
+
+def _key(symbol: str) -> str:
+    # positions come back as "BTCUSD", orders as "BTC/USD"
+    return symbol.replace("/", "")
+
+
+def make_trade_stream():
+    from alpaca.trading.stream import TradingStream
+    return TradingStream(API_KEY, API_SECRET, paper=PAPER)
+
+
+async def _run_trade_stream(stream):
+    """
+    Serve a TradingStream on the running loop until stopped.
+    """
+    await stream._run_forever()
+
+
+async def _stop_trade_stream(stream):
+    stop = getattr(stream, "stop_ws", None)
+    if stop is not None:
+        await stop()
+
+
+class PositionBook:
+    """
+    Signed quantity per symbol, kept in step with fills.
+    """
+
+    def __init__(self):
+        self.qty: dict[str, float] = {}
+
+    def load(self, positions):
+        self.qty = {_key(p.symbol): _float(p.qty) for p in positions}
+
+    def apply(self, symbol: str, delta: float):
+        k = _key(symbol)
+        q = self.qty.get(k, 0.0) + delta
+        if abs(q) < 1e-12:
+            self.qty.pop(k, None)
+        else:
+            self.qty[k] = q
+
+    def get(self, symbol: str) -> float:
+        return self.qty.get(_key(symbol), 0.0)
+
+    def side(self, symbol: str) -> int:
+        q = self.get(symbol)
+        return (q > 0) - (q < 0)
+
+
+@dataclass
+class OrderTrack:
+    id: str
+    symbol: str
+    side: int
+    qty: float
+    status: str = "new"
+    filled_qty: float = 0.0
+    filled_avg_price: float | None = None
+    partial_fills: int = 0
+    submitted_ns: int | None = None
+    acked_ns: int | None = None
+    filled_ns: int | None = None
+    events: list = field(default_factory=list, repr=False)
+    done: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def ack_latency_ms(self) -> float | None:
+        if self.submitted_ns is None or self.acked_ns is None:
+            return None
+        return (self.acked_ns - self.submitted_ns) / 1e6
+
+    @property
+    def fill_latency_ms(self) -> float | None:
+        if self.submitted_ns is None or self.filled_ns is None:
+            return None
+        return (self.filled_ns - self.submitted_ns) / 1e6
+
+
+class AsyncExecutor:
+    def __init__(self, trading, stream=None, flip: str = EXEC_FLIP,
+                 fill_timeout: float = EXEC_FILL_TIMEOUT,
+                 keep_done: int = EXEC_KEEP_DONE):
+        self.trading = trading
+        self.stream = stream
+        self.flip = flip
+        self.fill_timeout = fill_timeout
+        self.keep_done = keep_done
+        self.book = PositionBook()
+        self.orders: dict[str, OrderTrack] = {}
+        self._done: OrderedDict[str, None] = OrderedDict()  # oldest first
+        self._stream_task: asyncio.Task | None = None
+
+    # ---- lifecycle ----
+
+    async def start(self):
+        await self.resync()
+        if self.stream is not None:
+            self.stream.subscribe_trade_updates(self.on_trade_update)
+            self._stream_task = asyncio.create_task(self._run_stream())
+
+    async def resync(self):
+        """
+        Reload positions from REST (startup, and after a reconnect where
+        fills may have been missed).
+        """
+        self.book.load(await asyncio.to_thread(
+            call, "account", self.trading.get_all_positions))
+
+    async def _run_stream(self):
+        while True:
+            try:
+                await _run_trade_stream(self.stream)
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log_event(f"trade stream error: {e}; reconnecting")
+                await asyncio.sleep(STREAM_RETRY_SECONDS)
+                await self.resync()
+
+    async def stop(self):
+        if self._stream_task is None:
+            return
+        await _stop_trade_stream(self.stream)
+        try:
+            await asyncio.wait_for(self._stream_task, 1.0)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            self._stream_task.cancel()
+        self._stream_task = None
+
+    # ---- order state ----
+
+    def _track(self, order, submitted_ns: int | None = None) -> OrderTrack:
+        oid = str(order.id)
+        track = self.orders.get(oid)
+        if track is None:
+            track = self.orders[oid] = OrderTrack(
+                id=oid, symbol=order.symbol,
+                side=1 if _value(order.side) == "buy" else -1,
+                qty=_float(order.qty))
+        if submitted_ns is not None:
+            # our own REST response; the stream may have beaten it here
+            track.submitted_ns = submitted_ns
+            track.acked_ns = time.perf_counter_ns()
+            metrics.registry.record("exec.submit_ack",
+                                    track.acked_ns - submitted_ns)
+            if track.filled_ns is not None:
+                metrics.registry.record("exec.submit_fill",
+                                        track.filled_ns - submitted_ns)
+        self._apply(track, order)
+        return track
+
+    def _apply(self, track: OrderTrack, order):
+        filled = _float(order.filled_qty)
+        if filled > track.filled_qty:
+            self.book.apply(track.symbol, track.side * (filled - track.filled_qty))
+            if filled < track.qty:
+                track.partial_fills += 1
+            track.filled_qty = filled
+            track.filled_avg_price = _float(order.filled_avg_price, None)
+        status = _value(order.status)
+        if track.status not in TERMINAL:
+            track.status = status
+        if track.status == "filled" and track.filled_ns is None:
+            track.filled_ns = time.perf_counter_ns()
+            if track.submitted_ns is not None:
+                metrics.registry.record("exec.submit_fill",
+                                        track.filled_ns - track.submitted_ns)
+        if track.status in TERMINAL and not track.done.is_set():
+            track.done.set()
+            self._retire(track)
+
+    def _retire(self, track: OrderTrack):
+        """
+        Forget the oldest finished orders beyond keep_done. Recent ones stay,
+        so a late or repeated update for them is not applied twice.
+        """
+        self._done[track.id] = None
+        while len(self._done) > self.keep_done:
+            oid, _ = self._done.popitem(last=False)
+            self.orders.pop(oid, None)
+
+    async def on_trade_update(self, update):
+        track = self._track(update.order)
+        track.events.append(_value(update.event))
+        if _value(update.event) in ("fill", "partial_fill"):
+            broker_cache.order_event(self.trading)
+            side = "buy" if track.side == 1 else "sell"
+            log_event(f"{_value(update.event)} {track.symbol} {side} "
+                      f"{track.filled_qty}/{track.qty} @ "
+                      f"{track.filled_avg_price} ({track.id})")
+
+    async def wait_done(self, track: OrderTrack,
+                        timeout: float | None = None) -> bool:
+        try:
+            await asyncio.wait_for(track.done.wait(),
+                                   self.fill_timeout if timeout is None
+                                   else timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    # ---- orders ----
+
+    async def _submit(self, order_data) -> OrderTrack:
+        t0 = time.perf_counter_ns()
+        order = await asyncio.to_thread(call, "orders",
+                                        self.trading.submit_order,
+                                        order_data=order_data)
+        return self._track(order, t0)
+
+    async def close_position(self, symbol: str) -> OrderTrack | None:
+        if self.book.side(symbol) == 0:
+            return None
+        t0 = time.perf_counter_ns()
+        order = await asyncio.to_thread(call, "orders",
+                                        self.trading.close_position, symbol)
+        return self._track(order, t0)
+
+    async def submit_entry(self, symbol: str, side: int, qty: float,
+                           last_close: float, atr: float) -> OrderTrack | None:
+        if qty <= 0 or side not in (-1, 1):
+            return None
+        try:
+            return await self._submit(bracket_order_request(
+                symbol, side, qty, last_close, atr))
+        except Exception as e:
+            log_event(f"{symbol}: bracket rejected ({e}); submitting a "
+                      f"simple market order")
+            return await self._submit(market_order_request(symbol, side, qty))
+
+    async def flatten_and_enter(self, symbol: str, side: int, qty: float,
+                                last_close: float,
+                                atr: float) -> OrderTrack | None:
+        """
+        Close an opposite position (per the local book) and enter `side`.
+        """
+        if self.book.side(symbol) not in (0, side):
+            if self.flip == "concurrent":
+                _, entry = await asyncio.gather(
+                    self.close_position(symbol),
+                    self.submit_entry(symbol, side, qty, last_close, atr))
+                return entry
+            close = await self.close_position(symbol)
+            if close is not None and self.stream is not None and \
+                    not await self.wait_done(close):
+                log_event(f"{symbol}: close {close.id} not filled after "
+                          f"{self.fill_timeout}s; entering anyway")
+        return await self.submit_entry(symbol, side, qty, last_close, atr)
+
+    def latencies(self) -> list[dict]:
+        return [{"id": t.id, "symbol": t.symbol, "status": t.status,
+                 "ack_ms": t.ack_latency_ms, "fill_ms": t.fill_latency_ms,
+                 "partial_fills": t.partial_fills}
+                for t in self.orders.values() if t.submitted_ns is not None]
+
+
+class ExecutionService:
+    """
+    An AsyncExecutor on a private event loop thread, with blocking
+    wrappers for synchronous callers.
+    """
+
+    def __init__(self, executor: AsyncExecutor):
+        self.executor = executor
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever,
+                                        name="execution", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        self.call(self.executor.start())
+        return self
+
+    def submit(self, coro) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call(self, coro, timeout: float | None = None):
+        return self.submit(coro).result(timeout)
+
+    def flatten_and_enter(self, symbol: str, side: int, qty: float,
+                          last_close: float, atr: float) -> Future:
+        """
+        Start a flatten + entry and return at once; the future resolves to
+        the entry's OrderTrack (or None) once it has been sent. Its fills
+        are tracked by the executor.
+        """
+        return self.submit(self.executor.flatten_and_enter(
+            symbol, side, qty, last_close, atr))
+
+    def stop(self):
+        try:
+            self.call(self.executor.stop(), timeout=5)
+        except Exception:
+            traceback.print_exc()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(5)
+
+
+_service: ExecutionService | None = None
+_service_lock = threading.Lock()
+
+
+def get_execution(trading) -> ExecutionService:
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = ExecutionService(
+                    AsyncExecutor(trading, make_trade_stream())).start()
+    return _service
+
+
+def stop_execution():
+    """
+    Stop the service, if one was started (end of a run loop).
+    """
+    global _service
+    with _service_lock:
+        service, _service = _service, None
+    if service is not None:
+        service.stop()
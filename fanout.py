@@ -0,0 +1,347 @@
+"""
+One bar fetcher shared by several strategy processes on the same box.
+
+Past a certain symbol count one Python process runs out of core, but
+workers that each poll Alpaca would multiply requests for bars they
+mostly share, and each would keep its own copy of the history. Here a
+single hub (`serve`) probes and fetches bars for every symbol in SYMBOLS,
+exactly as the portfolio runner does (latest-bar probe, one batched
+request per timeframe, bar cache), and publishes them on a Unix socket at
+FANOUT_SOCKET. Strategy workers (`worker`) each own a shard of the
+symbols. They subscribe to their shard, keep its frames locally and run
+the portfolio decision path (portfolio.act_on_bars) on every update.
+Alpaca sees one fetcher however many workers run, and nothing leaves the
+machine.
+
+Protocol, both ways: a 4-byte big-endian length, then a pickle. A worker
+sends {"op": "subscribe", "symbols": [...]}. The hub answers with the
+full frames it holds for those symbols. After each fetch it sends every
+subscriber {"op": "bars", "bars": {symbol: (df_1h, df_4h)}} containing
+the bars from the previous newest bar on, since that bar may have been
+revised. Only this bot's own processes use the socket (pickle, like the
+snapshots).
+
+Each worker writes its metrics and gate stats to its own file. Orders
+and events go to the shared, append-only logs, and bot state to the
+shared state database (state.py notices the other workers' commits).
+Request budgets are per process, so the workers split the account's
+"trading" budget between them; bar requests are the hub's alone.
+
+    python fanout.py run --workers 4     # hub + 4 workers on this box
+    python fanout.py serve               # or start them separately
+    python fanout.py worker --shard 0 --of 4
+"""
+import argparse
+import asyncio
+import multiprocessing as mp
+import pickle
+import struct
+import traceback
+from pathlib import Path
+import pandas as pd
+from config import (
+    SYMBOLS, COLUMNAR, LOOKBACK_1H, LOOKBACK_4H, POLL_SECONDS,
+    STREAM_RETRY_SECONDS, FANOUT_SOCKET, FANOUT_WORKERS, METRICS_FILE,
+    GATES_FILE, RATE_LIMITS
+)
+import diagnostics
+import metrics
+import scheduler
+from metrics import span
+from bar_schedule import symbols_with_new_bar, seconds_to_next_poll
+from logger import log_event
+from state import get_last_bar_ts
+
+_HEADER = struct.Struct(">I")
+
+
+async def send(writer: asyncio.StreamWriter, msg: dict):
+    data = pickle.dumps(msg, protocol=pickle.HIGHEST_PROTOCOL)
+    writer.write(_HEADER.pack(len(data)) + data)
+    await writer.drain()
+
+
+async def recv(reader: asyncio.StreamReader) -> dict:
+    (size,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    return pickle.loads(await reader.readexactly(size))
+
+
+def shard(symbols: list[str], n: int, i: int) -> list[str]:
+    """
+    Symbols owned by worker `i` of `n`.
+    """
+    return list(symbols)[i::n]
+
+
+def _since(df: pd.DataFrame, prev: pd.DataFrame | None) -> pd.DataFrame:
+    """
+    Rows of `df` from the newest row of `prev` on (all of it if none).
+    """
+    if prev is None or prev.empty:
+        return df
+    return df[df.index >= prev.index[-1]]
+
+
+def merge(old: pd.DataFrame | None, new: pd.DataFrame,
+          keep: int) -> pd.DataFrame:
+    """
+    `old` with the rows from `new`'s first bar on replaced by `new`,
+    trimmed to the last `keep` bars.
+    """
+    if old is None or old.empty:
+        return new.iloc[-keep:]
+    if new.empty:
+        return old
+    return pd.concat([old[old.index < new.index[0]], new]).iloc[-keep:]
+
+
+class BarHub:
+    """
+    Latest frames per symbol and the workers subscribed to them.
+    """
+
+    def __init__(self, symbols: list[str], fetch=None):
+        self.symbols = list(symbols)
+        self.fetch = fetch
+        self.frames: dict[str, tuple] = {}
+        self.subs: dict[asyncio.StreamWriter, set] = {}
+        self.last_published: dict[str, str | None] = \
+            {s: None for s in self.symbols}
+
+    async def handle(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter):
+        try:
+            msg = await recv(reader)
+            if msg.get("op") != "subscribe":
+                return
+            symbols = set(msg["symbols"])
+            # register and queue the catch-up frames without yielding, so
+            # no publish can slip in between
+            self.subs[writer] = symbols
+            known = {s: self.frames[s] for s in msg["symbols"]
+                     if s in self.frames}
+            log_event(f"fanout: worker subscribed to {len(symbols)} symbols")
+            if known:
+                await send(writer, {"op": "bars", "bars": known})
+            await reader.read()  # returns at EOF: the worker went away
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.subs.pop(writer, None)
+            writer.close()
+
+    async def _send(self, writer, msg):
+        try:
+            await send(writer, msg)
+        except ConnectionError:
+            self.subs.pop(writer, None)
+
+    async def publish(self, bars: dict) -> int:
+        """
+        Store freshly fetched {symbol: (df_1h, df_4h)} and push what is new
+        to every subscriber of those symbols. Returns the symbols published.
+        """
+        delta = {}
+        for symbol, (df_1h, df_4h) in bars.items():
+            if df_1h.empty or df_4h.empty:
+                continue
+            old_1h, old_4h = self.frames.get(symbol, (None, None))
+            delta[symbol] = (_since(df_1h, old_1h), _since(df_4h, old_4h))
+            self.frames[symbol] = (df_1h, df_4h)
+            self.last_published[symbol] = df_1h.index[-1].isoformat()
+        sends = []
+        for writer, symbols in list(self.subs.items()):
+            mine = {s: d for s, d in delta.items() if s in symbols}
+            if mine:
+                sends.append(self._send(writer, {"op": "bars", "bars": mine}))
+        await asyncio.gather(*sends)
+        return len(delta)
+
+    async def run(self):
+        """
+        Probe/fetch/publish loop on the bar-close schedule.
+        """
+        fetch = self.fetch
+        if fetch is None:
+            from data import get_1h_and_4h_multi as fetch
+        while True:
+            delay = POLL_SECONDS
+            try:
+                with span("fanout.probe"):
+                    due = await asyncio.to_thread(
+                        symbols_with_new_bar, self.symbols,
+                        self.last_published)
+                if due:
+                    with span("fanout.fetch_bars"):
+                        bars = await asyncio.to_thread(fetch, due)
+                    with span("fanout.publish"):
+                        await self.publish(bars)
+                delay = seconds_to_next_poll(
+                    list(self.last_published.values()))
+            except Exception as e:
+                log_event(f"fanout ERROR: {e}")
+                print("EXCEPTION ->", e)
+                traceback.print_exc()
+            metrics.maybe_flush()
+            await asyncio.sleep(delay)
+
+
+async def serve(symbols: list[str] = SYMBOLS, path: Path = FANOUT_SOCKET,
+                hub: BarHub | None = None):
+    hub = hub or BarHub(symbols)
+    path = Path(path)
+    path.unlink(missing_ok=True)
+    server = await asyncio.start_unix_server(hub.handle, path=str(path))
+    log_event(f"fanout: serving {len(hub.symbols)} symbols on {path}")
+    async with server:
+        await hub.run()
+
+
+class ShardFeed:
+    """
+    A worker's copy of its symbols' frames, kept up to date from the hub.
+    """
+
+    def __init__(self):
+        self.frames: dict[str, tuple] = {}
+
+    def apply(self, bars: dict) -> dict:
+        """
+        Merge an update and return the full frames of the symbols in it.
+        """
+        out = {}
+        for symbol, (df_1h, df_4h) in bars.items():
+            old_1h, old_4h = self.frames.get(symbol, (None, None))
+            out[symbol] = self.frames[symbol] = (
+                merge(old_1h, df_1h, LOOKBACK_1H),
+                merge(old_4h, df_4h, LOOKBACK_4H))
+        return out
+
+
+async def subscribe(symbols: list[str], on_bars, path: Path = FANOUT_SOCKET,
+                    feed: ShardFeed | None = None):
+    """
+    Receive `symbols` from the hub and await on_bars({symbol: (df_1h,
+    df_4h)}) with the full frames after each update. Reconnects (and gets
+    the full frames again) whenever the hub goes away.
+    """
+    feed = feed or ShardFeed()
+    while True:
+        try:
+            reader, writer = await asyncio.open_unix_connection(str(path))
+            await send(writer, {"op": "subscribe", "symbols": list(symbols)})
+            while True:
+                msg = await recv(reader)
+                if msg.get("op") == "bars":
+                    await on_bars(feed.apply(msg["bars"]))
+        except (OSError, asyncio.IncompleteReadError) as e:
+            log_event(f"fanout: hub unavailable ({e}); retrying")
+            await asyncio.sleep(STREAM_RETRY_SECONDS)
+
+
+def run_worker(trading, symbols: list[str], name: str = "shard",
+               path: Path = FANOUT_SOCKET):
+    from main import market_closed, shutdown
+    from portfolio import make_pool, load_store, act_on_bars
+
+    last_processed = {s: get_last_bar_ts(s) for s in symbols}
+    store = load_store(symbols, name) if COLUMNAR else None
+    with make_pool() as pool:
+        async def on_bars(bars: dict):
+            nonlocal last_processed
+            try:
+                with span("fanout.worker"):
+                    if not market_closed(trading):
+                        # blocking REST; keep the socket reader free
+                        last_processed = await asyncio.to_thread(
+                            act_on_bars, trading, bars, pool,
+                            last_processed, store, name)
+            except Exception as e:
+                log_event(f"ERROR: {e}")
+                print("EXCEPTION ->", e)
+                traceback.print_exc()
+            metrics.maybe_flush()
+
+        try:
+            asyncio.run(subscribe(symbols, on_bars, path))
+        except KeyboardInterrupt:
+            log_event(f"{name}: keyboard interrupt -> exiting")
+            print("Exiting.")
+        finally:
+            shutdown()
+
+
+def _per_process_files(name: str):
+    metrics.registry.path = METRICS_FILE.with_name(f"metrics-{name}.json")
+    diagnostics.path = GATES_FILE.with_name(f"gates-{name}.json")
+
+
+def _share_budget(workers: int):
+    """
+    This worker's part of the per-account trading budget.
+    """
+    scheduler.scheduler.set_limits(
+        scheduler.split(RATE_LIMITS, {"trading": workers}))
+
+
+def serve_main():
+    _per_process_files("hub")
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        log_event("fanout: keyboard interrupt -> exiting")
+    finally:
+        metrics.flush()
+        FANOUT_SOCKET.unlink(missing_ok=True)
+
+
+def worker_main(i: int, n: int):
+    from clients import get_trading_client
+
+    name = f"shard{i}of{n}"
+    _per_process_files(name)
+    _share_budget(n)
+    symbols = shard(SYMBOLS, n, i)
+    if not symbols:
+        print(f"{name}: no symbols in this shard")
+        return
+    print(f"{name}: {','.join(symbols)}")
+    log_event(f"{name}: starting worker")
+    run_worker(get_trading_client(), symbols, name)
+
+
+def run_all(workers: int = FANOUT_WORKERS):
+    """
+    The hub and `workers` strategy processes, until interrupted.
+    """
+    ctx = mp.get_context("spawn")
+    procs = [ctx.Process(target=serve_main, name="fanout-hub")]
+    procs += [ctx.Process(target=worker_main, args=(i, workers),
+                          name=f"fanout-shard{i}") for i in range(workers)]
+    for p in procs:
+        p.start()
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.join(10)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("serve")
+    w = sub.add_parser("worker")
+    w.add_argument("--shard", type=int, required=True)
+    w.add_argument("--of", type=int, required=True)
+    r = sub.add_parser("run")
+    r.add_argument("--workers", type=int, default=FANOUT_WORKERS)
+    args = ap.parse_args()
+
+    if args.cmd == "serve":
+        serve_main()
+    elif args.cmd == "worker":
+        worker_main(args.shard, args.of)
+    else:
+        run_all(args.workers)
@@ -0,0 +1,334 @@
+"""
+Streaming indicator engine.
+
+Each state object consumes one value per closed bar and returns the new
+indicator value in constant time, mirroring the pandas implementations in
+indicators.py step for step (same recurrences, same warmup rules, same
+NaN handling) so a bar-by-bar run over a history reproduces the columns
+compute_signals builds from the full frame.
+"""
+import math
+import numpy as np
+import pandas as pd
+
+NAN = float("nan")
+
+
+def _div(num: float, den: float) -> float:
+    """
+    Division with NumPy semantics (x/0 -> ±inf, 0/0 -> nan) instead of
+    raising ZeroDivisionError.
+    """
+    if den == 0:
+        if num == 0 or num != num:
+            return NAN
+        return math.copysign(math.inf, num) * math.copysign(1.0, den)
+    return num / den
+
+
+def _clone(obj):
+    """
+    Deep copy of a state object tree (slotted states, tuples of states and
+    float buffers), several times faster than copy.deepcopy.
+    """
+    slots = getattr(type(obj), "__slots__", None)
+    if slots is not None:
+        new = object.__new__(type(obj))
+        for name in slots:
+            setattr(new, name, _clone(getattr(obj, name)))
+        return new
+    if isinstance(obj, tuple):
+        return tuple(_clone(x) for x in obj)
+    if isinstance(obj, list):
+        return obj[:]  # RollingSum buffers hold floats only
+    return obj
+
+
+class EMAState:
+    """
+    `Series.ewm(alpha=..., adjust=False).mean()` one value at a time.
+    """
+    __slots__ = ("alpha", "value", "_old_wt")
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.value = NAN
+        self._old_wt = 1.0
+
+    @classmethod
+    def from_span(cls, span: int) -> "EMAState":
+        return cls(2.0 / (span + 1.0))
+
+    def update(self, x: float) -> float:
+        alpha = self.alpha
+        w = self.value
+        if w == w:
+            self._old_wt *= 1.0 - alpha
+            if x == x:
+                if w != x:
+                    w = (self._old_wt * w + alpha * x) / (self._old_wt + alpha)
+                self._old_wt = 1.0
+        elif x == x:
+            w = x
+        self.value = w
+        return w
+
+
+class TEMAState:
+    """
+    Incremental counterpart of indicators.tema.
+    """
+    __slots__ = ("span", "ema1", "ema2", "ema3", "value")
+
+    def __init__(self, span: int):
+        self.span = span
+        self.ema1 = EMAState.from_span(span)
+        self.ema2 = EMAState.from_span(span)
+        self.ema3 = EMAState.from_span(span)
+        self.value = NAN
+
+    def update(self, x: float) -> float:
+        e1 = self.ema1.update(x)
+        e2 = self.ema2.update(e1)
+        e3 = self.ema3.update(e2)
+        self.value = 3 * (e1 - e2) + e3
+        return self.value
+
+
+class RollingSum:
+    """
+    Fixed-window rolling sum/mean with pandas' compensated add/remove
+    bookkeeping (min_periods == window).
+    """
+    __slots__ = ("window", "_buf", "_pos", "_count", "_nobs", "_sum",
+                 "_comp_add", "_comp_rem", "_same", "_prev")
+
+    def __init__(self, window: int):
+        self.window = window
+        self._buf = [NAN] * window
+        self._pos = 0
+        self._count = 0
+        self._nobs = 0
+        self._sum = 0.0
+        self._comp_add = 0.0
+        self._comp_rem = 0.0
+        self._same = 0
+        self._prev = NAN
+
+    def _remove(self, val: float):
+        if val == val:
+            self._nobs -= 1
+            y = -val - self._comp_rem
+            t = self._sum + y
+            self._comp_rem = t - self._sum - y
+            self._sum = t
+
+    def _add(self, val: float):
+        if val == val:
+            self._nobs += 1
+            y = val - self._comp_add
+            t = self._sum + y
+            self._comp_add = t - self._sum - y
+            self._sum = t
+            if val == self._prev:
+                self._same += 1
+            else:
+                self._same = 1
+            self._prev = val
+
+    def push(self, x: float):
+        if self._count >= self.window:
+            self._remove(self._buf[self._pos])
+        self._add(x)
+        self._buf[self._pos] = x
+        self._pos = (self._pos + 1) % self.window
+        self._count += 1
+
+    def sum(self) -> float:
+        if self._nobs < self.window:
+            return NAN
+        if self._same >= self._nobs:
+            return self._prev * self._nobs
+        return self._sum
+
+    def mean(self) -> float:
+        if self._nobs < self.window:
+            return NAN
+        if self._same >= self._nobs:
+            return self._prev
+        return self._sum / self._nobs
+
+
+class RMAState:
+    """
+    Wilder smoothing as done by the `rma` helper in compute_adx_wilder:
+    an alpha=1/n EMA from the first bar whose n-th output is replaced by
+    the simple mean of the first n inputs.
+    """
+    __slots__ = ("n", "ema", "_count", "_seed_sum", "_seed_nobs")
+
+    def __init__(self, n: int):
+        self.n = n
+        self.ema = EMAState(1.0 / n)
+        self._count = 0
+        self._seed_sum = 0.0
+        self._seed_nobs = 0
+
+    def update(self, x: float) -> float:
+        value = self.ema.update(x)
+        self._count += 1
+        if self._count <= self.n and x == x:
+            self._seed_sum += x
+            self._seed_nobs += 1
+        if self._count == self.n:
+            return self._seed_sum / self._seed_nobs if self._seed_nobs else NAN
+        return value
+
+
+class CMOState:
+    """
+    Incremental counterpart of indicators.compute_cmo.
+    """
+    __slots__ = ("_up", "_down", "_prev_close")
+
+    def __init__(self, window: int = 14):
+        self._up = RollingSum(window)
+        self._down = RollingSum(window)
+        self._prev_close = NAN
+
+    def update(self, close: float) -> float:
+        delta = close - self._prev_close
+        self._prev_close = close
+        if delta == delta:
+            self._up.push(delta if delta > 0 else 0.0)
+            self._down.push(-delta if delta < 0 else 0.0)
+        else:
+            self._up.push(NAN)
+            self._down.push(NAN)
+        up = self._up.sum()
+        down = self._down.sum()
+        denom = up + down
+        if denom == 0:
+            return 0.0
+        cmo = 100 * (up - down) / denom
+        if cmo != cmo or math.isinf(cmo):
+            return 0.0
+        return cmo
+
+
+def _true_range(high: float, low: float, prev_close: float) -> float:
+    tr = high - low
+    if prev_close == prev_close:
+        tr = max(tr, abs(high - prev_close), abs(low - prev_close))
+    return tr
+
+
+class ATRState:
+    """
+    Incremental counterpart of indicators.compute_atr (rolling-mean ATR).
+    """
+    __slots__ = ("_tr", "_prev_close")
+
+    def __init__(self, window: int = 14):
+        self._tr = RollingSum(window)
+        self._prev_close = NAN
+
+    def update(self, high: float, low: float, close: float) -> float:
+        self._tr.push(_true_range(high, low, self._prev_close))
+        self._prev_close = close
+        return self._tr.mean()
+
+
+class ADXState:
+    """
+    Incremental counterpart of indicators.compute_adx_wilder.
+    """
+    __slots__ = ("_atr", "_plus", "_minus", "_adx",
+                 "_prev_high", "_prev_low", "_prev_close")
+
+    def __init__(self, window: int = 14):
+        self._atr = RMAState(window)
+        self._plus = RMAState(window)
+        self._minus = RMAState(window)
+        self._adx = RMAState(window)
+        self._prev_high = NAN
+        self._prev_low = NAN
+        self._prev_close = NAN
+
+    def update(self, high: float, low: float, close: float) -> float:
+        tr = _true_range(high, low, self._prev_close)
+        up_move = high - self._prev_high
+        down_move = self._prev_low - low
+        plus_dm = up_move if (up_move > down_move and up_move > 0) else 0.0
+        minus_dm = down_move if (down_move > up_move and down_move > 0) \
+            else 0.0
+        self._prev_high = high
+        self._prev_low = low
+        self._prev_close = close
+
+        atr = self._atr.update(tr)
+        plus_di = _div(100.0 * self._plus.update(plus_dm), atr)
+        minus_di = _div(100.0 * self._minus.update(minus_dm), atr)
+        denom = plus_di + minus_di
+        dx = NAN if denom == 0 else _div(100.0 * abs(plus_di - minus_di),
+                                         denom)
+        return self._adx.update(dx)
+
+
+class IndicatorEngine:
+    """
+    Bundle of incremental indicators for one timeframe.
+
+    `update(bar)` takes a mapping with high/low/close for one closed bar
+    and returns the new row, keyed like the columns compute_signals adds
+    (TEMA<span>, ADX, CMO, ATR).
+    """
+    __slots__ = ("temas", "adx", "cmo", "atr", "bars")
+
+    def __init__(self,
+                 tema_spans=(10, 80),
+                 window: int = 14,
+                 adx: bool = True,
+                 cmo: bool = True,
+                 atr: bool = True):
+        self.temas = tuple(TEMAState(s) for s in tema_spans)
+        self.adx = ADXState(window) if adx else None
+        self.cmo = CMOState(window) if cmo else None
+        self.atr = ATRState(window) if atr else None
+        self.bars = 0
+
+    def update(self, bar) -> dict:
+        high = float(bar["high"])
+        low = float(bar["low"])
+        close = float(bar["close"])
+        row = {}
+        for t in self.temas:
+            row[f"TEMA{t.span}"] = t.update(close)
+        if self.adx is not None:
+            row["ADX"] = self.adx.update(high, low, close)
+        if self.cmo is not None:
+            row["CMO"] = self.cmo.update(close)
+        if self.atr is not None:
+            row["ATR"] = self.atr.update(high, low, close)
+        self.bars += 1
+        return row
+
+    def copy(self) -> "IndicatorEngine":
+        """
+        Independent snapshot, e.g. to re-apply a revised bar.
+        """
+        return _clone(self)
+
+    def run(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Feed every row of an OHLC frame and return the indicator rows
+        (same index), e.g. to warm the engine up from history.
+        """
+        high = df["high"].to_numpy(dtype=np.float64)
+        low = df["low"].to_numpy(dtype=np.float64)
+        close = df["close"].to_numpy(dtype=np.float64)
+        rows = [
+            self.update({"high": h, "low": lo, "close": c})
+            for h, lo, c in zip(high.tolist(), low.tolist(), close.tolist())
+        ]
+        return pd.DataFrame(rows, index=df.index)
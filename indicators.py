@@ -1,3 +1,4 @@
+import functools
 import numpy as np
 import pandas as pd
 
@@ -110,3 +111,205 @@ def compute_adx_wilder(ohlc: pd.DataFrame, window: int = 14) -> pd.Series:
     adx = rma(dx, window)
 
     return adx
+
+
+_EMA_BLOCK = 64
+
+
+def _ema_rows_scan(x: np.ndarray, alphas: np.ndarray) -> np.ndarray:
+    """
+    Exact adjust=False EWM of each row of `x` (k, n), one step at a time,
+    with pandas' NaN bookkeeping. Used when the input contains NaNs.
+    """
+    k, n = x.shape
+    out = np.empty((k, n), dtype=np.float64)
+    for j in range(k):
+        alpha = float(alphas[j])
+        w, old_wt = np.nan, 1.0
+        row = x[j].tolist()
+        for i in range(n):
+            xi = row[i]
+            if w == w:
+                old_wt *= 1.0 - alpha
+                if xi == xi:
+                    if w != xi:
+                        w = (old_wt * w + alpha * xi) / (old_wt + alpha)
+                    old_wt = 1.0
+            elif xi == xi:
+                w = xi
+            row[i] = w
+        out[j] = row
+    return out
+
+
+def _ema_rows(x: np.ndarray, alphas: np.ndarray) -> np.ndarray:
+    """
+    adjust=False EWM of each row of `x` (k, n), row j with alphas[j].
+
+    The recurrence y[t] = d*y[t-1] + a*x[t] (d = 1-a, seeded with x[0]) is
+    solved in blocks of _EMA_BLOCK bars: within a block it is one batched
+    matmul against a lower-triangular decay matrix, and only the block
+    boundaries are carried sequentially. Agrees with pandas to ~1e-14
+    relative; inputs with NaNs take the exact scan instead.
+    """
+    k, n = x.shape
+    if n == 0:
+        return np.empty((k, 0), dtype=np.float64)
+    if np.isnan(x).any():
+        return _ema_rows_scan(x, alphas)
+
+    B = _EMA_BLOCK
+    nb = -(-n // B)
+    pad = nb * B - n
+    if pad:
+        x = np.concatenate([x, np.repeat(x[:, -1:], pad, axis=1)], axis=1)
+
+    a = alphas[:, None, None]
+    step = np.arange(B)
+    lag = step[:, None] - step[None, :]
+    decay_mat = np.where(lag >= 0, a * (1.0 - a) ** np.maximum(lag, 0), 0.0)
+    z = np.matmul(x.reshape(k, nb, B), np.swapaxes(decay_mat, 1, 2))
+
+    decay = (1.0 - alphas)[:, None] ** (step + 1)[None, :]   # (k, B)
+    carry = np.empty((k, nb), dtype=np.float64)
+    prev = x[:, 0].copy()
+    block_decay = decay[:, -1]
+    block_last = z[:, :, -1]
+    for b in range(nb):
+        carry[:, b] = prev
+        prev = block_decay * prev + block_last[:, b]
+
+    z += carry[:, :, None] * decay[:, None, :]
+    return z.reshape(k, nb * B)[:, :n]
+
+
+def _alphas(spans) -> np.ndarray:
+    return 2.0 / (np.asarray(list(spans), dtype=np.float64) + 1.0)
+
+
+def ema_batch(values, spans, out: np.ndarray | None = None) -> np.ndarray:
+    """
+    EMA(span) of `values` for several spans at once.
+    Returns an (n, len(spans)) float64 array, column j for spans[j],
+    matching `Series.ewm(span=s, adjust=False).mean()`.
+    """
+    alphas = _alphas(spans)
+    x = np.asarray(values, dtype=np.float64)
+    if out is None:
+        out = np.empty((len(x), len(alphas)), dtype=np.float64)
+    out[:] = _ema_rows(np.broadcast_to(x, (len(alphas), len(x))), alphas).T
+    return out
+
+
+@functools.lru_cache(maxsize=32)
+def _tema_filter(spans: tuple, B: int = _EMA_BLOCK):
+    """
+    The three stacked EMAs of a TEMA as one linear system per span: state
+    s = (e1, e2, e3), s[t] = A s[t-1] + b x[t], TEMA = c.s. Returns the
+    block matrices tema_batch uses: H (k, B, B) in-block impulse response,
+    G (k, B, 3) state-at-block-start to output, F (k, B, 3) inputs to the
+    state at block end, M (k, 3, 3) = A^B. Cached per span set.
+    """
+    alphas = _alphas(spans)
+    k = len(alphas)
+    a, d = alphas, 1.0 - alphas
+    A = np.zeros((k, 3, 3))
+    A[:, 0, 0] = A[:, 1, 1] = A[:, 2, 2] = d
+    A[:, 1, 0] = A[:, 2, 1] = a * d
+    A[:, 2, 0] = a * a * d
+    b = np.stack([a, a * a, a ** 3], axis=1)
+    P = np.empty((k, B + 1, 3, 3))  # A^0 .. A^B
+    P[:, 0] = np.eye(3)
+    for m in range(1, B + 1):
+        P[:, m] = P[:, m - 1] @ A
+    cP = np.array([3.0, -3.0, 1.0]) @ P  # (k, B + 1, 3)
+    h = np.einsum("kmi,ki->km", cP[:, :B], b)
+    lag = np.arange(B)[:, None] - np.arange(B)[None, :]
+    H = np.where(lag >= 0, h[:, np.maximum(lag, 0)], 0.0)
+    F = np.einsum("kmij,kj->kmi", P[:, B - 1::-1], b)
+    return H, cP[:, 1:], F, P[:, B]
+
+
+def tema_batch(values, spans, out: np.ndarray | None = None) -> np.ndarray:
+    """
+    TEMA(span) of `values` for several spans at once, written into one
+    (n, len(spans)) float64 array (pass `out` to reuse a buffer). Column j
+    matches `tema(pd.Series(values), spans[j])`; no pandas objects are
+    created.
+
+    The three EMA stages run fused, as one blocked linear recurrence over
+    the (e1, e2, e3) state: each block of the input is read once, by one
+    matmul per span, and only three state values per span are carried
+    from block to block. Inputs with NaNs take three _ema_rows passes.
+    """
+    alphas = _alphas(spans)
+    x = np.asarray(values, dtype=np.float64)
+    k, n = len(alphas), len(x)
+    if out is None:
+        out = np.empty((n, k), dtype=np.float64)
+    if n == 0:
+        return out
+    if np.isnan(x).any():
+        e1 = _ema_rows(np.broadcast_to(x, (k, n)), alphas)
+        e2 = _ema_rows(e1, alphas)
+        e3 = _ema_rows(e2, alphas)
+        out[:] = (3 * (e1 - e2) + e3).T
+        return out
+
+    B = _EMA_BLOCK
+    H, G, F, M = _tema_filter(tuple(float(s) for s in spans), B)
+    nb = -(-n // B)
+    pad = nb * B - n
+    if pad:
+        x = np.concatenate([x, np.repeat(x[-1:], pad)])
+    X = x.reshape(nb, B)[None]
+    y = np.matmul(X, np.swapaxes(H, 1, 2))   # (k, nb, B)
+    u = np.matmul(X, F)                      # (k, nb, 3)
+
+    # state at each block start; all three EMAs are seeded with x[0]
+    big = np.zeros((3 * k, 3 * k))
+    for j in range(k):
+        big[3 * j:3 * j + 3, 3 * j:3 * j + 3] = M[j]
+    u = np.swapaxes(u, 0, 1).reshape(nb, 3 * k)
+    start = np.empty((nb, 3 * k))
+    prev = np.full(3 * k, x[0])
+    for blk in range(nb):
+        start[blk] = prev
+        prev = big @ prev + u[blk]
+    start = np.swapaxes(start.reshape(nb, k, 3), 0, 1)
+
+    y += np.matmul(start, np.swapaxes(G, 1, 2))
+    out[:] = y.reshape(k, nb * B)[:, :n].T
+    return out
+
+
+def tema_step_batch(values, pos, x, spans,
+                    out: np.ndarray | None = None) -> np.ndarray:
+    """
+    TEMA(span) of values[:pos[i] + 1] followed by one more value x[i], for
+    every i and several spans at once: the indicator of a still-forming bar
+    `x` on top of the completed bars `values` (pos[i] = -1: none yet).
+    Returns an (len(x), len(spans)) float64 array, column j for spans[j].
+    """
+    alphas = _alphas(spans)
+    a = alphas[:, None]
+    v = np.asarray(values, dtype=np.float64)
+    pos = np.asarray(pos, dtype=np.int64)
+    x = np.asarray(x, dtype=np.float64)
+    have = pos >= 0
+    if out is None:
+        out = np.empty((len(x), len(alphas)), dtype=np.float64)
+
+    ema = np.broadcast_to(v, (len(alphas), len(v)))
+    step = np.broadcast_to(x, (len(alphas), len(x)))
+    steps = []
+    for _ in range(3):  # e1, e2, e3
+        ema = _ema_rows(ema, alphas)
+        prev = np.full(step.shape, np.nan)
+        prev[:, have] = ema[:, pos[have]]
+        # one adjust=False step; an EMA with no history starts at its input
+        step = np.where(prev == prev, a * step + (1 - a) * prev, step)
+        steps.append(step)
+    e1, e2, e3 = steps
+    out[:] = (3 * (e1 - e2) + e3).T
+    return out
@@ -0,0 +1,288 @@
+"""
+Fused array kernels for the 1h indicators (Wilder ADX, rolling ATR, CMO).
+
+indicators.py builds each of these from pandas pieces: compute_adx_wilder
+concatenates three Series for the true range and runs four ewm passes,
+compute_atr rebuilds the same true range, and compute_cmo runs two
+rolling sums. Here they share one true-range / directional-movement pass
+over plain float64 arrays:
+
+- with numba installed, `_fused_loop` computes all three in a single
+  compiled loop (pandas' EWM NaN rules and compensated rolling sums
+  replicated step by step);
+- otherwise the same outputs come from vectorized NumPy: the three RMAs
+  run as one multi-row EWM (indicators._ema_rows), the rolling windows as
+  sliding-window sums.
+
+Both paths agree with the pandas functions to ~1e-12 relative
+(tests/test_kernels.py).
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from indicators import _ema_rows
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:  # optional dependency
+    HAVE_NUMBA = False
+
+
+def _jit(fn):
+    return njit(cache=True, nogil=True, error_model="numpy")(fn) \
+        if HAVE_NUMBA else fn
+
+
+def _as_f64(x) -> np.ndarray:
+    return np.ascontiguousarray(x, dtype=np.float64)
+
+
+# ---- compiled path ----
+
+@_jit
+def _fused_loop(high, low, close, n, adx, atr, cmo):
+    m = high.shape[0]
+    alpha = 1.0 / n
+    # EWM state for RMA(tr), RMA(+dm), RMA(-dm), RMA(dx)
+    w = np.full(4, np.nan)
+    old_wt = np.ones(4)
+    seed = np.zeros(4)
+    seed_n = np.zeros(4)
+    # compensated rolling sums: tr, up, down
+    buf = np.full((3, n), np.nan)
+    s = np.zeros(3)
+    comp_add = np.zeros(3)
+    comp_rem = np.zeros(3)
+    nobs = np.zeros(3)
+    same = np.zeros(3)
+    prev = np.full(3, np.nan)
+    vals = np.empty(4)
+    roll = np.empty(3)
+    rsum = np.empty(3)
+    rmean = np.empty(3)
+
+    for i in range(m):
+        h, lo, c = high[i], low[i], close[i]
+        tr = h - lo
+        if i > 0:
+            pc = close[i - 1]
+            if pc == pc:
+                a1 = abs(h - pc)
+                a2 = abs(lo - pc)
+                if not (tr >= a1) and a1 == a1:
+                    tr = a1
+                if not (tr >= a2) and a2 == a2:
+                    tr = a2
+            up = h - high[i - 1]
+            dn = low[i - 1] - lo
+            pdm = up if (up > dn and up > 0) else 0.0
+            mdm = dn if (dn > up and dn > 0) else 0.0
+            delta = c - pc
+        else:
+            pdm = 0.0
+            mdm = 0.0
+            delta = np.nan
+
+        # ---- rolling windows (ATR mean, CMO up/down sums) ----
+        if delta == delta:
+            roll[1] = delta if delta > 0 else 0.0
+            roll[2] = -delta if delta < 0 else 0.0
+        else:
+            roll[1] = np.nan
+            roll[2] = np.nan
+        roll[0] = tr
+        pos = i % n
+        for j in range(3):
+            if i >= n:
+                old = buf[j, pos]
+                if old == old:
+                    nobs[j] -= 1
+                    y = -old - comp_rem[j]
+                    t = s[j] + y
+                    comp_rem[j] = t - s[j] - y
+                    s[j] = t
+            v = roll[j]
+            if v == v:
+                nobs[j] += 1
+                y = v - comp_add[j]
+                t = s[j] + y
+                comp_add[j] = t - s[j] - y
+                s[j] = t
+                if v == prev[j]:
+                    same[j] += 1
+                else:
+                    same[j] = 1
+                prev[j] = v
+            buf[j, pos] = v
+            if nobs[j] < n:
+                rsum[j] = np.nan
+                rmean[j] = np.nan
+            elif same[j] >= nobs[j]:
+                rsum[j] = prev[j] * nobs[j]
+                rmean[j] = prev[j]
+            else:
+                rsum[j] = s[j]
+                rmean[j] = s[j] / nobs[j]
+        atr[i] = rmean[0]
+        denom = rsum[1] + rsum[2]
+        if denom == 0 or denom != denom:
+            cmo[i] = 0.0
+        else:
+            r = 100.0 * (rsum[1] - rsum[2]) / denom
+            cmo[i] = r if (r == r and abs(r) != np.inf) else 0.0
+
+        # ---- Wilder RMAs ----
+        vals[0] = tr
+        vals[1] = pdm
+        vals[2] = mdm
+        for j in range(3):
+            x = vals[j]
+            if w[j] == w[j]:
+                old_wt[j] *= 1.0 - alpha
+                if x == x:
+                    if w[j] != x:
+                        w[j] = (old_wt[j] * w[j] + alpha * x) / (old_wt[j] + alpha)
+                    old_wt[j] = 1.0
+            elif x == x:
+                w[j] = x
+            if i < n and x == x:
+                seed[j] += x
+                seed_n[j] += 1
+            vals[j] = w[j]
+            if i == n - 1:
+                vals[j] = seed[j] / seed_n[j] if seed_n[j] > 0 else np.nan
+
+        a_tr, a_p, a_m = vals[0], vals[1], vals[2]
+        plus_di = 100.0 * a_p / a_tr
+        minus_di = 100.0 * a_m / a_tr
+        tot = plus_di + minus_di
+        dx = np.nan if (tot == 0 or tot != tot) else \
+            100.0 * abs(plus_di - minus_di) / tot
+
+        x = dx
+        if w[3] == w[3]:
+            old_wt[3] *= 1.0 - alpha
+            if x == x:
+                if w[3] != x:
+                    w[3] = (old_wt[3] * w[3] + alpha * x) / (old_wt[3] + alpha)
+                old_wt[3] = 1.0
+        elif x == x:
+            w[3] = x
+        if i < n and x == x:
+            seed[3] += x
+            seed_n[3] += 1
+        adx[i] = w[3]
+        if i == n - 1:
+            adx[i] = seed[3] / seed_n[3] if seed_n[3] > 0 else np.nan
+
+    if m < n:
+        adx[:] = np.nan
+
+
+# ---- NumPy path ----
+
+def _tr_dm(high, low, close):
+    prev_close = np.empty_like(close)
+    prev_close[0] = np.nan
+    prev_close[1:] = close[:-1]
+    tr = np.fmax(high - low,
+                 np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    up = np.empty_like(high)
+    dn = np.empty_like(low)
+    up[0] = dn[0] = np.nan
+    up[1:] = high[1:] - high[:-1]
+    dn[1:] = low[:-1] - low[1:]
+    pdm = np.where((up > dn) & (up > 0), up, 0.0)
+    mdm = np.where((dn > up) & (dn > 0), dn, 0.0)
+    return tr, pdm, mdm
+
+
+def _rolling_sum(x: np.ndarray, n: int) -> np.ndarray:
+    """
+    Window sums with min_periods == n (NaN inside a window -> NaN).
+    """
+    out = np.full(len(x), np.nan)
+    if len(x) >= n:
+        out[n - 1:] = sliding_window_view(x, n).sum(axis=1)
+    return out
+
+
+def _rma_rows(x: np.ndarray, n: int) -> np.ndarray:
+    """
+    Wilder RMA of each row, seeded like compute_adx_wilder's `rma`.
+
+    A row whose NaNs all lead it (dx always does: there is no directional
+    movement at bar 0) runs the blocked EMA from its first value, where
+    pandas starts it too; only NaNs further in take _ema_rows' exact scan.
+    """
+    alphas = np.full(len(x), 1.0 / n)
+    valid = ~np.isnan(x)
+    first = valid.argmax(axis=1)
+    if all(valid[j, f:].all() for j, f in enumerate(first)):
+        r = np.full(x.shape, np.nan)
+        for f in np.unique(first):
+            rows = first == f
+            r[rows, f:] = _ema_rows(x[rows, f:], alphas[rows])
+    else:
+        r = _ema_rows(x, alphas)
+    with np.errstate(invalid="ignore"):
+        head = x[:, :n]
+        cnt = (~np.isnan(head)).sum(axis=1)
+        r[:, n - 1] = np.where(cnt > 0, np.nansum(head, axis=1) / np.maximum(cnt, 1),
+                               np.nan)
+    return r
+
+
+def _fused_numpy(high, low, close, n):
+    m = len(close)
+    tr, pdm, mdm = _tr_dm(high, low, close)
+
+    atr = _rolling_sum(tr, n) / n
+
+    delta = np.empty(m)
+    delta[0] = np.nan
+    delta[1:] = close[1:] - close[:-1]
+    up = _rolling_sum(np.where(np.isnan(delta), np.nan, np.clip(delta, 0, None)), n)
+    down = _rolling_sum(np.where(np.isnan(delta), np.nan, -np.clip(delta, None, 0)), n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        denom = up + down
+        cmo = 100 * (up - down) / np.where(denom == 0, np.nan, denom)
+    cmo[~np.isfinite(cmo)] = 0.0
+
+    if m < n:
+        return np.full(m, np.nan), atr, cmo
+    rtr, rp, rm = _rma_rows(np.vstack([tr, pdm, mdm]), n)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        plus_di = 100.0 * rp / rtr
+        minus_di = 100.0 * rm / rtr
+        tot = plus_di + minus_di
+        dx = 100.0 * np.abs(plus_di - minus_di) / np.where(tot == 0, np.nan, tot)
+    adx = _rma_rows(dx[None, :], n)[0]
+    return adx, atr, cmo
+
+
+# ---- public API ----
+
+def adx_atr_cmo(high, low, close, window: int = 14,
+                use_numba: bool | None = None):
+    """
+    (ADX, ATR, CMO) arrays matching compute_adx_wilder, compute_atr and
+    compute_cmo on the same bars.
+    """
+    high, low, close = _as_f64(high), _as_f64(low), _as_f64(close)
+    if use_numba if use_numba is not None else HAVE_NUMBA:
+        m = len(close)
+        adx, atr, cmo = np.empty(m), np.empty(m), np.empty(m)
+        _fused_loop(high, low, close, window, adx, atr, cmo)
+        return adx, atr, cmo
+    return _fused_numpy(high, low, close, window)
+
+
+def adx_wilder(high, low, close, window: int = 14) -> np.ndarray:
+    return adx_atr_cmo(high, low, close, window)[0]
+
+
+def atr(high, low, close, window: int = 14) -> np.ndarray:
+    high, low, close = _as_f64(high), _as_f64(low), _as_f64(close)
+    return _rolling_sum(_tr_dm(high, low, close)[0], window) / window
+
@@ -1,12 +1,251 @@
+"""
+Event and order logging off the trading hot path.
+
+log_event/log_order only timestamp the record and put it on a bounded
+in-memory queue; a background thread drains the queue in batches, keeps the
+files open, rotates them by size or UTC date and flushes once per batch. If
+the queue is full the record is dropped (and the drop count is logged
+later) rather than making the caller wait. Everything still queued is
+written at interpreter exit.
+
+With ORDER_JOURNAL on, orders are also appended to ORDER_JOURNAL_FILE as
+fixed-size little-endian records (JOURNAL_DTYPE), readable with
+read_journal().
+"""
+import atexit
 import csv
+import io
+import queue
+import struct
+import threading
+import time
 from datetime import datetime, timezone
-from config import ORDER_LOG, EVENT_LOG
+from pathlib import Path
+import numpy as np
+from config import (
+    ORDER_LOG, EVENT_LOG, ORDER_JOURNAL, ORDER_JOURNAL_FILE,
+    LOG_QUEUE_SIZE, LOG_BATCH, LOG_MAX_BYTES, LOG_ROTATE_DAILY
+)
+
+ORDER_HEADER = ["ts_utc", "symbol", "side", "qty", "price", "atr", "order_id"]
+
+_JOURNAL = struct.Struct("<d16sbddd40s")
+JOURNAL_DTYPE = np.dtype([
+    ("ts", "<f8"), ("symbol", "S16"), ("side", "i1"), ("qty", "<f8"),
+    ("price", "<f8"), ("atr", "<f8"), ("order_id", "S40"),
+])
+assert JOURNAL_DTYPE.itemsize == _JOURNAL.size
+
+_EVENT, _ORDER, _FLUSH, _STOP = range(4)
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+class _RotatingFile:
+    """
+    Append-mode file kept open between batches. Rolls over to
+    <stem>.<YYYY-MM-DD>[.<n>]<suffix> when it would exceed `max_bytes` or
+    a record from a later UTC day arrives.
+    """
+
+    def __init__(self, path: Path, binary: bool = False,
+                 header: list[str] | None = None,
+                 max_bytes: int = LOG_MAX_BYTES,
+                 daily: bool = LOG_ROTATE_DAILY):
+        self.path = Path(path)
+        self.binary = binary
+        self.header = header
+        self.max_bytes = max_bytes
+        self.daily = daily
+        self.f = None
+
+    def _open(self):
+        self.f = open(self.path, "ab" if self.binary else "a",
+                      **({} if self.binary else
+                         {"newline": "", "encoding": "utf-8"}))
+        self.size = self.f.tell()
+        st = self.path.stat()
+        self.day = datetime.fromtimestamp(
+            st.st_mtime if self.size else time.time(), timezone.utc).date()
+        if self.size == 0 and self.header:
+            csv.writer(self.f).writerow(self.header)
+            self.size = self.f.tell()
+
+    def _rotate(self):
+        self.f.close()
+        self.f = None
+        stem, suffix = self.path.stem, self.path.suffix
+        target = self.path.with_name(f"{stem}.{self.day}{suffix}")
+        n = 1
+        while target.exists():
+            target = self.path.with_name(f"{stem}.{self.day}.{n}{suffix}")
+            n += 1
+        self.path.rename(target)
+        self._open()
+
+    def prepare(self, ts: float, nbytes: int):
+        """
+        Open or roll the file before writing ~nbytes stamped `ts`.
+        """
+        if self.f is None:
+            self._open()
+        if self.size == 0:
+            return
+        day = datetime.fromtimestamp(ts, timezone.utc).date()
+        if (self.daily and day != self.day) or \
+                self.size + nbytes > self.max_bytes:
+            self._rotate()
+        self.day = day
+
+    def write(self, data):
+        self.f.write(data)
+        self.size += len(data)  # chars for text files: close enough
+
+    def flush(self):
+        if self.f is not None:
+            self.f.flush()
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+
+class AsyncLogWriter:
+    """
+    Bounded queue plus one daemon writer thread (started on first use).
+    """
+
+    def __init__(self, maxsize: int = LOG_QUEUE_SIZE, batch: int = LOG_BATCH,
+                 event_path: Path = EVENT_LOG, order_path: Path = ORDER_LOG,
+                 journal_path: Path | None = (ORDER_JOURNAL_FILE
+                                              if ORDER_JOURNAL else None)):
+        self.q: queue.Queue = queue.Queue(maxsize=maxsize)
+        self.batch = batch
+        self.events = _RotatingFile(event_path)
+        self.orders = _RotatingFile(order_path, header=ORDER_HEADER)
+        self.journal = _RotatingFile(journal_path, binary=True) \
+            if journal_path is not None else None
+        self.dropped = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="log-writer", daemon=True)
+                    self._thread.start()
+
+    def put(self, record: tuple) -> bool:
+        self._ensure_started()
+        try:
+            self.q.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    # ---- writer thread ----
+
+    def _run(self):
+        while True:
+            items = [self.q.get()]
+            while len(items) < self.batch:
+                try:
+                    items.append(self.q.get_nowait())
+                except queue.Empty:
+                    break
+            n = len(items)
+            stop = self._write(items)
+            for _ in range(n):
+                self.q.task_done()
+            if stop:
+                return
+
+    def _write(self, items: list) -> bool:
+        stop = False
+        waiters = []
+        if self.dropped:
+            n, self.dropped = self.dropped, 0
+            items.insert(0, (_EVENT, time.time(),
+                             f"logger: dropped {n} records (queue full)"))
+        for kind, *rest in items:
+            try:
+                if kind == _EVENT:
+                    ts, msg = rest
+                    line = f"[{_iso(ts)}] {msg}\n"
+                    self.events.prepare(ts, len(line))
+                    self.events.write(line)
+                elif kind == _ORDER:
+                    self._write_order(*rest)
+                elif kind == _FLUSH:
+                    waiters.append(rest[0])
+                elif kind == _STOP:
+                    stop = True
+            except Exception as e:
+                # a bad record (or full disk) must not kill the writer
+                print(f"[WARN] logger write failed: {e}")
+        for f in (self.events, self.orders, self.journal):
+            if f is not None:
+                f.flush()
+                if stop:
+                    f.close()
+        for w in waiters:
+            w.set()
+        return stop
+
+    def _write_order(self, ts, symbol, side, qty, price, atr, order_id):
+        buf = io.StringIO()
+        csv.writer(buf).writerow(
+            [_iso(ts), symbol, side, qty, price, atr, order_id or ""])
+        line = buf.getvalue()
+        self.orders.prepare(ts, len(line))
+        self.orders.write(line)
+        if self.journal is not None:
+            rec = _JOURNAL.pack(
+                ts, str(symbol).encode()[:16],
+                1 if side == "LONG" else -1 if side == "SHORT" else 0,
+                float(qty), float(price), float(atr),
+                str(order_id or "").encode()[:40])
+            self.journal.prepare(ts, len(rec))
+            self.journal.write(rec)
+
+    # ---- control ----
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        Block until everything queued so far is on disk (or `timeout`).
+        """
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        try:
+            self.q.put((_FLUSH, done), timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0):
+        if self._thread is None:
+            return
+        try:
+            self.q.put((_STOP,), timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+        self._thread = None
+
+
+_writer = AsyncLogWriter()
+atexit.register(_writer.close)
 
 
 def log_event(msg: str):
-    ts = datetime.now(timezone.utc).isoformat()
-    with open(EVENT_LOG, "a", encoding="utf-8") as f:
-        f.write(f"[{ts}] {msg}\n")
+    _writer.put((_EVENT, time.time(), msg))
 
 
 def log_order(
@@ -17,25 +256,16 @@ def log_order(
         atr: float,
         order_id: str | None
         ):
-    write_header = not ORDER_LOG.exists()
-    with open(ORDER_LOG, "a", newline="", encoding="utf-8") as f:
-        w = csv.writer(f)
-        if write_header:
-            w.writerow([
-                "ts_utc",
-                "symbol",
-                "side",
-                "qty",
-                "price",
-                "atr",
-                "order_id"
-            ])
-        w.writerow([
-            datetime.now(timezone.utc).isoformat(),
-            symbol,
-            side,
-            qty,
-            price,
-            atr,
-            order_id or ""
-        ])
+    _writer.put((_ORDER, time.time(), symbol, side, qty, price, atr,
+                 None if order_id is None else str(order_id)))
+
+
+def flush(timeout: float = 5.0) -> bool:
+    return _writer.flush(timeout)
+
+
+def read_journal(path: Path = ORDER_JOURNAL_FILE) -> np.ndarray:
+    """
+    Binary order journal as a structured array (fields of JOURNAL_DTYPE).
+    """
+    return np.fromfile(path, dtype=JOURNAL_DTYPE)
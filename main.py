@@ -13,15 +13,20 @@ import traceback
 from datetime import datetime, timezone
 
 from config import (
-    SYMBOL, IS_CRYPTO, POLL_SECONDS,
-    ADX_THRESHOLD, VOL_SPIKE_CAP, CMO_SIZE_FLOOR,
-    CMO_THRESHOLD, MAX_QTY, DEBUG_SIGNALS, BASE_EQUITY
+    SYMBOL, SYMBOLS, IS_CRYPTO, POLL_SECONDS, INGEST_MODE, ASYNC_EXECUTION,
+    VOL_SPIKE_CAP, MAX_QTY, DEBUG_SIGNALS, BASE_EQUITY, METRICS_PORT, SNAPSHOT
 )
 
+import diagnostics
+import metrics
+import snapshot
+from metrics import span
+from clients import get_trading_client
 from data import get_1h_and_4h
+from bar_schedule import has_new_bar, seconds_to_next_poll
 from strategy import compute_signals
 from broker import (
-    make_trading_client, get_equity, atr_position_size,
+    get_equity, atr_position_size, cmo_size_multiplier,
     flatten_if_opposite, submit_bracket_market, is_market_open
 )
 from logger import log_event, log_order
@@ -29,161 +34,268 @@ from state import get_last_bar_ts, set_last_bar_ts
 from risk import update_day_start_equity_if_new_day, should_pause_trading
 
 
+def process_signals(trading, sig, last_processed_iso: str | None,
+                    symbol: str = SYMBOL) -> str | None:
+    """
+    Act on the last row of a compute_signals frame if it is a bar we have
+    not handled yet. Returns the (possibly updated) last processed ISO ts.
+    """
+    if sig.empty:
+        return last_processed_iso
+
+    # TEMP: sanity check last 3 rows
+    cols = ["TEMA10", "TEMA80", "4h_TEMA20", "4h_TEMA70",
+            "ADX", "CMO", "ATR",
+            "ShortTrend_prev", "LongTrend_prev", "ADX_prev",
+            "ADX_slope_prev", "CMO_prev",
+            "long_signal", "short_signal", "entry_dir"]
+
+    # Work strictly on the last CLOSED 1h bar
+    return process_row(trading, sig.index[-1], sig.iloc[-1],
+                       last_processed_iso, symbol)
+
+
+def process_row(trading, last_ts, row, last_processed_iso: str | None,
+                symbol: str = SYMBOL) -> str | None:
+    """
+    Act on one signal row (a compute_signals row or a SignalState.row
+    mapping) for the 1h bar starting at tz-aware `last_ts`.
+    """
+    last_iso = last_ts.isoformat()
+
+    # Skip if we've already handled this bar
+    if last_processed_iso is not None and last_iso <= last_processed_iso:
+        return last_processed_iso
+
+    # Persist immediately so a crash won't cause double-trade
+    last_processed_iso = last_iso
+    set_last_bar_ts(last_processed_iso, symbol)
+
+    atr = float(row.get("ATR", 0.0))
+    entry_dir = int(row.get("entry_dir", 0))
+    close = float(row["close"])
+
+    # ---- Gate diagnostics (mask precomputed with the signals) ----
+    gates = int(row.get("gates", 0))
+    diagnostics.record(symbol, gates, row)
+
+    if entry_dir == 0:
+        if DEBUG_SIGNALS:
+            print(f"{symbol} {last_iso}: No entry (dir=0, gates={gates:#04x} "
+                  f"{diagnostics.describe(gates)}, ATR={atr:.2f}).")
+        else:
+            print(f"{symbol} {last_iso}: No entry (dir=0, ATR={atr:.2f}).")
+
+        return last_processed_iso
+
+    # ---- Daily risk guard ----
+    equity = get_equity(trading)
+
+    update_day_start_equity_if_new_day(datetime.now(timezone.utc), equity)
+    if should_pause_trading(equity):
+        log_event("daily loss guard triggered; skipping entries")
+        return last_processed_iso
+
+    # ---- Sizing ----
+    price = close
+
+    # Volatility clamp: skip if market too wild
+    if (atr / price) > VOL_SPIKE_CAP:
+        print(f"{symbol} {last_iso}: Skip entry (ATR spike {atr/price:.4%} > cap {VOL_SPIKE_CAP:.2%})")
+        return last_processed_iso
+
+    # Momentum-based size scaling (uses CMO_prev)
+    cmo_prev = float(row.get("CMO_prev", 0.0))
+    risk_mult = cmo_size_multiplier(cmo_prev)
+
+    # Base size from volatility targeting
+    base_qty = atr_position_size(equity, atr, close)
+
+    # Final size with scaling and cap
+    qty = min(base_qty * risk_mult, MAX_QTY)
+
+    if qty <= 0:
+        print(f"{symbol} {last_iso}: No entry (qty<=0). ATR={atr:.2f}, equity={equity:.2f}")
+        return last_processed_iso
+
+    # ---- Execution ----
+    if ASYNC_EXECUTION:
+        from execution import get_execution
+        # returns at once (a flip may wait for its close to fill); the
+        # entry is logged once it has gone out
+        future = get_execution(trading).flatten_and_enter(
+            symbol, entry_dir, qty, close, atr)
+        future.add_done_callback(lambda f: _log_entry(
+            symbol, last_iso, entry_dir, qty, close, atr, future=f))
+        return last_processed_iso
+
+    flatten_if_opposite(trading, symbol, entry_dir)
+
+    order = submit_bracket_market(
+        trading,
+        symbol,
+        entry_dir,
+        qty,
+        close,
+        atr
+    )
+    _log_entry(symbol, last_iso, entry_dir, qty, close, atr, order)
+    return last_processed_iso
+
+
+def _log_entry(symbol: str, last_iso: str, entry_dir: int, qty: float,
+               close: float, atr: float, order=None, future=None):
+    if future is not None:
+        if future.exception() is not None:
+            log_event(f"{symbol} {last_iso}: entry failed: "
+                      f"{future.exception()}")
+            return
+        order = future.result()
+    side_txt = "LONG" if entry_dir == 1 else "SHORT"
+    oid = getattr(order, "id", None)
+    print(f"{symbol} {last_iso}: Submitted {side_txt} qty={qty} close≈{close:.2f} ATR={atr:.2f} -> {oid}")
+    log_order(symbol, side_txt, qty, close, atr, oid)
+
+
+def market_closed(trading) -> bool:
+    """
+    Market-hours gate: equities only, crypto runs 24/7.
+    """
+    if IS_CRYPTO or is_market_open(trading):
+        return False
+    log_event("market closed; sleeping")
+    print("market closed; sleeping")  # visible heartbeat
+    return True
+
+
+# symbol -> SignalState carried from one poll to the next (SNAPSHOT on)
+_states: dict = {}
+
+
+def load_state(symbol: str = SYMBOL):
+    """
+    Startup: pick up the snapshot saved at the last processed bar close.
+    It is still checked against the bars on the first poll.
+    """
+    state = snapshot.load(symbol) if SNAPSHOT else None
+    if state is not None:
+        _states[symbol] = state
+        log_event(f"{symbol}: loaded signal state from snapshot")
+    return state
+
+
+def _signals(symbol: str, df_1h, df_4h):
+    """
+    The signal frame process_signals reads. With SNAPSHOT on, the carried
+    state is continued from the bars (re-warmed if it no longer lines up)
+    instead of recomputing the whole history.
+    """
+    if not SNAPSHOT:
+        return compute_signals(df_1h, df_4h)
+    state, restored = snapshot.resume(
+        symbol, df_1h.astype(float), df_4h.astype(float),
+        _states.get(symbol))
+    if not restored:
+        log_event(f"{symbol}: signal state rebuilt from history")
+    _states[symbol] = state
+    return state.frame()
+
+
+def _save_state(symbol: str):
+    state = _states.get(symbol)
+    if SNAPSHOT and state is not None and state.ts_1h is not None:
+        try:
+            snapshot.save(symbol, state)
+        except Exception as e:
+            log_event(f"snapshot save failed: {e}")
+
+
+def poll_once(trading, last_processed_iso: str | None,
+              symbol: str = SYMBOL, check_market: bool = True) -> str | None:
+    """
+    One REST polling iteration: probe for a new bar, and only then fetch
+    bars, build signals and act on them. With SNAPSHOT on, the signal
+    state is saved once the bar has been handled.
+    """
+    if check_market and market_closed(trading):
+        return last_processed_iso
+
+    # ---- Cheap bar-open probe before any history/indicator work ----
+    with span("loop.probe"):
+        if not has_new_bar(symbol, last_processed_iso):
+            return last_processed_iso
+
+    # ---- Data ----
+    with span("loop.fetch_bars"):
+        df_1h, df_4h = get_1h_and_4h(symbol)
+    if df_1h.empty or df_4h.empty:
+        return last_processed_iso
+
+    with span("loop.compute_signals"):
+        sig = _signals(symbol, df_1h, df_4h)
+    with span("loop.process_signals"):
+        last_processed_iso = process_signals(trading, sig, last_processed_iso,
+                                             symbol)
+    _save_state(symbol)
+    return last_processed_iso
+
+
+def shutdown():
+    """
+    Exit path of every run loop: stop async execution (closing its
+    trade-updates stream), then write metrics and gate stats.
+    """
+    if ASYNC_EXECUTION:
+        from execution import stop_execution
+        stop_execution()
+    metrics.flush()
+    diagnostics.flush()
+
+
+def run_polling(trading, symbol: str = SYMBOL):
+    last_processed_iso = get_last_bar_ts(symbol)
+    load_state(symbol)
+    try:
+        while True:
+            delay = POLL_SECONDS
+            try:
+                with span("loop.iteration"):
+                    if not market_closed(trading):
+                        last_processed_iso = poll_once(
+                            trading, last_processed_iso, symbol,
+                            check_market=False)
+                        delay = seconds_to_next_poll([last_processed_iso])
+            except Exception as e:
+                log_event(f"ERROR: {e}")
+                print("EXCEPTION ->", e)
+                traceback.print_exc()
+            metrics.maybe_flush()
+            # single sleep per iteration: until the next bar opens, or a
+            # short re-probe while the new bar is not visible yet
+            time.sleep(delay)
+    except KeyboardInterrupt:
+        log_event("keyboard interrupt -> exiting")
+        print("Exiting.")
+    finally:
+        shutdown()
+
+
 def main():
-    trading = make_trading_client()
-    last_processed_iso = get_last_bar_ts()
+    trading = get_trading_client()
 
-    print(f" TEMA live trading - PAPER ==\nSymbol:{SYMBOL}|Crypto:{IS_CRYPTO}")
+    print(f" TEMA live trading - PAPER ==\nSymbol:{','.join(SYMBOLS)}|Crypto:{IS_CRYPTO}")
     log_event("starting bot")
-
-    while True:
-        try:
-            # Market-hours gate (equities only;
-            # for crypto this should return True)
-            # Crypto runs 24/7; only gate equities
-            if (not IS_CRYPTO) and (not is_market_open(trading)):
-                log_event("market closed; sleeping")
-                print("market closed; sleeping")  # visible heartbeat
-                time.sleep(POLL_SECONDS)
-                continue
-
-            # ---- Data ----
-            df_1h, df_4h = get_1h_and_4h(SYMBOL)
-            if df_1h.empty or df_4h.empty:
-                time.sleep(POLL_SECONDS)
-                continue
-
-            sig = compute_signals(df_1h, df_4h)
-            if sig.empty:
-                time.sleep(POLL_SECONDS)
-                continue
-
-            # TEMP: sanity check last 3 rows
-            cols = ["TEMA10", "TEMA80", "4h_TEMA20", "4h_TEMA70",
-                    "ADX", "CMO", "ATR",
-                    "ShortTrend_prev", "LongTrend_prev", "ADX_prev",
-                    "ADX_slope_prev", "CMO_prev",
-                    "long_signal", "short_signal", "entry_dir"]
-
-            # Work strictly on the last CLOSED 1h bar
-            last_ts = sig.index[-1]  # tz-aware
-            last_iso = last_ts.isoformat()
-
-            # Skip if we've already handled this bar
-            if last_processed_iso is not None and last_iso <= last_processed_iso:
-                time.sleep(POLL_SECONDS)
-                continue
-
-            # Persist immediately so a crash won't cause double-trade
-            last_processed_iso = last_iso
-            set_last_bar_ts(last_processed_iso)
-
-            row = sig.iloc[-1]
-            atr = float(row.get("ATR", 0.0))
-            entry_dir = int(row.get("entry_dir", 0))
-            close = float(row["close"])
-
-            # ---- Debug: why no entry? ----
-            if entry_dir == 0:
-                if DEBUG_SIGNALS:
-                    def _to_float(x):
-                        try:
-                            return float(x)
-                        except Exception:
-                            return None
-
-                    vals = {
-                        "ShortTrend_prev": row.get("ShortTrend_prev"),
-                        "LongTrend_prev":  row.get("LongTrend_prev"),
-                        "ADX_prev":        row.get("ADX_prev"),
-                        "ADX_slope_prev":  row.get("ADX_slope_prev"),
-                        "CMO_prev":        row.get("CMO_prev"),
-                    }
-                    vals_str = {k: _to_float(v) for k, v in vals.items()}
-
-                    gates = {
-                        "1h&4h LONG trends": (row.get("ShortTrend_prev", 0) == 1) and (row.get("LongTrend_prev", 0) == 1),
-                        "1h&4h SHORT trends": (row.get("ShortTrend_prev", 1) == 0) and (row.get("LongTrend_prev", 1) == 0),
-                        "ADX_prev > thr":    (_to_float(vals["ADX_prev"]) is not None) and (_to_float(vals["ADX_prev"]) > ADX_THRESHOLD),
-                        "ADX_slope_prev > 0": (_to_float(vals["ADX_slope_prev"]) is not None) and (_to_float(vals["ADX_slope_prev"]) > 0),
-                        "CMO_prev > +thr":   (_to_float(vals["CMO_prev"]) is not None) and (_to_float(vals["CMO_prev"]) > CMO_THRESHOLD),
-                        "CMO_prev < -thr":   (_to_float(vals["CMO_prev"]) is not None) and (_to_float(vals["CMO_prev"]) < -CMO_THRESHOLD),
-                    }
-                    passing = [k for k, v in gates.items() if bool(v)]
-                    reason = " / ".join(passing) if passing else "No gate satisfied"
-
-                    print(
-                        f"{last_iso}: No entry (dir=0). "
-                        f"vals={vals_str} thr={{'ADX': {ADX_THRESHOLD}, 'CMO': {CMO_THRESHOLD}}} "
-                        f"reason={reason} ATR={atr:.2f}"
-                    )
-                else:
-                    print(f"{last_iso}: No entry (dir=0, ATR={atr:.2f}).")
-
-                time.sleep(POLL_SECONDS)
-                continue
-
-            # ---- Daily risk guard ----
-            equity = get_equity(trading)
-
-            update_day_start_equity_if_new_day(datetime.now(timezone.utc), equity)
-            if should_pause_trading(equity):
-                log_event("daily loss guard triggered; skipping entries")
-                time.sleep(POLL_SECONDS)
-                continue
-
-            # ---- Sizing ----
-            price = close
-
-            # Volatility clamp: skip if market too wild
-            if (atr / price) > VOL_SPIKE_CAP:
-                print(f"{last_iso}: Skip entry (ATR spike {atr/price:.4%} > cap {VOL_SPIKE_CAP:.2%})")
-                time.sleep(POLL_SECONDS)
-                continue
-
-            # Momentum-based size scaling (uses CMO_prev)
-            cmo_prev = float(row.get("CMO_prev", 0.0))
-            cmo_thr = max(10, CMO_THRESHOLD)     # avoid being too strict
-            raw_mult = min(abs(cmo_prev) / cmo_thr, 1.0)      # 0..1
-            risk_mult = max(raw_mult, CMO_SIZE_FLOOR)     # enforce a floor
-
-            # Base size from volatility targeting
-            base_qty = atr_position_size(equity, atr, close)
-
-            # Final size with scaling and cap
-            qty = min(base_qty * risk_mult, MAX_QTY)
-
-            if qty <= 0:
-                print(f"{last_iso}: No entry (qty<=0). ATR={atr:.2f}, equity={equity:.2f}")
-                time.sleep(POLL_SECONDS)
-                continue
-
-            # ---- Execution ----
-            flatten_if_opposite(trading, SYMBOL, entry_dir)
-
-            order = submit_bracket_market(
-                trading,
-                SYMBOL,
-                entry_dir,
-                qty,
-                close,
-                atr
-            )
-            side_txt = "LONG" if entry_dir == 1 else "SHORT"
-            oid = getattr(order, "id", None)
-            print(f"{last_iso}: Submitted {side_txt} qty={qty} close≈{close:.2f} ATR={atr:.2f} -> {oid}")
-            log_order(SYMBOL, side_txt, qty, close, atr, oid)
-
-        except KeyboardInterrupt:
-            log_event("keyboard interrupt -> exiting")
-            print("Exiting.")
-            break
-        except Exception as e:
-            log_event(f"ERROR: {e}")
-            print("EXCEPTION ->", e)
-            traceback.print_exc()
-        finally:
-            time.sleep(POLL_SECONDS)
+    if METRICS_PORT:
+        metrics.start_metrics_server(METRICS_PORT)
+
+    if len(SYMBOLS) > 1:
+        from portfolio import run_portfolio
+        run_portfolio(trading, SYMBOLS)
+    elif INGEST_MODE == "stream":
+        from stream import run_streaming
+        run_streaming(trading, SYMBOLS[0])
+    else:
+        run_polling(trading, SYMBOLS[0])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,183 @@
+"""
+In-process latency metrics for the trading loop.
+
+Code marks a stage with `with span("stage"):` or the `@timed("stage")`
+decorator. Durations come from the monotonic perf_counter_ns clock and go
+into fixed log-spaced histograms (one per stage), so recording is a bisect
+and two increments with no allocation. Percentiles are read from the
+histograms; snapshots are flushed to METRICS_FILE every
+METRICS_FLUSH_SECONDS and can also be served in Prometheus text format.
+"""
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import METRICS_FILE, METRICS_FLUSH_SECONDS
+
+# bucket upper bounds in ns: 20 per decade from 1us to 100s (~1.12x wide)
+_BOUNDS = [int(1_000 * 10 ** (k / 20)) for k in range(0, 161)]
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "total_ns", "max_ns")
+
+    def __init__(self):
+        self.counts = [0] * (len(_BOUNDS) + 1)
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, ns: int):
+        self.counts[bisect.bisect_left(_BOUNDS, ns)] += 1
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound (seconds) of the bucket holding the q-th observation.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank and c:
+                bound = _BOUNDS[i] if i < len(_BOUNDS) else self.max_ns
+                return min(bound, self.max_ns) / 1e9
+        return self.max_ns / 1e9
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_s": self.total_ns / self.count / 1e9 if self.count else 0.0,
+            "p50_s": self.quantile(0.50),
+            "p95_s": self.quantile(0.95),
+            "p99_s": self.quantile(0.99),
+            "max_s": self.max_ns / 1e9,
+        }
+
+
+class _Span:
+    __slots__ = ("registry", "stage", "t0")
+
+    def __init__(self, registry: "Metrics", stage: str):
+        self.registry = registry
+        self.stage = stage
+
+    def __enter__(self):
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.record(self.stage, time.perf_counter_ns() - self.t0)
+        return False
+
+
+class Metrics:
+    def __init__(self, path=METRICS_FILE):
+        self._hists: dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self.path = path
+
+    def record(self, stage: str, ns: int):
+        with self._lock:
+            h = self._hists.get(stage)
+            if h is None:
+                h = self._hists[stage] = Histogram()
+            h.record(ns)
+
+    def span(self, stage: str) -> _Span:
+        return _Span(self, stage)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {k: h.summary() for k, h in sorted(self._hists.items())}
+
+    def flush(self, path=None):
+        path = path or self.path
+        payload = {"ts_monotonic": time.monotonic(), "stages": self.snapshot()}
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(payload, indent=2))
+        os.replace(tmp, path)
+        self._last_flush = time.monotonic()
+
+    def maybe_flush(self, every: float = METRICS_FLUSH_SECONDS):
+        if time.monotonic() - self._last_flush >= every:
+            self.flush()
+
+    def prometheus_text(self) -> str:
+        lines = ["# TYPE tema_stage_seconds summary"]
+        for stage, s in self.snapshot().items():
+            label = f'stage="{stage}"'
+            for q, key in (("0.5", "p50_s"), ("0.95", "p95_s"),
+                           ("0.99", "p99_s")):
+                lines.append(
+                    f'tema_stage_seconds{{{label},quantile="{q}"}} {s[key]}')
+            lines.append(
+                f"tema_stage_seconds_sum{{{label}}} {s['mean_s'] * s['count']}")
+            lines.append(f"tema_stage_seconds_count{{{label}}} {s['count']}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Metrics()
+
+
+def span(stage: str) -> _Span:
+    return registry.span(stage)
+
+
+def flush():
+    registry.flush()
+
+
+def maybe_flush():
+    registry.maybe_flush()
+
+
+def timed(stage: str):
+    """
+    Decorator recording each call's duration under `stage`.
+    """
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            t0 = time.perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                registry.record(stage, time.perf_counter_ns() - t0)
+        return inner
+    return wrap
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1"):
+    """
+    Serve `registry` as Prometheus text on http://host:port/metrics from a
+    daemon thread.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True,
+                     name="metrics-http").start()
+    return server
@@ -0,0 +1,126 @@
+"""
+Multi-timeframe alignment: stamp 4h features onto the 1h timeline.
+
+A 1h bar only knows the 4h bar it belongs to as far as that bar had formed
+when the 1h bar closed: the 4h bars that finished before its bucket
+started, plus the current bucket rebuilt from the 1h bars seen so far
+(what REST returns for the still-forming bar, and what the live loop
+feeds). Taking the 4h bar labelled by its start time as-is would hand the
+08:00 1h bar the 11:00 close.
+
+`join_4h_onto_1h` and `completed_positions` are the batch form for history
+rebuilds and `MTFAligner` the O(1) per-bar form for live updates. Buckets
+are FOUR_HOURS floors in UTC, Alpaca's 4h labels.
+"""
+import numpy as np
+import pandas as pd
+
+FOUR_HOURS = pd.Timedelta(hours=4)
+
+
+def _is_sorted_utc(df: pd.DataFrame) -> bool:
+    idx = df.index
+    return (isinstance(idx, pd.DatetimeIndex)
+            and idx.tz is not None
+            and str(idx.tz) == "UTC"
+            and idx.is_monotonic_increasing)
+
+
+def normalize(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    `df` with a sorted UTC DatetimeIndex named "ts"; sorted UTC input (what
+    fetch_bars returns) is returned as is, without copying.
+    """
+    if _is_sorted_utc(df):
+        return df
+    if not isinstance(df.index, pd.DatetimeIndex):
+        raise TypeError("Expected a DatetimeIndex for OHLC data.")
+    x = df.sort_index()
+    idx = x.index.tz_localize("UTC") if x.index.tz is None \
+        else x.index.tz_convert("UTC")
+    return x.set_axis(idx.rename("ts"))
+
+
+def completed_positions(ts_1h: pd.DatetimeIndex, ts_4h: pd.DatetimeIndex,
+                        period: pd.Timedelta = FOUR_HOURS) -> np.ndarray:
+    """
+    For every 1h timestamp, the position of the last 4h bar that started
+    before its own bucket, i.e. had completed by then (-1 when there is
+    none). Both indexes must be sorted.
+    """
+    left = ts_1h.floor(period).as_unit("ns").asi8
+    right = ts_4h.as_unit("ns").asi8
+    return np.searchsorted(right, left, side="left") - 1
+
+
+def forming_bars(df_1h: pd.DataFrame,
+                 period: pd.Timedelta = FOUR_HOURS) -> pd.DataFrame:
+    """
+    The 4h bar as it stood at each 1h close, aggregated from the 1h bars of
+    its bucket up to and including that one (OHLCV columns of `df_1h`).
+    """
+    g = df_1h.groupby(df_1h.index.floor(period), sort=False)
+    agg = {"open": lambda c: g[c].transform("first"),
+           "high": lambda c: g[c].cummax(),
+           "low": lambda c: g[c].cummin(),
+           "close": lambda c: df_1h[c],
+           "volume": lambda c: g[c].cumsum()}
+    return pd.DataFrame({c: f(c).to_numpy(dtype=np.float64)
+                         for c, f in agg.items() if c in df_1h},
+                        index=df_1h.index)
+
+
+def join_4h_onto_1h(df_1h: pd.DataFrame,
+                    period: pd.Timedelta = FOUR_HOURS) -> pd.DataFrame:
+    """
+    `df_1h` (sorted, UTC) plus the forming 4h bar of every row, its columns
+    prefixed "4h_". Indicators of the 4h series are stepped onto this bar
+    separately (indicators.tema_step_batch over completed_positions).
+    """
+    four = forming_bars(df_1h, period).add_prefix("4h_")
+    out = pd.concat([df_1h, four], axis=1)
+    out.index = pd.DatetimeIndex(out.index, freq=None, name="ts")
+    return out
+
+
+class MTFAligner:
+    """
+    Keeps the most recent 4h feature rows and stamps the applicable one
+    onto each new 1h row in constant time.
+
+    A 4h row with the same timestamp as the newest one replaces it (the
+    still-forming 4h bar being revised); the previous row is kept so a
+    1h bar timestamped before the newest 4h bar still finds its match.
+    """
+    __slots__ = ("_prev_ts", "_prev", "_last_ts", "_last", "_keys")
+
+    def __init__(self):
+        self._prev_ts = None
+        self._prev = None
+        self._last_ts = None
+        self._last = None
+        self._keys = ()
+
+    def update_4h(self, ts: pd.Timestamp, features: dict):
+        if self._last_ts is not None and ts < self._last_ts:
+            return  # stale/out-of-order 4h bar
+        if self._last_ts is None or ts > self._last_ts:
+            self._prev_ts, self._prev = self._last_ts, self._last
+        self._last_ts = ts
+        self._last = {f"4h_{k}": v for k, v in features.items()}
+        self._keys = tuple(self._last)
+
+    def stamp(self, ts_1h: pd.Timestamp, row: dict) -> dict:
+        """
+        `row` plus the 4h_* columns as-of `ts_1h` (NaN when no 4h bar
+        precedes it).
+        """
+        if self._last_ts is not None and self._last_ts <= ts_1h:
+            four = self._last
+        elif self._prev_ts is not None and self._prev_ts <= ts_1h:
+            four = self._prev
+        else:
+            four = dict.fromkeys(self._keys, np.nan)
+        out = dict(row)
+        out.update(four)
+        return out
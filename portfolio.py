@@ -0,0 +1,166 @@
+"""
+Multi-symbol runner: one process, one TradingClient, many instruments.
+
+Each poll first probes which symbols have a new bar (bar_schedule); bars
+for those are fetched with one batched request per timeframe, signals are
+built in a worker pool, and the per-symbol decisions are then
+executed serially against the shared TradingClient (orders stay ordered
+and the client is not used from several threads at once).
+
+With COLUMNAR on, signals are instead kept incrementally in a
+columnar.ColumnarStore and only the new bars are processed each poll; with
+SNAPSHOT also on, the store is saved after every sync and reloaded at
+startup.
+"""
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import pandas as pd
+from config import (
+    POLL_SECONDS, SIGNAL_POOL, SIGNAL_WORKERS, COLUMNAR, SNAPSHOT,
+    LOOKBACK_1H
+)
+import metrics
+from metrics import span
+from bar_schedule import symbols_with_new_bar, seconds_to_next_poll
+from data import get_1h_and_4h_multi
+from logger import log_event
+import snapshot
+from state import get_last_bar_ts
+from strategy import compute_signals
+
+
+def _signals_for(item):
+    symbol, (df_1h, df_4h) = item
+    if df_1h.empty or df_4h.empty:
+        return symbol, pd.DataFrame()
+    return symbol, compute_signals(df_1h, df_4h)
+
+
+def make_pool(kind: str = SIGNAL_POOL, workers: int = SIGNAL_WORKERS):
+    if kind == "process":
+        return ProcessPoolExecutor(max_workers=workers)
+    return ThreadPoolExecutor(max_workers=workers)
+
+
+def build_signals(bars: dict, pool) -> dict[str, pd.DataFrame]:
+    """
+    {symbol: (df_1h, df_4h)} -> {symbol: signal frame}, evaluated in `pool`.
+    """
+    return dict(pool.map(_signals_for, bars.items()))
+
+
+def sync_store(store, bars: dict, name: str = "portfolio") -> dict:
+    """
+    Columnar mode: push new bars into `store` and return
+    {symbol: (bar start, row)} for the newest bar of each symbol.
+    """
+    rows = {}
+    for symbol, (df_1h, df_4h) in bars.items():
+        if not (df_1h.empty or df_4h.empty):
+            store.sync(symbol, df_1h, df_4h)
+        rows[symbol] = store.last_row(symbol)
+    if SNAPSHOT:
+        try:
+            snapshot.save(name, store)
+        except Exception as e:
+            log_event(f"snapshot save failed: {e}")
+    return rows
+
+
+def load_store(symbols: list[str], name: str = "portfolio"):
+    """
+    The snapshotted ColumnarStore if it covers the same symbols, else a
+    fresh one. Each symbol's state is still checked against the bars on
+    its first sync.
+    """
+    from columnar import ColumnarStore
+    store = snapshot.load(name) if SNAPSHOT else None
+    if store is not None and store.symbols == list(symbols) and \
+            store.capacity == LOOKBACK_1H:
+        log_event(f"{name}: resumed signal store from snapshot")
+        return store
+    return ColumnarStore(symbols)
+
+
+def poll_portfolio_once(trading, symbols: list[str], pool,
+                        last_processed: dict,
+                        check_market: bool = True,
+                        store=None) -> dict:
+    from main import market_closed
+
+    if check_market and market_closed(trading):
+        return last_processed
+
+    # only symbols whose new bar is visible pay for fetch + compute
+    with span("portfolio.probe"):
+        symbols = symbols_with_new_bar(symbols, last_processed)
+    if not symbols:
+        return last_processed
+
+    with span("portfolio.fetch_bars"):
+        bars = get_1h_and_4h_multi(symbols)
+    return act_on_bars(trading, bars, pool, last_processed, store)
+
+
+def act_on_bars(trading, bars: dict, pool, last_processed: dict,
+                store=None, name: str = "portfolio") -> dict:
+    """
+    Build signals for freshly fetched {symbol: (df_1h, df_4h)} and act on
+    each symbol's newest bar. Returns the updated last processed map.
+    """
+    from main import process_signals, process_row
+
+    with span("portfolio.compute_signals"):
+        if store is not None:
+            rows = sync_store(store, bars, name)
+        else:
+            signals = build_signals(bars, pool)
+
+    for symbol in bars:
+        try:
+            if store is not None:
+                ts, row = rows[symbol]
+                if ts is not None:
+                    last_processed[symbol] = process_row(
+                        trading, ts, row, last_processed.get(symbol), symbol)
+                continue
+            last_processed[symbol] = process_signals(
+                trading, signals[symbol], last_processed.get(symbol), symbol
+            )
+        except Exception as e:
+            # one bad symbol must not block the others
+            log_event(f"ERROR {symbol}: {e}")
+            print(f"EXCEPTION {symbol} ->", e)
+            traceback.print_exc()
+    return last_processed
+
+
+def run_portfolio(trading, symbols: list[str]):
+    from main import market_closed, shutdown
+
+    last_processed = {s: get_last_bar_ts(s) for s in symbols}
+    store = load_store(symbols) if COLUMNAR else None
+    with make_pool() as pool:
+        try:
+            while True:
+                delay = POLL_SECONDS
+                try:
+                    with span("portfolio.iteration"):
+                        if not market_closed(trading):
+                            last_processed = poll_portfolio_once(
+                                trading, symbols, pool, last_processed,
+                                check_market=False, store=store)
+                            delay = seconds_to_next_poll(
+                                list(last_processed.values()))
+                except Exception as e:
+                    log_event(f"ERROR: {e}")
+                    print("EXCEPTION ->", e)
+                    traceback.print_exc()
+                metrics.maybe_flush()
+                time.sleep(delay)
+        except KeyboardInterrupt:
+            log_event("keyboard interrupt -> exiting")
+            print("Exiting.")
+        finally:
+            shutdown()
@@ -1,11 +1,14 @@
 from config import ENABLE_DAILY_LOSS_GUARD, MAX_DAILY_DRAWDOWN_PCT
-from state import get_day_start_equity, set_day_start_equity
+from state import get_day_start_equity, set_day_start_equity, get_store
 
 
 def update_day_start_equity_if_new_day(now_utc, equity: float):
     """
-    Persist day-start equity once per UTC day (simple approach).
+    Persist day-start equity once per UTC day (simple approach), and keep
+    every equity reading as a snapshot. The stored day start is read from
+    the state store's cache, not from disk.
     """
+    get_store().record_equity(equity, now_utc.isoformat())
     key = now_utc.strftime("%Y-%m-%d")
     stored = get_day_start_equity()
     if not stored or stored["date"] != key:
@@ -0,0 +1,230 @@
+"""
+Central scheduler for Alpaca REST calls: rate budgets, priorities, retries
+and coalescing.
+
+Every broker/data call goes through `call(endpoint, fn, ...)`:
+
+- Budget: each endpoint class draws from a token bucket (RATE_LIMITS:
+  requests per minute, burst). Orders, account and clock reads share the
+  "trading" bucket, since Alpaca limits them per account; bar requests
+  use "data". A request waits for a token instead of being sent and
+  throttled.
+- Priority lanes: waiters on a bucket are served lowest priority number
+  first, so an order never queues behind position or clock polls, and a
+  data poll never delays either (separate bucket).
+- Retry: 429, 5xx and connection errors are retried up to RETRY_ATTEMPTS
+  times with full-jitter exponential backoff (honouring Retry-After). A
+  429 also drains the bucket so concurrent callers back off with it.
+  Orders are not idempotent and are retried only on 429, which Alpaca
+  returns before accepting anything.
+- Coalescing: calls given the same `key` while one is in flight wait for
+  that call and share its result (or exception), e.g. several symbols
+  asking for account equity at once.
+
+Waits are recorded as metrics "sched.wait.<bucket>".
+
+Budgets are per process. Processes drawing on one account or data plan
+each take their part of it (`split`), as the fanout workers do.
+"""
+import contextlib
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import Future
+import requests
+import metrics
+from config import (
+    RATE_LIMITS, RETRY_ATTEMPTS, RETRY_BASE_SECONDS, RETRY_MAX_SECONDS
+)
+from logger import log_event
+
+# endpoint class: (bucket, priority lane, safe to retry after any error)
+ENDPOINTS = {
+    "orders": ("trading", 0, False),
+    "account": ("trading", 1, True),
+    "clock": ("trading", 2, True),
+    "data": ("data", 3, True),
+}
+
+
+class TokenBucket:
+    """
+    `rate` tokens per second up to `burst`; waiters are served in
+    (priority, arrival) order.
+    """
+
+    def __init__(self, per_minute: float, burst: int):
+        self.rate = per_minute / 60.0
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.stamp = time.monotonic()
+        self._cond = threading.Condition()
+        self._waiters: list = []
+        self._seq = itertools.count()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def acquire(self, priority: int = 0) -> float:
+        """
+        Take one token, blocking until it is this caller's turn. Returns
+        the seconds waited.
+        """
+        t0 = time.monotonic()
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiters, ticket)
+            self._cond.notify_all()  # a new head may outrank a sleeper
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                head = self._waiters[0] == ticket
+                if head and self.tokens >= 1:
+                    self.tokens -= 1
+                    heapq.heappop(self._waiters)
+                    self._cond.notify_all()
+                    return now - t0
+                self._cond.wait((1 - self.tokens) / self.rate if head
+                                else None)
+
+    def drain(self, seconds: float = 0.0):
+        """
+        Empty the bucket (after a 429), optionally owing `seconds` more.
+        """
+        with self._cond:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+
+def _status(e: Exception) -> int | None:
+    status = getattr(e, "status_code", None)
+    if status is None:
+        status = getattr(getattr(e, "response", None), "status_code", None)
+    return status
+
+
+def _retry_after(e: Exception) -> float | None:
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def retryable(e: Exception, idempotent: bool = True) -> bool:
+    status = _status(e)
+    if status == 429:
+        return True
+    if not idempotent:
+        return False
+    if status is not None:
+        return status >= 500
+    # no HTTP response at all: connection reset, timeout, DNS...
+    return isinstance(e, (requests.ConnectionError, requests.Timeout,
+                          ConnectionError, TimeoutError))
+
+
+def backoff(attempt: int, base: float = RETRY_BASE_SECONDS,
+            cap: float = RETRY_MAX_SECONDS) -> float:
+    """
+    Full-jitter exponential backoff for retry number `attempt` (0-based).
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def split(limits: dict, shares: dict) -> dict:
+    """
+    `limits` with the rate and burst of each bucket in `shares` divided
+    by its number of processes (burst at least 1).
+    """
+    return {name: (per_minute / shares.get(name, 1),
+                   max(1, int(burst // shares.get(name, 1))))
+            for name, (per_minute, burst) in limits.items()}
+
+
+class RequestScheduler:
+    def __init__(self, limits: dict = RATE_LIMITS,
+                 attempts: int = RETRY_ATTEMPTS):
+        self.set_limits(limits)
+        self.attempts = attempts
+        self.enabled = True
+        self._inflight: dict = {}
+        self._lock = threading.Lock()
+
+    def set_limits(self, limits: dict):
+        """
+        Fresh token buckets for `limits` (bucket: (per minute, burst)).
+        """
+        self.buckets = {name: TokenBucket(*spec)
+                        for name, spec in limits.items()}
+
+    @contextlib.contextmanager
+    def bypass(self):
+        """
+        Call straight through (simulated clients, replays).
+        """
+        enabled, self.enabled = self.enabled, False
+        try:
+            yield
+        finally:
+            self.enabled = enabled
+
+    def _run(self, endpoint: str, fn, args, kwargs):
+        bucket_name, priority, idempotent = ENDPOINTS[endpoint]
+        bucket = self.buckets[bucket_name]
+        for attempt in range(self.attempts + 1):
+            waited = bucket.acquire(priority)
+            metrics.registry.record(f"sched.wait.{bucket_name}",
+                                    int(waited * 1e9))
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if attempt == self.attempts or not retryable(e, idempotent):
+                    raise
+                delay = backoff(attempt)
+                if _status(e) == 429:
+                    delay = max(delay, _retry_after(e) or 0.0)
+                    bucket.drain(delay)
+                log_event(f"{endpoint} {getattr(fn, '__name__', fn)} failed "
+                          f"({e}); retry {attempt + 1}/{self.attempts} "
+                          f"in {delay:.2f}s")
+                time.sleep(delay)
+
+    def call(self, endpoint: str, fn, *args, key=None, **kwargs):
+        """
+        fn(*args, **kwargs) under the budget of `endpoint` (an ENDPOINTS
+        key). Concurrent calls with the same hashable `key` share one
+        request.
+        """
+        if not self.enabled:
+            return fn(*args, **kwargs)
+        if key is None:
+            return self._run(endpoint, fn, args, kwargs)
+
+        key = (endpoint, key)
+        with self._lock:
+            fut = self._inflight.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._inflight[key] = Future()
+        if not leader:
+            return fut.result()
+        try:
+            fut.set_result(self._run(endpoint, fn, args, kwargs))
+        except Exception as e:
+            fut.set_exception(e)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        return fut.result()
+
+
+scheduler = RequestScheduler()
+
+
+def call(endpoint: str, fn, *args, key=None, **kwargs):
+    return scheduler.call(endpoint, fn, *args, key=key, **kwargs)
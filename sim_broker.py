@@ -0,0 +1,499 @@
+"""
+Simulated broker for offline, deterministic replays of the live loop.
+
+`SimTradingClient` implements the slice of alpaca's TradingClient that
+broker.py uses (get_account, get_open_position, close_position,
+submit_order, get_clock), so main.process_signals/process_row run
+against it unchanged. Bars are pushed in with `on_bar`:
+
+- market orders fill at the current mark (the last bar close) plus
+  optional slippage, like backtest.py's entries
+- each bracket entry is tracked as its own lot; its TP/SL legs are checked
+  against later bars' high/low, stop first when both are touched, and a
+  bar opening through a level fills at the open
+- an order against the open position nets it, like Alpaca's one position
+  per symbol: it closes lots oldest first (a lot only partly closed keeps
+  its legs for the rest) and only the remainder opens a new lot
+- equity is cash plus positions marked at the last close
+- the clock follows the replayed bars (regular NYSE hours for equities,
+  always open for crypto)
+- every fill is also published as a TradeUpdate-shaped event to
+  `listeners`; `SimTradeStream` serves them like alpaca's TradingStream,
+  optionally split into partial fills, for execution.AsyncExecutor
+
+`replay` drives the signal path and process_signals over cached 1h bars in
+accelerated time, with state/log writes kept in memory:
+
+    python sim_broker.py state/bars/BTCUSD_1Hour.pkl --symbol BTC/USD
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import itertools
+import threading
+import time
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+from alpaca.common.exceptions import APIError
+from config import BASE_EQUITY, IS_CRYPTO, SYMBOL
+
+NY = "America/New_York"
+ONE_HOUR = pd.Timedelta(hours=1)
+QTY_EPS = 1e-12  # float residue of netting fractional quantities
+
+
+def _side(order_side) -> int:
+    return 1 if str(getattr(order_side, "value", order_side)).lower() == "buy" \
+        else -1
+
+
+def market_clock(now: pd.Timestamp, is_crypto: bool = IS_CRYPTO):
+    """
+    get_clock()-shaped view of `now`: 24/7 for crypto, Mon-Fri 09:30-16:00
+    New York time for equities (exchange holidays are not modelled).
+    """
+    if is_crypto:
+        return SimpleNamespace(timestamp=now, is_open=True,
+                               next_open=None, next_close=None)
+    local = now.tz_convert(NY)
+    day = local.normalize()
+    open_t = day + pd.Timedelta(hours=9, minutes=30)
+    close_t = day + pd.Timedelta(hours=16)
+    weekday = local.weekday() < 5
+    is_open = weekday and open_t <= local < close_t
+
+    next_open = open_t if (weekday and local < open_t) else None
+    d = day
+    while next_open is None:
+        d += pd.Timedelta(days=1)
+        if d.weekday() < 5:
+            next_open = d + pd.Timedelta(hours=9, minutes=30)
+    next_close = close_t if is_open else \
+        next_open.normalize() + pd.Timedelta(hours=16)
+    return SimpleNamespace(timestamp=now, is_open=is_open,
+                           next_open=next_open.tz_convert("UTC"),
+                           next_close=next_close.tz_convert("UTC"))
+
+
+@dataclass
+class _Lot:
+    side: int
+    qty: float
+    entry: float
+    tp: float | None
+    sl: float | None
+    order_id: str
+
+
+@dataclass
+class Fill:
+    ts: pd.Timestamp
+    symbol: str
+    side: int
+    qty: float
+    price: float
+    reason: str
+    order_id: str
+
+
+class SimTradingClient:
+    """
+    In-memory stand-in for alpaca.trading.client.TradingClient.
+    """
+
+    def __init__(self, cash: float = BASE_EQUITY,
+                 is_crypto: bool = IS_CRYPTO,
+                 slippage_bps: float = 0.0,
+                 fee_bps: float = 0.0,
+                 fill_chunks: int = 1):
+        self.cash = float(cash)
+        self.is_crypto = is_crypto
+        self.slippage = slippage_bps / 1e4
+        self.fee = fee_bps / 1e4
+        self.now: pd.Timestamp | None = None
+        self.marks: dict[str, float] = {}
+        self.lots: dict[str, list[_Lot]] = {}
+        self.fills: list[Fill] = []
+        self.fill_chunks = max(1, int(fill_chunks))
+        self.listeners: list = []  # callables taking a trade update
+        self._ids = itertools.count(1)
+
+    # ---- market data ----
+
+    def on_bar(self, symbol: str, ts: pd.Timestamp, bar, period=ONE_HOUR):
+        """
+        Advance to the close of the bar starting at `ts`: fire any bracket
+        legs it touched, then mark positions at its close.
+        """
+        opn, high, low = float(bar["open"]), float(bar["high"]), float(bar["low"])
+        self.now = ts + period
+        for lot in list(self.lots.get(symbol, ())):
+            price, reason = self._bracket_exit(lot, opn, high, low)
+            if price is not None:
+                self._exit(symbol, lot, price, reason)
+        self.marks[symbol] = float(bar["close"])
+
+    @staticmethod
+    def _bracket_exit(lot: _Lot, opn: float, high: float, low: float):
+        side, tp, sl = lot.side, lot.tp, lot.sl
+        if sl is not None and (low <= sl if side == 1 else high >= sl):
+            gap = (opn <= sl) if side == 1 else (opn >= sl)
+            return (opn if gap else sl), "stop"
+        if tp is not None and (high >= tp if side == 1 else low <= tp):
+            gap = (opn >= tp) if side == 1 else (opn <= tp)
+            return (opn if gap else tp), "target"
+        return None, None
+
+    # ---- accounting ----
+
+    def _fill(self, symbol, side, qty, price, reason, order_id):
+        self.cash -= side * qty * price + abs(qty * price) * self.fee
+        self.fills.append(Fill(self.now, symbol, side, qty, price,
+                               reason, order_id))
+
+    def _exit(self, symbol, lot: _Lot, price: float, reason: str,
+              order_id: str | None = None):
+        self._fill(symbol, -lot.side, lot.qty, price, reason, lot.order_id)
+        self.lots[symbol].remove(lot)
+        if order_id is None:
+            # bracket leg: a child order of the entry
+            self._publish(f"{lot.order_id}-{reason}", symbol, -lot.side,
+                          lot.qty, price)
+
+    def _publish(self, order_id, symbol, side, qty, price):
+        """
+        Emit new -> partial_fill* -> fill updates for a filled order.
+        """
+        if not self.listeners:
+            return
+        position = self.position_qty(symbol)
+        step = qty / self.fill_chunks
+        events = [("new", 0.0)]
+        events += [("partial_fill", step * k) for k in range(1, self.fill_chunks)]
+        events.append(("fill", qty))
+        for event, filled in events:
+            order = self._order(order_id, symbol, side, qty, price, filled)
+            update = SimpleNamespace(
+                event=event, order=order, timestamp=self.now,
+                price=price if filled else None,
+                qty=(step if event != "new" else None),
+                position_qty=(position - side * (qty - filled)
+                              if filled else None))
+            for listener in self.listeners:
+                listener(update)
+
+    def _market_price(self, symbol: str, side: int) -> float:
+        if symbol not in self.marks:
+            raise APIError('{"code": 40010001, "message": "no price for %s"}'
+                           % symbol)
+        return self.marks[symbol] * (1 + side * self.slippage)
+
+    def position_qty(self, symbol: str) -> float:
+        return sum(lot.side * lot.qty for lot in self.lots.get(symbol, ()))
+
+    @property
+    def equity(self) -> float:
+        return self.cash + sum(self.position_qty(s) * self.marks[s]
+                               for s in self.lots)
+
+    # ---- TradingClient surface ----
+
+    def get_account(self):
+        eq = self.equity
+        return SimpleNamespace(equity=str(eq), cash=str(self.cash),
+                               last_equity=str(eq), status="ACTIVE")
+
+    def get_open_position(self, symbol: str):
+        qty = self.position_qty(symbol)
+        if qty == 0:
+            raise APIError('{"code": 40410000, "message": "position does not exist"}')
+        mark = self.marks[symbol]
+        lots = self.lots[symbol]
+        size = sum(lot.qty for lot in lots)
+        avg = sum(lot.entry * lot.qty for lot in lots) / size if size else mark
+        return SimpleNamespace(
+            symbol=symbol, qty=str(qty), side="long" if qty > 0 else "short",
+            avg_entry_price=str(avg), current_price=str(mark),
+            market_value=str(qty * mark),
+            unrealized_pl=str(qty * (mark - avg)))
+
+    def close_position(self, symbol: str):
+        qty = self.position_qty(symbol)
+        if qty == 0:
+            raise APIError('{"code": 40410000, "message": "position does not exist"}')
+        side = -1 if qty > 0 else 1
+        order_id = f"sim-{next(self._ids):08d}"
+        price = self._market_price(symbol, side)
+        for lot in list(self.lots[symbol]):
+            self._exit(symbol, lot, price, "close", order_id)
+        self._publish(order_id, symbol, side, abs(qty), price)
+        return self._ack(order_id, symbol, side, abs(qty), price)
+
+    def submit_order(self, order_data):
+        symbol = order_data.symbol
+        side = _side(order_data.side)
+        qty = float(order_data.qty)
+        if qty <= 0:
+            raise APIError('{"code": 40010001, "message": "qty must be > 0"}')
+        order_id = f"sim-{next(self._ids):08d}"
+        price = self._market_price(symbol, side)
+        tp = getattr(order_data, "take_profit", None)
+        sl = getattr(order_data, "stop_loss", None)
+        rest = self._net(symbol, side, qty, price, order_id)
+        if rest > QTY_EPS:
+            self._fill(symbol, side, rest, price, "entry", order_id)
+            self.lots.setdefault(symbol, []).append(_Lot(
+                side, rest, price,
+                float(tp.limit_price) if tp is not None else None,
+                float(sl.stop_price) if sl is not None else None,
+                order_id))
+        self._publish(order_id, symbol, side, qty, price)
+        return self._ack(order_id, symbol, side, qty, price)
+
+    def _net(self, symbol, side, qty, price, order_id) -> float:
+        """
+        Close opposite lots of `symbol`, oldest first, with up to `qty` of
+        an order; returns the quantity left to open.
+        """
+        netted = 0.0
+        for lot in list(self.lots.get(symbol, ())):
+            if qty - netted <= QTY_EPS:
+                break
+            if lot.side == side:
+                continue
+            take = min(lot.qty, qty - netted)
+            netted += take
+            if lot.qty - take <= QTY_EPS:
+                self.lots[symbol].remove(lot)
+            else:
+                lot.qty -= take
+        if netted:
+            self._fill(symbol, side, netted, price, "close", order_id)
+        return qty - netted
+
+    def get_all_positions(self):
+        out = []
+        for symbol in self.lots:
+            try:
+                out.append(self.get_open_position(symbol))
+            except APIError:
+                pass
+        return out
+
+    def _ack(self, order_id, symbol, side, qty, price):
+        """
+        REST response to a new order. With a stream attached it reports the
+        order accepted but unfilled, as Alpaca does; the fills arrive as
+        trade updates.
+        """
+        if self.listeners:
+            return self._order(order_id, symbol, side, qty, price, 0.0,
+                               "accepted")
+        return self._order(order_id, symbol, side, qty, price)
+
+    def _order(self, order_id, symbol, side, qty, price, filled=None,
+               status=None):
+        filled = qty if filled is None else filled
+        status = status or ("filled" if filled >= qty else
+                            "partially_filled" if filled else "new")
+        return SimpleNamespace(
+            id=order_id, client_order_id=order_id, symbol=symbol,
+            side="buy" if side == 1 else "sell", qty=str(qty),
+            filled_qty=str(filled),
+            filled_avg_price=str(price) if filled else None,
+            status=status, submitted_at=self.now,
+            filled_at=self.now if filled >= qty else None)
+
+    def get_clock(self):
+        return market_clock(self.now, self.is_crypto)
+
+
+class SimTradeStream:
+    """
+    TradingStream stand-in fed by a SimTradingClient's fill events, with
+    the same subscribe_trade_updates / _run_forever / stop_ws surface.
+    Updates published from any thread are delivered on the stream's loop,
+    after `latency` seconds.
+    """
+
+    def __init__(self, sim: SimTradingClient, latency: float = 0.0):
+        self.latency = latency
+        self._handler = None
+        self._loop = None
+        self._queue: asyncio.Queue | None = None
+        self._backlog: list = []
+        self._lock = threading.Lock()
+        sim.listeners.append(self._publish)
+
+    def subscribe_trade_updates(self, handler):
+        self._handler = handler
+
+    def _publish(self, update):
+        with self._lock:
+            if self._loop is None:
+                self._backlog.append(update)
+                return
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, update)
+
+    async def _run_forever(self):
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._queue = asyncio.Queue()
+            for update in self._backlog:
+                self._queue.put_nowait(update)
+            self._backlog.clear()
+        while True:
+            update = await self._queue.get()
+            if update is None:
+                return
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            if self._handler is not None:
+                await self._handler(update)
+
+    async def stop_ws(self):
+        if self._queue is not None:
+            self._queue.put_nowait(None)
+
+
+@dataclass
+class ReplayResult:
+    bars: int
+    seconds: float
+    start_equity: float
+    end_equity: float
+    fills: pd.DataFrame
+    equity: pd.Series = field(repr=False)
+
+    @property
+    def bars_per_second(self) -> float:
+        return self.bars / self.seconds if self.seconds else float("inf")
+
+    def summary(self) -> str:
+        return (f"bars={self.bars} in {self.seconds:.2f}s "
+                f"({self.bars_per_second:,.0f} bars/s) "
+                f"fills={len(self.fills)} "
+                f"equity {self.start_equity:,.2f} -> {self.end_equity:,.2f}")
+
+
+@contextlib.contextmanager
+def _sandbox(trading: SimTradingClient, quiet: bool):
+    """
+    Point main's state, risk and log hooks (and the live gate counters) at
+    in-memory stand-ins driven by the simulated clock, so a replay never
+    touches state/ or logs/ (nor waits on the REST rate budget or reuses
+    wall-clock cached broker state).
+    """
+    import diagnostics
+    import main
+    from broker_cache import cache
+    from scheduler import scheduler
+    day_start = {}
+
+    def update_day_start(_now, equity):
+        key = trading.now.strftime("%Y-%m-%d")
+        if day_start.get("date") != key:
+            day_start.update(date=key, equity=float(equity))
+
+    def should_pause(equity):
+        from config import ENABLE_DAILY_LOSS_GUARD, MAX_DAILY_DRAWDOWN_PCT
+        start = day_start.get("equity", 0.0)
+        if not ENABLE_DAILY_LOSS_GUARD or start <= 0:
+            return False
+        return (start - equity) / start >= MAX_DAILY_DRAWDOWN_PCT
+
+    hooks = {
+        "set_last_bar_ts": lambda *a, **k: None,
+        "log_event": lambda *a, **k: None,
+        "log_order": lambda *a, **k: None,
+        "update_day_start_equity_if_new_day": update_day_start,
+        "should_pause_trading": should_pause,
+    }
+    stubs = [(main, hooks),
+             (diagnostics, {"record": lambda *a, **k: None})]
+    saved = [(mod, {k: getattr(mod, k) for k in h}) for mod, h in stubs]
+    for mod, h in stubs:
+        for k, v in h.items():
+            setattr(mod, k, v)
+    out = contextlib.redirect_stdout(io.StringIO()) if quiet else \
+        contextlib.nullcontext()
+    try:
+        with out, scheduler.bypass(), cache.bypass():
+            yield main
+    finally:
+        for mod, h in saved:
+            for k, v in h.items():
+                setattr(mod, k, v)
+
+
+def replay(df_1h: pd.DataFrame, symbol: str = SYMBOL,
+           trading: SimTradingClient | None = None,
+           warmup: int = 300, quiet: bool = True) -> ReplayResult:
+    """
+    Run the live decision path over sorted 1h bars as if each had just
+    closed: the simulated broker advances, SignalState rebuilds the 4h bar
+    from the 1h bars seen so far (as REST returns the forming bar) and
+    produces the newest row, which main.process_row trades. The first
+    `warmup` bars only prime the indicators.
+    """
+    from strategy import SignalState
+
+    trading = trading or SimTradingClient()
+    state = SignalState()
+    start_equity = trading.equity
+    opn = df_1h["open"].to_numpy(dtype=np.float64)
+    high = df_1h["high"].to_numpy(dtype=np.float64)
+    low = df_1h["low"].to_numpy(dtype=np.float64)
+    close = df_1h["close"].to_numpy(dtype=np.float64)
+    volume = df_1h["volume"].to_numpy(dtype=np.float64) \
+        if "volume" in df_1h else np.zeros(len(df_1h))
+    curve = np.empty(len(df_1h))
+
+    last_iso = None
+    t0 = time.perf_counter()
+    with _sandbox(trading, quiet) as main:
+        for i, ts in enumerate(df_1h.index):
+            bar = {"open": opn[i], "high": high[i], "low": low[i],
+                   "close": close[i], "volume": volume[i]}
+            trading.on_bar(symbol, ts, bar)
+            state.update_1h(ts, bar)
+
+            if i >= warmup and (trading.is_crypto or
+                                trading.get_clock().is_open):
+                last_iso = main.process_row(
+                    trading, ts, state.row, last_iso, symbol)
+            curve[i] = trading.equity
+    seconds = time.perf_counter() - t0
+
+    fills = pd.DataFrame([f.__dict__ for f in trading.fills],
+                         columns=list(Fill.__dataclass_fields__))
+    return ReplayResult(len(df_1h), seconds, start_equity, trading.equity,
+                        fills, pd.Series(curve, index=df_1h.index,
+                                         name="equity"))
+
+
+if __name__ == "__main__":
+    from backtest import _read_bars
+
+    ap = argparse.ArgumentParser(description="Replay the live loop against "
+                                             "the simulated broker.")
+    ap.add_argument("bars", help="1h bars (.csv or .pkl, e.g. a bar-cache file)")
+    ap.add_argument("--symbol", default=SYMBOL)
+    ap.add_argument("--cash", type=float, default=BASE_EQUITY)
+    ap.add_argument("--slippage-bps", type=float, default=0.0)
+    ap.add_argument("--fee-bps", type=float, default=0.0)
+    ap.add_argument("--warmup", type=int, default=300)
+    ap.add_argument("--verbose", action="store_true",
+                    help="show process_signals output")
+    args = ap.parse_args()
+
+    sim = SimTradingClient(args.cash, slippage_bps=args.slippage_bps,
+                           fee_bps=args.fee_bps)
+    res = replay(_read_bars(args.bars), args.symbol, sim,
+                 warmup=args.warmup, quiet=not args.verbose)
+    print(res.summary())
+    if not res.fills.empty:
+        print(res.fills.tail(20).to_string(index=False))
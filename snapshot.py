@@ -0,0 +1,96 @@
+"""
+Snapshots of the incremental signal state, so a restart continues from the
+last bar close instead of re-warming hundreds of bars of TEMA/ADX history.
+
+`save` pickles a strategy.SignalState (or a columnar.ColumnarStore holding
+one per symbol) to SNAPSHOT_DIR, writing a temp file and renaming it, so a
+crash mid-write leaves the previous snapshot in place. `load` returns None
+for a missing, unreadable or outdated snapshot (format version or strategy
+parameters changed). `resume` only continues a loaded state if it lines up
+with freshly fetched bars (SignalState.matches); otherwise it recomputes
+from the frames, exactly as a cold start would.
+
+Snapshots are local, trusted files written by this bot (like the bar cache
+pickles); never load one from elsewhere.
+"""
+import os
+import pickle
+import time
+from pathlib import Path
+import pandas as pd
+from config import SNAPSHOT_DIR
+from metrics import timed
+from strategy import SignalState
+
+SNAPSHOT_VERSION = 3
+
+
+def snapshot_path(name: str) -> Path:
+    return SNAPSHOT_DIR / f"{name.replace('/', '')}.pkl"
+
+
+def _fingerprint(state: SignalState) -> tuple:
+    return (state.adx_threshold, state.cmo_threshold, state.fast_1h,
+            state.slow_1h, state.fast_4h, state.slow_4h)
+
+
+def _states(obj) -> list:
+    states = getattr(obj, "states", None)
+    return list(states.values()) if states is not None else [obj]
+
+
+@timed("snapshot.save")
+def save(name: str, obj, path: Path | None = None):
+    path = Path(path or snapshot_path(name))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    payload = {
+        "version": SNAPSHOT_VERSION,
+        "saved": time.time(),
+        "fingerprint": [_fingerprint(s) for s in _states(obj)],
+        "obj": obj,
+    }
+    with open(tmp, "wb") as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+def load(name: str, path: Path | None = None):
+    """
+    The snapshotted object, or None if there is none usable.
+    """
+    path = Path(path or snapshot_path(name))
+    if not path.exists():
+        return None
+    try:
+        with open(path, "rb") as f:
+            payload = pickle.load(f)
+    except Exception as e:
+        print(f"[snapshot] Ignoring unreadable {path.name}: {e}")
+        return None
+    if payload.get("version") != SNAPSHOT_VERSION:
+        return None
+    obj = payload["obj"]
+    current = _fingerprint(SignalState())
+    if any(fp != current for fp in payload["fingerprint"]):
+        print(f"[snapshot] {path.name}: strategy parameters changed, ignoring")
+        return None
+    return obj
+
+
+@timed("snapshot.resume")
+def resume(name: str, df_1h: pd.DataFrame, df_4h: pd.DataFrame,
+           state: SignalState | None = None) -> tuple[SignalState, bool]:
+    """
+    (state caught up with the frames, whether it was restored). `state`
+    defaults to the snapshot saved under `name`; if it cannot be continued
+    from these frames, the state is rebuilt from them instead.
+    """
+    if state is None:
+        state = load(name)
+    if state is not None and state.matches(df_1h, df_4h):
+        state.warm(*state.unseen(df_1h, df_4h))
+        return state, True
+    state = SignalState()
+    state.warm(df_1h, df_4h)
+    return state, False
@@ -1,27 +1,250 @@
+"""
+Persistent bot state in one embedded SQLite database (STATE_DB).
+
+The database runs in WAL mode, so every update is an atomic transaction and
+a crash can never leave a torn value behind. Reads come from an in-memory
+read-through cache, so the per-bar checks (last processed bar, day-start
+equity) cost a dict lookup rather than a file read. Several processes may
+share the database (fanout workers): each read first checks SQLite's
+data_version, which moves whenever another connection commits, and drops
+the cache if it has.
+
+Keys live in per-symbol namespaces ("global" for account-wide values).
+Alongside the current values the store keeps history: every processed bar,
+equity snapshots and cooldowns.
+
+The legacy text files (last_bar*.txt, day_start_equity.txt) are imported
+on first use and then left untouched.
+"""
+import contextlib
 import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
 from typing import Optional, Dict
-from config import LAST_BAR_FILE, DAY_START_EQUITY_FILE
+from pathlib import Path
+from config import (
+    LAST_BAR_FILE, DAY_START_EQUITY_FILE, STATE_DIR, STATE_DB, SYMBOL, SYMBOLS
+)
 
+GLOBAL = "global"
+_MISSING = object()
 
-def get_last_bar_ts() -> Optional[str]:
-    if LAST_BAR_FILE.exists():
-        return LAST_BAR_FILE.read_text().strip()
-    return None
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    ns      TEXT NOT NULL,
+    key     TEXT NOT NULL,
+    value   TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (ns, key)
+);
+CREATE TABLE IF NOT EXISTS processed_bars (
+    symbol   TEXT NOT NULL,
+    bar_ts   TEXT NOT NULL,
+    recorded REAL NOT NULL,
+    PRIMARY KEY (symbol, bar_ts)
+);
+CREATE TABLE IF NOT EXISTS equity_snapshots (
+    ts     TEXT NOT NULL,
+    equity REAL NOT NULL,
+    note   TEXT
+);
+CREATE TABLE IF NOT EXISTS cooldowns (
+    symbol   TEXT NOT NULL,
+    until    TEXT NOT NULL,
+    reason   TEXT,
+    recorded REAL NOT NULL
+);
+"""
 
 
-def set_last_bar_ts(ts_iso: str) -> None:
-    LAST_BAR_FILE.write_text(ts_iso)
+def _last_bar_file(symbol: str) -> Path:
+    safe = symbol.replace("/", "")
+    return STATE_DIR / f"last_bar_{safe}.txt"
 
 
-def get_day_start_equity() -> Optional[Dict]:
-    if DAY_START_EQUITY_FILE.exists():
+class StateStore:
+    """
+    Namespaced key/value state plus history tables, with an in-memory
+    cache of every key read or written.
+    """
+
+    def __init__(self, path: Path | str = STATE_DB):
+        self.path = str(path)
+        self._lock = threading.RLock()
+        self._cache: dict = {}
+        self._db = sqlite3.connect(self.path, check_same_thread=False,
+                                   isolation_level=None)
+        self._version = None  # data_version the cache was read at
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: atomic and consistent after a crash; at worst the
+        # last commit before a power loss is rolled back
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # ---- key/value ----
+
+    def _sync(self):
+        """
+        Drop the cache if another connection committed since it was read
+        (our own commits leave data_version alone). Call with the lock held.
+        """
+        version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._version:
+            self._cache.clear()
+            self._version = version
+
+    def get(self, key: str, ns: str = GLOBAL, default=None):
+        k = (ns, key)
+        with self._lock:
+            self._sync()
+            value = self._cache.get(k, _MISSING)
+            if value is _MISSING:
+                row = self._db.execute(
+                    "SELECT value FROM kv WHERE ns=? AND key=?", k).fetchone()
+                value = json.loads(row[0]) if row else None
+                self._cache[k] = value
+        return default if value is None else value
+
+    def set(self, key: str, value, ns: str = GLOBAL):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO kv VALUES (?, ?, ?, ?)",
+                (ns, key, json.dumps(value), time.time()))
+            self._cache[(ns, key)] = value
+
+    # ---- history ----
+
+    def record_bar(self, symbol: str, bar_ts: str):
+        """
+        Mark `bar_ts` processed: updates the symbol's last_bar and appends
+        to processed_bars in one transaction.
+        """
+        now = time.time()
+        with self._lock:
+            with self._transaction():
+                self._db.execute(
+                    "INSERT OR REPLACE INTO kv VALUES (?, 'last_bar', ?, ?)",
+                    (symbol, json.dumps(bar_ts), now))
+                self._db.execute(
+                    "INSERT OR IGNORE INTO processed_bars VALUES (?, ?, ?)",
+                    (symbol, bar_ts, now))
+            self._cache[(symbol, "last_bar")] = bar_ts
+
+    def record_equity(self, equity: float, ts: str | None = None,
+                      note: str | None = None):
+        ts = ts or datetime.now(timezone.utc).isoformat()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO equity_snapshots VALUES (?, ?, ?)",
+                (ts, float(equity), note))
+
+    def set_cooldown(self, symbol: str, until: str, reason: str | None = None):
+        with self._lock:
+            with self._transaction():
+                self._db.execute(
+                    "INSERT INTO cooldowns VALUES (?, ?, ?, ?)",
+                    (symbol, until, reason, time.time()))
+                self._db.execute(
+                    "INSERT OR REPLACE INTO kv VALUES (?, 'cooldown_until', ?, ?)",
+                    (symbol, json.dumps(until), time.time()))
+            self._cache[(symbol, "cooldown_until")] = until
+
+    def get_cooldown(self, symbol: str) -> Optional[str]:
+        return self.get("cooldown_until", ns=symbol)
+
+    def processed_bars(self, symbol: str, limit: int = 100) -> list[str]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT bar_ts FROM processed_bars WHERE symbol=? "
+                "ORDER BY bar_ts DESC LIMIT ?", (symbol, limit)).fetchall()
+        return [r[0] for r in rows]
+
+    def equity_history(self, since: str | None = None) -> list[tuple]:
+        with self._lock:
+            return self._db.execute(
+                "SELECT ts, equity, note FROM equity_snapshots "
+                "WHERE ts >= ? ORDER BY ts", (since or "",)).fetchall()
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        self._db.execute("BEGIN IMMEDIATE")
         try:
-            return json.loads(DAY_START_EQUITY_FILE.read_text())
-        except Exception:
+            yield
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    # ---- legacy files ----
+
+    def migrate_legacy(self, symbols=SYMBOLS):
+        """
+        Import the pre-database text files once.
+        """
+        if self.get("migrated", ns="meta"):
+            return
+        for symbol in symbols:
+            self.import_last_bar_file(symbol)
+        if DAY_START_EQUITY_FILE.exists() and \
+                self.get("day_start_equity") is None:
+            try:
+                self.set("day_start_equity",
+                         json.loads(DAY_START_EQUITY_FILE.read_text()))
+            except Exception:
+                pass
+        self.set("migrated", True, ns="meta")
+
+    def import_last_bar_file(self, symbol: str) -> Optional[str]:
+        path = _last_bar_file(symbol)
+        # single-symbol installs kept this in one shared file
+        if not path.exists() and symbol == SYMBOL:
+            path = LAST_BAR_FILE
+        if not path.exists() or self.get("last_bar", ns=symbol) is not None:
             return None
-    return None
+        ts_iso = path.read_text().strip()
+        self.record_bar(symbol, ts_iso)
+        return ts_iso
+
+
+_store: StateStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> StateStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                store = StateStore()
+                store.migrate_legacy()
+                _store = store
+    return _store
+
+
+def get_last_bar_ts(symbol: str = SYMBOL) -> Optional[str]:
+    store = get_store()
+    ts_iso = store.get("last_bar", ns=symbol)
+    if ts_iso is None:
+        # a symbol added after the one-off migration may still have a file
+        ts_iso = store.import_last_bar_file(symbol)
+    return ts_iso
+
+
+def set_last_bar_ts(ts_iso: str, symbol: str = SYMBOL) -> None:
+    get_store().record_bar(symbol, ts_iso)
+
+
+def get_day_start_equity() -> Optional[Dict]:
+    return get_store().get("day_start_equity")
 
 
 def set_day_start_equity(date_key: str, equity: float):
-    payload = {"date": date_key, "equity": float(equity)}
-    DAY_START_EQUITY_FILE.write_text(json.dumps(payload))
+    store = get_store()
+    store.set("day_start_equity", {"date": date_key, "equity": float(equity)})
+    store.record_equity(equity, note=f"day start {date_key}")
@@ -1,83 +1,106 @@
 import numpy as np
 import pandas as pd
-from indicators import tema, compute_atr, compute_adx_wilder, compute_cmo
+from indicators import tema_batch, tema_step_batch
+from kernels import adx_atr_cmo
+from incremental import IndicatorEngine
+from mtf import (
+    FOUR_HOURS, MTFAligner, completed_positions, join_4h_onto_1h, normalize
+)
 from config import ADX_THRESHOLD, CMO_THRESHOLD
 
+NAN = float("nan")
 
-def _ensure_ts_col(df: pd.DataFrame) -> pd.DataFrame:
+
+def _mtf_join_4h_onto_1h(
+        df_1h: pd.DataFrame, df_4h: pd.DataFrame,
+        spans_4h: tuple[int, int] = (20, 70)) -> pd.DataFrame:
     """
-    Ensure a 'ts' column exists from the DatetimeIndex (whatever its name),
-    sorted and tz-aware in UTC.
+    Stamp the 4h bar as it stood at each 1h close onto the 1h timeline:
+    OHLCV of the forming bucket plus its TEMAs, stepped from the 4h bars
+    completed before that bucket. Inputs must be sorted and UTC-indexed.
     """
-    x = df.sort_index().copy()
+    out = join_4h_onto_1h(df_1h)
+    pos = completed_positions(df_1h.index, df_4h.index)
+    out[[f"4h_TEMA{s}" for s in spans_4h]] = tema_step_batch(
+        df_4h["close"], pos, out["4h_close"], spans_4h)
+    return out
 
-    # Ensure DatetimeIndex and UTC
-    if not isinstance(x.index, pd.DatetimeIndex):
-        raise TypeError("Expected a DatetimeIndex for OHLC data.")
-    if x.index.tz is None:
-        x.index = x.index.tz_localize("UTC")
-    else:
-        x.index = x.index.tz_convert("UTC")
 
-    # Reset index to a column named 'ts' (works for unnamed indexes too)
-    try:
-        x = x.reset_index(names="ts")
-    except TypeError:
-        x = x.reset_index()
-        x = x.rename(columns={x.columns[0]: "ts"})
-    return x
+# entry gates on the confirmed (t-1) values, one bit each in `gates`
+GATE_LONG_TREND = 1     # 1h and 4h trends both up
+GATE_SHORT_TREND = 2    # 1h and 4h trends both down
+GATE_ADX_LEVEL = 4      # ADX_prev > adx_threshold
+GATE_ADX_RISING = 8     # ADX_slope_prev > 0
+GATE_CMO_LONG = 16      # CMO_prev > +cmo_threshold
+GATE_CMO_SHORT = 32     # CMO_prev < -cmo_threshold
+LONG_GATES = GATE_LONG_TREND | GATE_ADX_LEVEL | GATE_ADX_RISING | GATE_CMO_LONG
+SHORT_GATES = GATE_SHORT_TREND | GATE_ADX_LEVEL | GATE_ADX_RISING | \
+    GATE_CMO_SHORT
 
 
-def _mtf_join_4h_onto_1h(
-        df_1h: pd.DataFrame, df_4h: pd.DataFrame
-        ) -> pd.DataFrame:
+def gate_mask(x, adx_threshold: float = ADX_THRESHOLD,
+              cmo_threshold: float = CMO_THRESHOLD):
     """
-    Join 4H features onto the 1H timeline via merge_asof on 'ts'.
+    Bitmask of the entry gates that pass (GATE_* bits). `x` is a signal
+    frame, a mapping of equal-length arrays or a single row; the result is
+    an int array/Series or an int accordingly. NaNs fail every gate.
     """
-    df1 = _ensure_ts_col(df_1h)
-    df4 = _ensure_ts_col(df_4h)
-
-    # Prefix 4h columns (avoid collisions with 1h names)
-    df4 = df4.rename(columns={c: f"4h_{c}" for c in df4.columns if c != "ts"})
-
-    out = pd.merge_asof(
-        df1.sort_values("ts"),
-        df4.sort_values("ts"),
-        on="ts",
-        direction="backward",
-        allow_exact_matches=True,
+    short_trend, long_trend = x["ShortTrend_prev"], x["LongTrend_prev"]
+    adx, slope, cmo = x["ADX_prev"], x["ADX_slope_prev"], x["CMO_prev"]
+    return (
+        ((short_trend == 1) & (long_trend == 1)) * GATE_LONG_TREND |
+        ((short_trend == 0) & (long_trend == 0)) * GATE_SHORT_TREND |
+        (adx > adx_threshold) * GATE_ADX_LEVEL |
+        (slope > 0) * GATE_ADX_RISING |
+        (cmo > cmo_threshold) * GATE_CMO_LONG |
+        (cmo < -cmo_threshold) * GATE_CMO_SHORT
     )
-    out = out.set_index("ts").sort_index()
-    return out
 
 
-def compute_signals(df_1h: pd.DataFrame, df_4h: pd.DataFrame) -> pd.DataFrame:
-    one = df_1h.copy()
+def entry_rules(x, adx_threshold: float = ADX_THRESHOLD,
+                cmo_threshold: float = CMO_THRESHOLD, gates=None):
+    """
+    Confirmed (t-1) entry gates. `x` is a signal frame or any mapping of
+    equal-length arrays holding the *_prev columns; `gates` is its
+    gate_mask if already computed.
+    Returns (long_signal, short_signal) boolean arrays/Series.
+    """
+    if gates is None:
+        gates = gate_mask(x, adx_threshold, cmo_threshold)
+    long_signal = (gates & LONG_GATES) == LONG_GATES
+    short_signal = (gates & SHORT_GATES) == SHORT_GATES
+    return long_signal, short_signal
 
-    # === 1H indicators ===
-    one["TEMA10"] = tema(one["close"], 10)
-    one["TEMA80"] = tema(one["close"], 80)
-    one["ADX"] = compute_adx_wilder(one, window=14)
-    one["CMO"] = compute_cmo(one["close"], window=14)
-    one["ATR"] = compute_atr(one, window=14)
 
-    # === 4H indicators ===
-    four = df_4h.copy()
-    four["TEMA20"] = tema(four["close"], 20)
-    four["TEMA70"] = tema(four["close"], 70)
+def compute_signals(df_1h: pd.DataFrame, df_4h: pd.DataFrame,
+                    adx_threshold: float = ADX_THRESHOLD,
+                    cmo_threshold: float = CMO_THRESHOLD,
+                    spans_1h: tuple[int, int] = (10, 80),
+                    spans_4h: tuple[int, int] = (20, 70)) -> pd.DataFrame:
+    fast_1h, slow_1h = (f"TEMA{s}" for s in spans_1h)
+    fast_4h, slow_4h = (f"TEMA{s}" for s in spans_4h)
+    one = normalize(df_1h).copy()
 
-    # === Join 4H onto 1H ===
-    out = _mtf_join_4h_onto_1h(one, four)
+    # === 1H indicators ===
+    one[[fast_1h, slow_1h]] = tema_batch(one["close"], spans_1h)
+    adx, atr, cmo = adx_atr_cmo(one["high"], one["low"], one["close"],
+                                window=14)
+    one["ADX"] = adx
+    one["CMO"] = cmo
+    one["ATR"] = atr
+
+    # === 4H bar as of each 1H close, with its indicators ===
+    out = _mtf_join_4h_onto_1h(one, normalize(df_4h), spans_4h)
 
     # Forward-fill 4h fields so a fresh 1h bar
     # isn't NaN before the next 4h close
-    for c in ["4h_TEMA20", "4h_TEMA70"]:
+    for c in [f"4h_{fast_4h}", f"4h_{slow_4h}"]:
         if c in out.columns:
             out[c] = out[c].ffill()
 
     # === Trend flags (current bar) ===
-    out["ShortTrend"] = (out["TEMA10"] > out["TEMA80"]).astype(int)
-    out["LongTrend"] = (out["4h_TEMA20"] > out["4h_TEMA70"]).astype(int)
+    out["ShortTrend"] = (out[fast_1h] > out[slow_1h]).astype(int)
+    out["LongTrend"] = (out[f"4h_{fast_4h}"] > out[f"4h_{slow_4h}"]).astype(int)
 
     # === Confirmed values (t-1), then ffill to avoid NaNs on last bar ===
     out["ShortTrend_prev"] = out["ShortTrend"].shift(1)
@@ -100,21 +123,213 @@ def compute_signals(df_1h: pd.DataFrame, df_4h: pd.DataFrame) -> pd.DataFrame:
     out["LongTrend_prev"] = out["LongTrend_prev"].fillna(0).astype(int)
 
     # === Entry rules (confirmed) ===
-    out["long_signal"] = (
-        (out["ShortTrend_prev"] == 1) & (out["LongTrend_prev"] == 1) &
-        (out["ADX_prev"] > ADX_THRESHOLD) &
-        (out["ADX_slope_prev"] > 0) &
-        (out["CMO_prev"] > CMO_THRESHOLD)
-    )
-
-    out["short_signal"] = (
-        (out["ShortTrend_prev"] == 0) & (out["LongTrend_prev"] == 0) &
-        (out["ADX_prev"] > ADX_THRESHOLD) &
-        (out["ADX_slope_prev"] > 0) &
-        (out["CMO_prev"] < -CMO_THRESHOLD)
+    out["gates"] = gate_mask(out, adx_threshold, cmo_threshold)
+    out["long_signal"], out["short_signal"] = entry_rules(
+        out, adx_threshold, cmo_threshold, out["gates"]
     )
 
     out["entry_dir"] = np.where(out["long_signal"], 1,
                                 np.where(out["short_signal"], -1, 0))
 
     return out
+
+
+class SignalState:
+    """
+    compute_signals one bar at a time.
+
+    Holds the incremental 1h/4h indicator engines, the MTF aligner and the
+    ffilled t-1 values, so each new 1h bar yields the same row
+    compute_signals would put last, in O(1) instead of rebuilding every
+    column. update_4h takes completed 4h bars, fed before the first 1h bar
+    of a later bucket; the bucket a 1h bar falls in is rebuilt from the 1h
+    bars seen so far. Repeating the newest timestamp (the still-forming bar
+    in poll mode) revises that bar instead of appending a new one.
+    """
+
+    def __init__(self,
+                 adx_threshold: float = ADX_THRESHOLD,
+                 cmo_threshold: float = CMO_THRESHOLD,
+                 spans_1h: tuple[int, int] = (10, 80),
+                 spans_4h: tuple[int, int] = (20, 70)):
+        self.adx_threshold = adx_threshold
+        self.cmo_threshold = cmo_threshold
+        self.fast_1h, self.slow_1h = (f"TEMA{s}" for s in spans_1h)
+        self.fast_4h, self.slow_4h = (f"4h_TEMA{s}" for s in spans_4h)
+        self.engine_1h = IndicatorEngine(spans_1h)
+        self.engine_4h = IndicatorEngine(spans_4h, adx=False, cmo=False,
+                                         atr=False)
+        self.aligner = MTFAligner()
+        # engine state before the newest bar, to re-apply revisions
+        self._base_1h = self._base_4h = None
+        self.ts_1h = self.ts_4h = None
+        self.row: dict | None = None
+        # the forming 4h bucket and its 1h bars so far, by timestamp
+        self._bucket = None
+        self._hours: dict = {}
+        self._carry = {
+            "ShortTrend_prev": 0, "LongTrend_prev": 0,
+            "ADX_prev": NAN, "ADX_slope_prev": NAN, "CMO_prev": NAN,
+            "_adx": NAN, self.fast_4h: NAN, self.slow_4h: NAN,
+        }
+
+    @staticmethod
+    def _step(engine, base, last_ts, ts, closed, kind):
+        """
+        Returns (engine to update, base to keep). Only bars that may still
+        be revised (closed=False) pay for the snapshot.
+        """
+        if last_ts is not None and ts < last_ts:
+            raise ValueError(f"out-of-order {kind} bar {ts} < {last_ts}")
+        if ts == last_ts:
+            if base is None:
+                raise ValueError(f"{kind} bar {ts} was already closed")
+            engine = base.copy()
+        else:
+            base = engine.copy() if not closed else None
+        return engine, (None if closed else base)
+
+    def update_4h(self, ts: pd.Timestamp, bar, closed: bool = True) -> dict:
+        self.engine_4h, self._base_4h = self._step(
+            self.engine_4h, self._base_4h, self.ts_4h, ts, closed, "4h")
+        self.ts_4h = ts
+        features = {k: float(v) for k, v in bar.items()}
+        features.update(self.engine_4h.update(bar))
+        self.aligner.update_4h(ts, features)
+        return features
+
+    def _form_4h(self, ts: pd.Timestamp, bar):
+        """
+        Fold a 1h bar into its (still forming) 4h bucket and re-apply it.
+        """
+        bucket = ts.floor(FOUR_HOURS)
+        if bucket != self._bucket:
+            self._bucket, self._hours = bucket, {}
+        self._hours[ts] = dict(bar)
+        hours = [self._hours[k] for k in sorted(self._hours)]
+        four = {"open": hours[0]["open"],
+                "high": max(h["high"] for h in hours),
+                "low": min(h["low"] for h in hours),
+                "close": hours[-1]["close"]}
+        if "volume" in bar:
+            four["volume"] = sum(h["volume"] for h in hours)
+        self.update_4h(bucket, four, closed=False)
+
+    def _finalize(self, row: dict):
+        """
+        Roll the carried t-1 values forward once `row` is no longer the
+        newest bar (shift(1) + ffill in compute_signals).
+        """
+        c = self._carry
+        adx, cmo = row["ADX"], row["CMO"]
+        slope = adx - c["_adx"]
+        c["ShortTrend_prev"] = row["ShortTrend"]
+        c["LongTrend_prev"] = row["LongTrend"]
+        if adx == adx:
+            c["ADX_prev"] = adx
+        if slope == slope:
+            c["ADX_slope_prev"] = slope
+        if cmo == cmo:
+            c["CMO_prev"] = cmo
+        c["_adx"] = adx
+        for k in (self.fast_4h, self.slow_4h):
+            if row[k] == row[k]:
+                c[k] = row[k]
+
+    def update_1h(self, ts: pd.Timestamp, bar, closed: bool = True) -> dict:
+        """
+        Apply one 1h bar and return its signal row. Pass closed=False for
+        a bar that may arrive again with revised values.
+        """
+        if ts != self.ts_1h and self.row is not None:
+            self._finalize(self.row)
+        self.engine_1h, self._base_1h = self._step(
+            self.engine_1h, self._base_1h, self.ts_1h, ts, closed, "1h")
+        self.ts_1h = ts
+
+        row = {k: float(v) for k, v in bar.items()}
+        self._form_4h(ts, row)
+        row.update(self.engine_1h.update(bar))
+        row = self.aligner.stamp(ts, row)
+        c = self._carry
+        for k in (self.fast_4h, self.slow_4h):
+            if row.get(k, NAN) != row.get(k, NAN):
+                row[k] = c[k]
+
+        row["ShortTrend"] = int(row[self.fast_1h] > row[self.slow_1h])
+        row["LongTrend"] = int(row[self.fast_4h] > row[self.slow_4h])
+        for k in ("ShortTrend_prev", "LongTrend_prev", "ADX_prev",
+                  "ADX_slope_prev", "CMO_prev"):
+            row[k] = c[k]
+        row["gates"] = gate_mask(row, self.adx_threshold,
+                                 self.cmo_threshold)
+        long_signal, short_signal = entry_rules(
+            row, self.adx_threshold, self.cmo_threshold, row["gates"])
+        row["long_signal"] = bool(long_signal)
+        row["short_signal"] = bool(short_signal)
+        row["entry_dir"] = 1 if long_signal else (-1 if short_signal else 0)
+        self.row = row
+        return row
+
+    def replay(self, df_1h: pd.DataFrame, df_4h: pd.DataFrame):
+        """
+        Feed sorted history in time order, yielding (ts, row) per 1h bar.
+        4h bars are applied once their bucket has ended; the newest 1h bar
+        is left open to revision, as REST returns it while still forming.
+        """
+        ts_4h = df_4h.index
+        bars_4h = df_4h.to_dict("records")
+        k, n4 = 0, len(ts_4h)
+        n1 = len(df_1h)
+        for i, (ts, bar) in enumerate(
+                zip(df_1h.index, df_1h.to_dict("records")), 1):
+            bucket = ts.floor(FOUR_HOURS)
+            while k < n4 and ts_4h[k] < bucket:
+                self.update_4h(ts_4h[k], bars_4h[k])
+                k += 1
+            yield ts, self.update_1h(ts, bar, closed=i < n1)
+
+    def unseen(self, df_1h: pd.DataFrame, df_4h: pd.DataFrame):
+        """
+        The parts of freshly fetched frames not applied yet: bars after the
+        newest one, plus the newest itself while it is open to revision.
+        """
+        def after(df, ts, base):
+            if ts is None:
+                return df
+            return df[df.index >= ts] if base is not None else df[df.index > ts]
+        return (after(df_1h, self.ts_1h, self._base_1h),
+                after(df_4h, self.ts_4h, self._base_4h))
+
+    def matches(self, df_1h: pd.DataFrame, df_4h: pd.DataFrame) -> bool:
+        """
+        Whether this state can be continued from the given frames: its
+        newest bars fall inside them (no gap to bridge) and, if the newest
+        1h bar was closed, the frame still has the same close.
+        """
+        if self.ts_1h is None or df_1h.empty:
+            return False
+        if not df_1h.index[0] <= self.ts_1h <= df_1h.index[-1]:
+            return False
+        if self.ts_4h is not None and (
+                df_4h.empty or not df_4h.index[0] <= self.ts_4h):
+            return False
+        if self._base_1h is None:
+            close = df_1h["close"].get(self.ts_1h)
+            if close is None or float(close) != self.row["close"]:
+                return False
+        return True
+
+    def warm(self, df_1h: pd.DataFrame, df_4h: pd.DataFrame):
+        for _ in self.replay(df_1h, df_4h):
+            pass
+        return self.row
+
+    def frame(self) -> pd.DataFrame:
+        """
+        The newest row as a one-row signal frame (what process_signals reads).
+        """
+        if self.row is None:
+            return pd.DataFrame()
+        index = pd.DatetimeIndex([self.ts_1h], name="ts")
+        return pd.DataFrame([self.row], index=index)
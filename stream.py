@@ -0,0 +1,261 @@
+"""
+Event-driven bar ingestion.
+
+Instead of re-polling REST every POLL_SECONDS, subscribe to Alpaca's live
+minute bars, roll them up into 1h bars locally (and the 1h bars into 4h
+bars) and run the strategy the moment a 1h bar closes. REST is only used
+to seed history and to catch up after a reconnect or data gap.
+"""
+import asyncio
+import traceback
+from datetime import timedelta
+import pandas as pd
+from config import (
+    API_KEY, API_SECRET, IS_CRYPTO, SNAPSHOT,
+    STREAM_GAP_MINUTES, STREAM_RETRY_SECONDS
+)
+from data import get_1h_and_4h
+import metrics
+from metrics import span
+from logger import log_event
+from state import get_last_bar_ts
+import snapshot
+from strategy import SignalState
+
+ONE_MINUTE = pd.Timedelta(minutes=1)
+ONE_HOUR = pd.Timedelta(hours=1)
+FOUR_HOURS = pd.Timedelta(hours=4)
+OHLCV = ["open", "high", "low", "close", "volume"]
+
+
+def make_data_stream():
+    """
+    Live market-data websocket for the configured asset class.
+    """
+    if IS_CRYPTO:
+        from alpaca.data.live import CryptoDataStream
+        return CryptoDataStream(API_KEY, API_SECRET)
+    from alpaca.data.live import StockDataStream
+    return StockDataStream(API_KEY, API_SECRET)
+
+
+def _bar_fields(bar) -> tuple[pd.Timestamp, dict]:
+    """
+    Accept an alpaca Bar model or a plain mapping (e.g. a replayed bar).
+    """
+    get = bar.get if isinstance(bar, dict) else \
+        (lambda k: getattr(bar, k))
+    ts = pd.Timestamp(get("timestamp"))
+    ts = ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+    return ts, {c: float(get(c)) for c in OHLCV}
+
+
+def _aggregate(rows: pd.DataFrame) -> dict:
+    return {
+        "open": float(rows["open"].iloc[0]),
+        "high": float(rows["high"].max()),
+        "low": float(rows["low"].min()),
+        "close": float(rows["close"].iloc[-1]),
+        "volume": float(rows["volume"].sum()),
+    }
+
+
+class BarAggregator:
+    """
+    Roll finer bars up into fixed `period` buckets labelled by their start
+    time (Alpaca's convention). `add` returns (bucket_ts, bar) for every
+    bucket that is known to be complete, either because its last sub-bar
+    arrived or because a bar from a later bucket did.
+    """
+
+    def __init__(self, period: pd.Timedelta, step: pd.Timedelta):
+        self.period = period
+        self.step = step
+        self.bucket: pd.Timestamp | None = None
+        self.bar: dict | None = None
+
+    def add(self, ts: pd.Timestamp, bar: dict) -> list:
+        closed = []
+        bucket = ts.floor(self.period)
+        if self.bucket is not None and bucket > self.bucket:
+            closed.append((self.bucket, self.bar))
+            self.bucket, self.bar = None, None
+        if self.bucket is None:
+            self.bucket, self.bar = bucket, dict(bar)
+        else:
+            self.bar["high"] = max(self.bar["high"], bar["high"])
+            self.bar["low"] = min(self.bar["low"], bar["low"])
+            self.bar["close"] = bar["close"]
+            self.bar["volume"] += bar["volume"]
+        if ts + self.step >= bucket + self.period:
+            closed.append((self.bucket, self.bar))
+            self.bucket, self.bar = None, None
+        return closed
+
+    def reset(self):
+        self.bucket, self.bar = None, None
+
+
+class LiveBarFeed:
+    """
+    Keeps the 1h/4h frames compute_signals needs, updated from the live
+    minute stream. The 4h frame is rebuilt locally from the 1h bars it
+    covers (including the still-forming 4h bar, as REST would return it).
+    Signals are maintained bar by bar in a SignalState. A REST catch-up
+    continues the current state, or at startup the last snapshot, when it
+    still lines up with the fetched frames, and re-warms it otherwise.
+    With SNAPSHOT on, the state is saved at every 1h close.
+    """
+
+    def __init__(self, symbol: str, gap: timedelta | None = None):
+        self.symbol = symbol
+        self.gap = gap or timedelta(minutes=STREAM_GAP_MINUTES)
+        self.hourly = BarAggregator(ONE_HOUR, ONE_MINUTE)
+        self.df_1h = pd.DataFrame(columns=OHLCV)
+        self.df_4h = pd.DataFrame(columns=OHLCV)
+        self.last_minute: pd.Timestamp | None = None
+        self.state: SignalState | None = None
+        # The first hour seen after (re)connecting is missing minutes,
+        # so it is taken from REST instead of the local aggregate.
+        self.partial = True
+
+    def catch_up(self, upto: pd.Timestamp | None = None):
+        """
+        Reload history from REST (cheap with the bar cache), keeping only
+        1h bars that start at or before `upto`.
+        """
+        df_1h, df_4h = get_1h_and_4h(self.symbol)
+        if upto is not None:
+            df_1h = df_1h[df_1h.index <= upto]
+            df_4h = df_4h[df_4h.index <= upto.floor(FOUR_HOURS)]
+        self.df_1h, self.df_4h = df_1h, df_4h
+        if not df_1h.empty:
+            self._restamp_4h(df_1h.index[-1])
+        state = self.state
+        if state is None and SNAPSHOT:
+            state = snapshot.load(self.symbol)
+        self.state, restored = snapshot.resume(
+            self.symbol, self.df_1h.astype(float), self.df_4h.astype(float),
+            state)
+        self._save()
+        log_event(f"stream catch-up {self.symbol}: {len(df_1h)} 1h bars"
+                  f"{' (state resumed)' if restored else ''}")
+
+    def _save(self):
+        if SNAPSHOT and self.state.ts_1h is not None:
+            try:
+                snapshot.save(self.symbol, self.state)
+            except Exception as e:
+                log_event(f"snapshot save failed: {e}")
+
+    def _restamp_4h(self, ts_1h: pd.Timestamp) -> tuple | None:
+        bucket = ts_1h.floor(FOUR_HOURS)
+        rows = self.df_1h[(self.df_1h.index >= bucket) &
+                          (self.df_1h.index < bucket + FOUR_HOURS)]
+        if rows.empty:
+            return None
+        agg = _aggregate(rows)
+        self.df_4h.loc[bucket, OHLCV] = [agg[c] for c in OHLCV]
+        self.df_4h = self.df_4h.sort_index()
+        return bucket, agg
+
+    async def _close_hour(self, bucket: pd.Timestamp, bar: dict):
+        # REST and snapshot writes run in a worker thread so the stream's
+        # event loop keeps reading (and answering pings) meanwhile
+        if self.partial:
+            await asyncio.to_thread(self.catch_up, bucket)
+            self.partial = False
+            return
+        self.df_1h.loc[bucket, OHLCV] = [bar[c] for c in OHLCV]
+        self.df_1h = self.df_1h.sort_index()
+        self._restamp_4h(bucket)
+        # the state rebuilds the forming 4h bar from its 1h bars itself
+        self.state.update_1h(bucket, bar)
+        await asyncio.to_thread(self._save)
+
+    async def on_bar(self, bar) -> bool:
+        """
+        Feed one live minute bar. Returns True when a 1h bar has closed
+        and the frames are ready for compute_signals.
+        """
+        ts, fields = _bar_fields(bar)
+        if self.last_minute is not None:
+            if ts <= self.last_minute:
+                return False  # duplicate / out-of-order replay
+            if ts - self.last_minute > self.gap:
+                # Missed data (reconnect or outage): rebuild from REST.
+                log_event(f"stream gap {self.last_minute} -> {ts}")
+                self.hourly.reset()
+                self.partial = True
+        self.last_minute = ts
+
+        closed = self.hourly.add(ts, fields)
+        for bucket, hour_bar in closed:
+            await self._close_hour(bucket, hour_bar)
+        return bool(closed)
+
+    def signals(self) -> pd.DataFrame:
+        """
+        The newest signal row (all process_signals reads).
+        """
+        if self.state is None or self.df_1h.empty or self.df_4h.empty:
+            return pd.DataFrame()
+        return self.state.frame()
+
+
+async def ingest(trading, symbol: str, stream, feed: LiveBarFeed | None = None):
+    """
+    Subscribe `stream` to `symbol` minute bars and trade on every 1h close,
+    until the stream is stopped. `stream` is an alpaca DataStream (or
+    anything with its subscribe_bars(handler, symbol), run() and stop()):
+    run() blocks on the stream's own event loop, which it gets in a worker
+    thread, and handlers run there. Cancelling ingest stops the stream.
+    """
+    from main import process_signals
+
+    feed = feed or LiveBarFeed(symbol)
+    last_processed_iso = get_last_bar_ts(symbol)
+
+    async def on_bar(bar):
+        nonlocal last_processed_iso
+        if not await feed.on_bar(bar):
+            return
+        try:
+            with span("stream.compute_signals"):
+                sig = feed.signals()
+            # order submission is blocking REST; keep the socket reader free
+            with span("stream.process_signals"):
+                last_processed_iso = await asyncio.to_thread(
+                    process_signals, trading, sig, last_processed_iso, symbol)
+        except Exception as e:
+            log_event(f"ERROR: {e}")
+            print("EXCEPTION ->", e)
+            traceback.print_exc()
+        metrics.maybe_flush()
+
+    stream.subscribe_bars(on_bar, symbol)
+    while True:
+        try:
+            await asyncio.to_thread(stream.run)
+            return
+        except asyncio.CancelledError:
+            stream.stop()
+            raise
+        except Exception as e:
+            log_event(f"stream error: {e}; reconnecting")
+            feed.hourly.reset()
+            feed.partial = True
+            await asyncio.sleep(STREAM_RETRY_SECONDS)
+
+
+def run_streaming(trading, symbol: str, stream=None):
+    from main import shutdown
+
+    stream = stream or make_data_stream()
+    try:
+        asyncio.run(ingest(trading, symbol, stream))
+    except KeyboardInterrupt:
+        log_event("keyboard interrupt -> exiting")
+        print("Exiting.")
+    finally:
+        shutdown()
@@ -0,0 +1,199 @@
+"""
+Parallel grid search over the strategy/risk thresholds.
+
+Everything that does not depend on a swept parameter (OHLC, ATR, the
+*_prev ADX/CMO columns, and one TEMA series per distinct span) is computed
+once, packed into a single shared-memory matrix and attached read-only by
+every worker process. Each combination then only rebuilds the trend flags
+and entry gates with NumPy and runs backtest.simulate.
+
+    python sweep.py BARS_1H.csv BARS_4H.csv --sort return_pct --out sweep.csv
+"""
+import argparse
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from config import (
+    ADX_THRESHOLD, CMO_THRESHOLD, CMO_SIZE_FLOOR,
+    VOL_SPIKE_CAP, ATR_TRAIL_MULT, BASE_EQUITY
+)
+from indicators import tema_batch, tema_step_batch
+from mtf import completed_positions, normalize
+from strategy import compute_signals, entry_rules
+from backtest import simulate, _read_bars
+
+DEFAULT_GRID = {
+    "adx_threshold": [20, ADX_THRESHOLD, 30],
+    "cmo_threshold": [10, CMO_THRESHOLD, 30],
+    "cmo_size_floor": [CMO_SIZE_FLOOR],
+    "vol_spike_cap": [VOL_SPIKE_CAP],
+    "atr_trail_mult": [2.0, ATR_TRAIL_MULT, 3.0],
+    "spans_1h": [(10, 80)],
+    "spans_4h": [(20, 70)],
+}
+
+_BASE_COLS = ["open", "high", "low", "close", "ATR",
+              "ADX_prev", "ADX_slope_prev", "CMO_prev"]
+
+# per-worker view of the shared feature matrix
+_W: dict = {}
+
+
+def _prev_flag(flag: np.ndarray) -> np.ndarray:
+    """
+    shift(1) + ffill + fillna(0) of a 0/1 trend flag, as compute_signals
+    does it.
+    """
+    out = np.empty_like(flag)
+    out[0] = 0
+    out[1:] = flag[:-1]
+    return out
+
+
+def build_features(df_1h: pd.DataFrame, df_4h: pd.DataFrame, grid: dict):
+    """
+    (matrix, column->row map, index): every column any combination needs,
+    each computed exactly once.
+    """
+    base = compute_signals(df_1h, df_4h)
+    cols = {c: base[c].to_numpy(dtype=np.float64) for c in _BASE_COLS}
+
+    spans_1h = sorted({s for pair in grid["spans_1h"] for s in pair})
+    spans_4h = sorted({s for pair in grid["spans_4h"] for s in pair})
+    close_1h = df_1h["close"].sort_index()
+    t1 = tema_batch(close_1h, spans_1h)
+    for j, s in enumerate(spans_1h):
+        cols[f"TEMA{s}"] = t1[:, j]
+
+    # 4h TEMAs of the bar as it stood at each 1h close, as compute_signals
+    # stamps them
+    four = normalize(df_4h)
+    pos = completed_positions(base.index, four.index)
+    t4 = tema_step_batch(four["close"], pos, base["4h_close"], spans_4h)
+    for j, s in enumerate(spans_4h):
+        cols[f"4h_TEMA{s}"] = pd.Series(t4[:, j]).ffill().to_numpy()
+
+    names = list(cols)
+    matrix = np.vstack([cols[c] for c in names])
+    return matrix, {c: i for i, c in enumerate(names)}, base.index
+
+
+def _attach(shm_name: str, shape, col_map: dict, index: pd.Index):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _W["shm"] = shm  # keep the mapping alive for the worker's lifetime
+    _W["m"] = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    _W["cols"] = col_map
+    _W["index"] = index
+
+
+def _col(name: str) -> np.ndarray:
+    return _W["m"][_W["cols"][name]]
+
+
+def evaluate_arrays(params: dict, col, index: pd.Index,
+                    lo: int = 0, hi: int | None = None,
+                    equity: float = BASE_EQUITY) -> dict:
+    """
+    Backtest one parameter combination on feature columns (`col(name)`
+    returns an array), trading only bars [lo, hi). Gates are built over
+    the whole arrays first, so the bar before `lo` still feeds the *_prev
+    flags.
+    """
+    f1, s1 = params["spans_1h"]
+    f4, s4 = params["spans_4h"]
+    short_trend = (col(f"TEMA{f1}") > col(f"TEMA{s1}")).astype(np.int64)
+    long_trend = (col(f"4h_TEMA{f4}") >
+                  col(f"4h_TEMA{s4}")).astype(np.int64)
+    gates = {
+        "ShortTrend_prev": _prev_flag(short_trend),
+        "LongTrend_prev": _prev_flag(long_trend),
+        "ADX_prev": col("ADX_prev"),
+        "ADX_slope_prev": col("ADX_slope_prev"),
+        "CMO_prev": col("CMO_prev"),
+    }
+    long_sig, short_sig = entry_rules(gates, params["adx_threshold"],
+                                      params["cmo_threshold"])
+    entry_dir = np.where(long_sig, 1, np.where(short_sig, -1, 0))
+
+    cmo_prev = np.nan_to_num(col("CMO_prev"), nan=0.0)
+    w = slice(lo, hi)
+    res = simulate(
+        index[w], col("open")[w], col("high")[w], col("low")[w],
+        col("close")[w], col("ATR")[w], cmo_prev[w], entry_dir[w],
+        equity=equity,
+        atr_trail_mult=params["atr_trail_mult"],
+        vol_spike_cap=params["vol_spike_cap"],
+        cmo_size_floor=params["cmo_size_floor"],
+        cmo_threshold=params["cmo_threshold"],
+    )
+    return {**params, **res.stats}
+
+
+def evaluate(params: dict, equity: float = BASE_EQUITY) -> dict:
+    """
+    Backtest one parameter combination against the attached features.
+    """
+    return evaluate_arrays(params, _col, _W["index"], equity=equity)
+
+
+def _evaluate_chunk(chunk: list) -> list:
+    return [evaluate(p) for p in chunk]
+
+
+def combinations(grid: dict) -> list[dict]:
+    keys = list(grid)
+    return [dict(zip(keys, values))
+            for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def run_sweep(df_1h: pd.DataFrame, df_4h: pd.DataFrame,
+              grid: dict | None = None,
+              workers: int | None = None,
+              sort_by: str = "return_pct") -> pd.DataFrame:
+    """
+    Evaluate every combination of `grid` across a process pool and return
+    one row per combination, best first.
+    """
+    grid = {**DEFAULT_GRID, **(grid or {})}
+    matrix, col_map, index = build_features(df_1h, df_4h, grid)
+    combos = combinations(grid)
+    workers = workers or os.cpu_count() or 1
+    chunk = max(1, len(combos) // (workers * 4))
+    chunks = [combos[i:i + chunk] for i in range(0, len(combos), chunk)]
+
+    shm = shared_memory.SharedMemory(create=True, size=matrix.nbytes)
+    try:
+        np.ndarray(matrix.shape, dtype=np.float64, buffer=shm.buf)[:] = matrix
+        with ProcessPoolExecutor(
+                max_workers=workers, initializer=_attach,
+                initargs=(shm.name, matrix.shape, col_map, index)) as pool:
+            rows = [r for part in pool.map(_evaluate_chunk, chunks)
+                    for r in part]
+    finally:
+        shm.close()
+        shm.unlink()
+
+    table = pd.DataFrame(rows)
+    if sort_by in table.columns:
+        table = table.sort_values(sort_by, ascending=False,
+                                  ignore_index=True)
+    return table
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("bars_1h")
+    ap.add_argument("bars_4h")
+    ap.add_argument("--sort", default="return_pct")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--out", default=None, help="write the table as CSV")
+    args = ap.parse_args()
+
+    table = run_sweep(_read_bars(args.bars_1h), _read_bars(args.bars_4h),
+                      workers=args.workers, sort_by=args.sort)
+    if args.out:
+        table.to_csv(args.out, index=False)
+    print(table.head(20).to_string(index=False))
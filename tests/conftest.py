@@ -0,0 +1,18 @@
+import sys
+from pathlib import Path
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from synthetic import synthetic_ohlc, to_4h  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def bars():
+    """
+    2000 synthetic 1h bars and their 4h resample.
+    """
+    df_1h = synthetic_ohlc(2000)
+    return df_1h, to_4h(df_1h)
@@ -0,0 +1,58 @@
+"""
+Local stand-in for Alpaca's market-data websocket.
+
+ReplayServer speaks the data stream's msgpack protocol (connected, auth,
+subscribe) on 127.0.0.1 and replays recorded minute bars to every client
+that subscribes to their symbol, so a real alpaca DataStream pointed at
+`url` (url_override) drives the bot end to end without the network.
+"""
+import asyncio
+import msgpack
+import pandas as pd
+from websockets.asyncio.server import serve
+
+
+def _bar_message(symbol: str, ts: pd.Timestamp, bar: dict) -> dict:
+    return {"T": "b", "S": symbol,
+            "t": msgpack.Timestamp.from_unix_nano(ts.value),
+            "o": float(bar["open"]), "h": float(bar["high"]),
+            "l": float(bar["low"]), "c": float(bar["close"]),
+            "v": float(bar["volume"]), "n": 1, "vw": float(bar["close"])}
+
+
+class ReplayServer:
+    def __init__(self, symbol: str, bars: pd.DataFrame, batch: int = 10):
+        self.symbol = symbol
+        self.bars = bars
+        self.batch = batch
+        self.sent = 0
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"ws://{host}:{port}"
+
+    async def _handler(self, ws):
+        await ws.send(msgpack.packb([{"T": "success", "msg": "connected"}]))
+        msgpack.unpackb(await ws.recv())  # auth: any key will do
+        await ws.send(msgpack.packb([{"T": "success",
+                                      "msg": "authenticated"}]))
+        sub = msgpack.unpackb(await ws.recv())
+        symbols = sub.get("bars", [])
+        await ws.send(msgpack.packb([{"T": "subscription", "bars": symbols}]))
+        if self.symbol in symbols:
+            msgs = [_bar_message(self.symbol, ts, bar) for ts, bar in
+                    zip(self.bars.index, self.bars.to_dict("records"))]
+            for i in range(0, len(msgs), self.batch):
+                await ws.send(msgpack.packb(msgs[i:i + self.batch]))
+                self.sent += len(msgs[i:i + self.batch])
+        await ws.wait_closed()
+
+    async def __aenter__(self) -> "ReplayServer":
+        self._server = await serve(self._handler, "127.0.0.1", 0)
+        return self
+
+    async def __aexit__(self, *exc):
+        self._server.close()
+        await self._server.wait_closed()
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+from archive import BarArchive, ingest_files, read_dump
+from synthetic import synthetic_ohlc
+
+SYMBOL = "BTC/USD"
+TF = "1Hour"
+
+
+@pytest.fixture
+def bars():
+    """
+    1h bars from late January into early March: three monthly partitions.
+    """
+    return synthetic_ohlc(24 * 40, end="2026-03-05")
+
+
+def _same(got, expected):
+    # the archive stores ns timestamps whatever unit came in
+    expected = expected.set_axis(expected.index.as_unit("ns"))
+    pd.testing.assert_frame_equal(got, expected, check_freq=False,
+                                  check_names=False)
+
+
+def test_write_read_span_across_months(bars, tmp_path):
+    archive = BarArchive(tmp_path)
+    assert archive.write(SYMBOL, TF, bars) == len(bars)
+    assert archive.partitions(SYMBOL, TF) == ["2026-01", "2026-02", "2026-03"]
+    assert archive.span(SYMBOL, TF) == (bars.index[0], bars.index[-1])
+    _same(archive.read(SYMBOL, TF), bars)
+
+    # end-exclusive, crossing the Jan/Feb and Feb/Mar boundaries
+    start, end = pd.Timestamp("2026-01-31 20:00", tz="UTC"), \
+        pd.Timestamp("2026-03-01 02:00", tz="UTC")
+    _same(archive.read(SYMBOL, TF, start, end),
+          bars[(bars.index >= start) & (bars.index < end)])
+
+    # a range inside one month is served as views of the mapped files
+    one = archive.arrays(SYMBOL, TF, "2026-02-10", "2026-02-11")
+    assert len(one["ts"]) == 24 and isinstance(one["close"].base, np.memmap)
+
+
+def test_empty_ranges(bars, tmp_path):
+    archive = BarArchive(tmp_path)
+    assert archive.span(SYMBOL, TF) is None
+    assert archive.read(SYMBOL, TF).empty
+    archive.write(SYMBOL, TF, bars)
+    assert archive.read(SYMBOL, TF, "2025-01-01", "2025-06-01").empty
+    assert archive.read(SYMBOL, TF, "2026-02-10", "2026-02-10").empty
+    assert archive.read("ETH/USD", TF).empty
+
+
+def test_reingest_merges_and_overwrites(bars, tmp_path):
+    archive = BarArchive(tmp_path)
+    archive.write(SYMBOL, TF, bars.iloc[:600])
+    revised = bars.iloc[590:].copy()
+    revised["close"] += 1.0
+    archive.write(SYMBOL, TF, revised)
+    expected = pd.concat([bars.iloc[:590], revised])
+    _same(archive.read(SYMBOL, TF), expected)
+    assert archive.span(SYMBOL, TF) == (bars.index[0], bars.index[-1])
+
+
+def test_ingest_csv_dump(bars, tmp_path):
+    path = tmp_path / "dump_1h.csv"
+    bars.iloc[::-1].rename(columns=str.upper).to_csv(path)  # any order/case
+    dump = read_dump(str(path), SYMBOL)
+    np.testing.assert_allclose(dump.to_numpy(), bars.to_numpy())
+
+    archive = BarArchive(tmp_path / "archive")
+    assert ingest_files(archive, SYMBOL, TF, [str(path)]) == len(bars)
+    got = archive.read(SYMBOL, TF)
+    assert got.index.equals(bars.index)
+    np.testing.assert_allclose(got.to_numpy(), bars.to_numpy())
+
+
+def test_ingest_alpaca_frame_dumps(bars, tmp_path):
+    raw = bars.set_axis(pd.MultiIndex.from_product(
+        [[SYMBOL], bars.index], names=["symbol", "timestamp"]))
+    paths = [tmp_path / "raw.pkl"]
+    raw.to_pickle(paths[0])
+    try:
+        import pyarrow  # noqa: F401
+        paths.append(tmp_path / "raw.parquet")
+        raw.to_parquet(paths[1])
+    except ImportError:
+        pass
+    for path in paths:
+        archive = BarArchive(tmp_path / path.suffix[1:])
+        ingest_files(archive, SYMBOL, TF, [str(path)])
+        _same(archive.read(SYMBOL, TF), bars)
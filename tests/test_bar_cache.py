@@ -0,0 +1,124 @@
+from datetime import timedelta
+import pandas as pd
+import pytest
+from alpaca.data.timeframe import TimeFrame, TimeFrameUnit
+from bar_cache import BarCache
+from data import fetch_bars, lookback_days
+from scheduler import scheduler
+from synthetic import FakeHistoricalClient, synthetic_ohlc
+
+SYMBOL = "BTC/USD"
+TF = TimeFrame(1, TimeFrameUnit.Hour)
+LOOKBACK = 300
+
+
+class RecordingClient(FakeHistoricalClient):
+    """
+    FakeHistoricalClient that also keeps (symbols, start, rows) per request.
+    """
+
+    def __init__(self, frames):
+        super().__init__(frames)
+        self.log = []
+
+    def _bars(self, req):
+        out = super()._bars(req)
+        start = pd.Timestamp(req.start)
+        start = start.tz_localize("UTC") if start.tzinfo is None else start
+        self.log.append((req.symbol_or_symbols, start, len(out.df)))
+        return out
+
+    get_crypto_bars = _bars
+    get_stock_bars = _bars
+
+
+@pytest.fixture
+def client():
+    frames = {(s, TF.value): synthetic_ohlc(3000, seed=i, end="2026-03-01")
+              for i, s in enumerate((SYMBOL, "ETH/USD"))}
+    with scheduler.bypass():
+        yield RecordingClient(frames)
+
+
+def _now(client, i: int, symbol: str = SYMBOL):
+    """
+    Just after bar `i` of the fake history opened.
+    """
+    ts = client.frames[(symbol, TF.value)].index[i]
+    return (ts + timedelta(minutes=5)).to_pydatetime()
+
+
+def _same(got, expected):
+    # the index freq depends on how the frame was sliced, not on its bars
+    pd.testing.assert_frame_equal(got, expected, check_freq=False)
+
+
+def _expected(client, now, symbol: str = SYMBOL):
+    return fetch_bars(symbol, TF, LOOKBACK, True, end=now, client=client)
+
+
+def test_cold_then_incremental(client):
+    cache = BarCache(cache_dir=None, client=client)
+    now = _now(client, 1000)
+    _same(cache.get(SYMBOL, TF, LOOKBACK, True, now),
+                                  _expected(client, now))
+    window = now - timedelta(days=lookback_days(TF, LOOKBACK))
+    assert client.log[-1][1] == pd.Timestamp(window)
+
+    now = _now(client, 1003)
+    got = cache.get(SYMBOL, TF, LOOKBACK, True, now)
+    _same(got, _expected(client, now))
+    _, start, rows = client.log[-2]  # the cache's request, not _expected's
+    # the two overlap bars plus the three new ones
+    assert start == client.frames[(SYMBOL, TF.value)].index[999]
+    assert rows == cache.overlap + 3
+
+
+def test_revised_last_bar_overwrites(client):
+    cache = BarCache(cache_dir=None, client=client)
+    now = _now(client, 1000)
+    cache.get(SYMBOL, TF, LOOKBACK, True, now)
+    frame = client.frames[(SYMBOL, TF.value)]
+    frame.iloc[1000, frame.columns.get_loc("close")] += 123.0
+    got = cache.get(SYMBOL, TF, LOOKBACK, True, now)
+    assert got["close"].iloc[-1] == frame["close"].iloc[1000]
+    _same(got, _expected(client, now))
+
+
+def test_gap_longer_than_lookback_refetches(client):
+    cache = BarCache(cache_dir=None, client=client)
+    cache.get(SYMBOL, TF, LOOKBACK, True, _now(client, 1000))
+    now = _now(client, 2500)
+    got = cache.get(SYMBOL, TF, LOOKBACK, True, now)
+    window = now - timedelta(days=lookback_days(TF, LOOKBACK))
+    assert client.log[-1][1] == pd.Timestamp(window)
+    _same(got, _expected(client, now))
+
+
+def test_get_many_is_one_request(client):
+    cache = BarCache(cache_dir=None, client=client)
+    symbols = [SYMBOL, "ETH/USD"]
+    for i in (1000, 1002):
+        now = _now(client, i)
+        before = client.requests
+        got = cache.get_many(symbols, TF, LOOKBACK, True, now)
+        assert client.requests == before + 1
+        assert client.log[-1][0] == symbols
+        for s in symbols:
+            _same(got[s], _expected(client, now, s))
+
+
+def test_pickles_round_trip_through_cache_dir(client, tmp_path):
+    now = _now(client, 1000)
+    first = BarCache(cache_dir=tmp_path, client=client)
+    cached = first.get(SYMBOL, TF, LOOKBACK, True, now)
+    assert list(tmp_path.glob("*.pkl"))
+
+    # a new process: starts from the pickle and only asks for the overlap
+    again = BarCache(cache_dir=tmp_path, client=client)
+    got = again.get(SYMBOL, TF, LOOKBACK, True, now)
+    _same(got, cached)
+    assert client.log[-1][2] == again.overlap
+
+    again.clear(SYMBOL)
+    assert not list(tmp_path.glob("*.pkl"))
@@ -0,0 +1,169 @@
+import asyncio
+import time
+from types import SimpleNamespace
+import pandas as pd
+import pytest
+import execution
+import main
+from execution import AsyncExecutor, ExecutionService
+from sim_broker import SimTradeStream, SimTradingClient
+from scheduler import scheduler
+from broker_cache import cache
+
+SYMBOL = "BTC/USD"
+
+
+@pytest.fixture(autouse=True)
+def offline():
+    with scheduler.bypass(), cache.bypass():
+        yield
+
+
+def _sim(fill_chunks: int = 1, latency: float = 0.0):
+    sim = SimTradingClient(cash=100_000, is_crypto=True,
+                           fill_chunks=fill_chunks)
+    sim.on_bar(SYMBOL, pd.Timestamp("2024-01-01", tz="UTC"),
+               {"open": 100, "high": 101, "low": 99, "close": 100})
+    return sim, SimTradeStream(sim, latency=latency)
+
+
+async def _settle(executor: AsyncExecutor, sim: SimTradingClient):
+    """
+    Wait until the stream has delivered every fill the sim made.
+    """
+    for _ in range(200):
+        if abs(executor.book.get(SYMBOL) - sim.position_qty(SYMBOL)) < 1e-12:
+            return
+        await asyncio.sleep(0.01)
+
+
+def test_partial_fills():
+    async def run():
+        sim, stream = _sim(fill_chunks=3, latency=0.001)
+        ex = AsyncExecutor(sim, stream)
+        await ex.start()
+        track = await ex.flatten_and_enter(SYMBOL, 1, 3.0, 100, 1.0)
+        assert await ex.wait_done(track, 2)
+        await ex.stop()
+        return ex, track
+
+    ex, track = asyncio.run(run())
+    assert track.status == "filled"
+    assert track.filled_qty == 3.0 and track.partial_fills == 2
+    assert track.events == ["new", "partial_fill", "partial_fill", "fill"]
+    assert ex.book.get(SYMBOL) == 3.0
+    assert track.ack_latency_ms is not None
+    assert track.fill_latency_ms is not None
+
+
+def _order(filled: float, status: str):
+    return SimpleNamespace(id="o-1", symbol=SYMBOL, side="buy", qty="2",
+                           filled_qty=str(filled), filled_avg_price="100",
+                           status=status)
+
+
+def _update(event: str, filled: float, status: str):
+    return SimpleNamespace(event=event, order=_order(filled, status))
+
+
+def test_duplicate_and_out_of_order_updates():
+    async def run():
+        ex = AsyncExecutor(SimTradingClient(is_crypto=True))
+        # the stream beats the REST response, repeats itself and goes
+        # back in time; the REST response comes last and is stale
+        await ex.on_trade_update(_update("partial_fill", 1, "partially_filled"))
+        await ex.on_trade_update(_update("fill", 2, "filled"))
+        await ex.on_trade_update(_update("partial_fill", 1, "partially_filled"))
+        await ex.on_trade_update(_update("fill", 2, "filled"))
+        track = ex._track(_order(0, "accepted"), time.perf_counter_ns())
+        return ex, track
+
+    ex, track = asyncio.run(run())
+    assert ex.book.get(SYMBOL) == 2.0
+    assert track.status == "filled" and track.filled_qty == 2.0
+    assert track.partial_fills == 1
+
+
+@pytest.mark.parametrize("flip", ["after_fill", "concurrent"])
+def test_flip(flip):
+    async def run():
+        sim, stream = _sim(fill_chunks=2)
+        ex = AsyncExecutor(sim, stream, flip=flip, fill_timeout=2)
+        await ex.start()
+        await ex.flatten_and_enter(SYMBOL, 1, 2.0, 100, 1.0)
+        await _settle(ex, sim)
+        assert ex.book.get(SYMBOL) == 2.0
+        entry = await ex.flatten_and_enter(SYMBOL, -1, 1.5, 100, 1.0)
+        assert await ex.wait_done(entry, 2)
+        await _settle(ex, sim)
+        await ex.stop()
+        return ex, sim, entry
+
+    ex, sim, entry = asyncio.run(run())
+    assert entry.side == -1 and entry.filled_qty == 1.5
+    assert sim.position_qty(SYMBOL) == pytest.approx(-1.5)
+    assert ex.book.get(SYMBOL) == pytest.approx(-1.5)
+    closes = [t for t in ex.orders.values() if t.id != entry.id and
+              t.side == -1]
+    assert [t.filled_qty for t in closes] == [2.0]
+
+
+def test_finished_orders_are_capped():
+    async def run():
+        sim, stream = _sim()
+        ex = AsyncExecutor(sim, stream, keep_done=3)
+        await ex.start()
+        for _ in range(6):
+            track = await ex.submit_entry(SYMBOL, 1, 0.1, 100, 1.0)
+            assert await ex.wait_done(track, 2)
+        await ex.stop()
+        return ex, track
+
+    ex, last = asyncio.run(run())
+    assert len(ex.orders) == 3 and last.id in ex.orders
+    assert ex.book.get(SYMBOL) == pytest.approx(0.6)
+
+
+def test_service_returns_without_waiting_for_the_flip():
+    sim, stream = _sim()
+    service = ExecutionService(AsyncExecutor(sim, stream, fill_timeout=1))
+    service.start()
+    try:
+        service.flatten_and_enter(SYMBOL, 1, 1.0, 100, 1.0).result(5)
+        # the close is accepted but its fill never arrives
+        sim.listeners.clear()
+        close_position = sim.close_position
+
+        def accepted(symbol):
+            order = close_position(symbol)
+            order.status, order.filled_qty = "accepted", "0"
+            return order
+
+        sim.close_position = accepted
+        t0 = time.perf_counter()
+        future = service.flatten_and_enter(SYMBOL, -1, 1.0, 100, 1.0)
+        assert time.perf_counter() - t0 < 0.5
+        assert not future.done()
+        # entered anyway once fill_timeout ran out
+        assert future.result(5).side == -1
+        assert time.perf_counter() - t0 >= 1.0
+    finally:
+        service.stop()
+
+
+def test_shutdown_stops_the_service(monkeypatch):
+    sim, stream = _sim()
+    service = ExecutionService(AsyncExecutor(sim, stream)).start()
+    task = service.executor._stream_task
+    monkeypatch.setattr(execution, "_service", service)
+    monkeypatch.setattr(main, "ASYNC_EXECUTION", True)
+    flushed = []
+    monkeypatch.setattr(main.metrics, "flush", lambda: flushed.append("m"))
+    monkeypatch.setattr(main.diagnostics, "flush",
+                        lambda: flushed.append("d"))
+
+    main.shutdown()
+    assert execution._service is None
+    assert task.done() and not task.cancelled()  # stream ended by stop_ws
+    assert not service._thread.is_alive()
+    assert flushed == ["m", "d"]
@@ -0,0 +1,30 @@
+import pytest
+import fanout
+import scheduler
+from config import RATE_LIMITS
+
+
+@pytest.fixture
+def fresh_scheduler(monkeypatch):
+    monkeypatch.setattr(scheduler, "scheduler", scheduler.RequestScheduler())
+    return scheduler.scheduler
+
+
+def test_split_divides_shared_buckets():
+    limits = {"trading": (180, 10), "data": (180, 10)}
+    assert scheduler.split(limits, {"trading": 4}) == {
+        "trading": (45.0, 2), "data": (180.0, 10)}
+    assert scheduler.split(limits, {"trading": 40})["trading"] == (4.5, 1)
+
+
+def test_workers_share_the_trading_budget(fresh_scheduler):
+    workers = 4
+    fanout._share_budget(workers)
+    trading = fresh_scheduler.buckets["trading"]
+    per_minute, burst = RATE_LIMITS["trading"]
+    assert trading.rate * 60 * workers == pytest.approx(per_minute)
+    assert trading.burst * workers <= burst
+    # the workers together never start with more than one account's burst
+    assert trading.tokens * workers <= burst
+    assert fresh_scheduler.buckets["data"].rate * 60 == \
+        pytest.approx(RATE_LIMITS["data"][0])
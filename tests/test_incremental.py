@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+from incremental import IndicatorEngine
+from indicators import compute_adx_wilder, compute_atr, compute_cmo, tema
+from synthetic import synthetic_ohlc
+
+
+@pytest.fixture(scope="module")
+def ohlc():
+    df = synthetic_ohlc(3000, seed=7)
+    # a flat stretch: zero ranges and zero CMO denominators
+    df.iloc[1200:1240] = df.iloc[1200].to_numpy()
+    return df
+
+
+@pytest.fixture(scope="module")
+def rows(ohlc):
+    engine = IndicatorEngine((10, 80))
+    return pd.DataFrame([engine.update(bar) for bar in
+                         ohlc.to_dict("records")], index=ohlc.index)
+
+
+@pytest.mark.parametrize("span", [10, 80])
+def test_tema(ohlc, rows, span):
+    np.testing.assert_allclose(rows[f"TEMA{span}"], tema(ohlc["close"], span),
+                               rtol=1e-12)
+
+
+def test_atr(ohlc, rows):
+    np.testing.assert_allclose(rows["ATR"], compute_atr(ohlc), rtol=1e-12)
+
+
+def test_adx(ohlc, rows):
+    # Wilder smoothing accumulates in a different order: ~1e-14 apart
+    np.testing.assert_allclose(rows["ADX"], compute_adx_wilder(ohlc),
+                               rtol=1e-10, atol=1e-10)
+
+
+def test_cmo(ohlc, rows):
+    np.testing.assert_allclose(rows["CMO"], compute_cmo(ohlc["close"]),
+                               rtol=1e-12, atol=1e-9)
+
+
+def test_copy_replays_revised_bar(ohlc):
+    bars = ohlc.to_dict("records")
+    engine = IndicatorEngine()
+    for bar in bars[:500]:
+        engine.update(bar)
+    base = engine.copy()
+    engine.update({**bars[500], "close": bars[500]["close"] + 100})
+    assert base.update(bars[500]) == IndicatorEngine().run(
+        ohlc.iloc[:501]).iloc[-1].to_dict()
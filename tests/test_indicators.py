@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+import pytest
+from indicators import tema, tema_batch
+
+SPANS = (5, 10, 20, 70, 80, 200)
+
+
+@pytest.mark.parametrize("n", [1, 63, 64, 65, 3000])
+def test_tema_batch_matches_pandas(n):
+    rng = np.random.default_rng(n)
+    close = pd.Series(100 + np.cumsum(rng.normal(0, 1, n)))
+    got = tema_batch(close, SPANS)
+    for j, s in enumerate(SPANS):
+        np.testing.assert_allclose(got[:, j], tema(close, s), rtol=1e-12)
+
+
+def test_tema_batch_with_nans():
+    rng = np.random.default_rng(0)
+    close = pd.Series(100 + np.cumsum(rng.normal(0, 1, 500)))
+    close.iloc[[0, 1, 200]] = np.nan
+    got = tema_batch(close, SPANS)
+    for j, s in enumerate(SPANS):
+        np.testing.assert_allclose(got[:, j], tema(close, s), rtol=1e-12)
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+import indicators
+import kernels
+from indicators import compute_adx_wilder, compute_atr, compute_cmo
+
+
+def _bars(n: int, seed: int = 7) -> pd.DataFrame:
+    """
+    A random walk with a flat stretch (zero-range windows).
+    """
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    spread = np.abs(rng.normal(0, 0.004, n)) * close
+    flat = slice(n // 4, n // 4 + 100)
+    close[flat] = close[flat.start - 1]
+    spread[flat] = 0.0
+    return pd.DataFrame({"high": close + spread, "low": close - spread,
+                         "close": close})
+
+
+def _numpy(df):
+    return kernels.adx_atr_cmo(df["high"], df["low"], df["close"],
+                               use_numba=False)
+
+
+def _numba(df):
+    return kernels.adx_atr_cmo(df["high"], df["low"], df["close"],
+                               use_numba=True)
+
+
+def _loop(df):
+    # the compiled loop's logic, run by the interpreter
+    loop = getattr(kernels._fused_loop, "py_func", kernels._fused_loop)
+    out = [np.empty(len(df)) for _ in range(3)]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        loop(df["high"].to_numpy(), df["low"].to_numpy(),
+             df["close"].to_numpy(), 14, *out)
+    return out
+
+
+PATHS = [
+    pytest.param(_numpy, id="numpy"),
+    pytest.param(_numba, id="numba", marks=pytest.mark.skipif(
+        not kernels.HAVE_NUMBA, reason="numba not installed")),
+    pytest.param(_loop, id="loop"),
+]
+
+
+@pytest.mark.parametrize("n", [20_000, 9], ids=["long", "short"])
+@pytest.mark.parametrize("path", PATHS)
+def test_matches_indicators(path, n):
+    if path is _loop and n > 5000:
+        n = 5000  # interpreted: keep it quick
+    df = _bars(n)
+    ref = (compute_adx_wilder(df), compute_atr(df), compute_cmo(df["close"]))
+    for label, r, g in zip(("ADX", "ATR", "CMO"), ref, path(df)):
+        r = r.to_numpy()
+        assert np.array_equal(np.isnan(r), np.isnan(g)), label
+        ok = ~np.isnan(r)
+        scale = np.maximum(np.abs(r[ok]), 1.0)
+        assert np.max(np.abs(r[ok] - g[ok]) / scale, initial=0.0) < 1e-9, \
+            label
+
+
+def test_numpy_path_stays_vectorized(monkeypatch):
+    """
+    Clean OHLC only has dx's leading NaN: the fallback must not drop to the
+    interpreted EWM scan for it.
+    """
+    def scan(*a, **k):
+        raise AssertionError("_ema_rows_scan called for NaN-free OHLC")
+
+    monkeypatch.setattr(indicators, "_ema_rows_scan", scan)
+    df = _bars(20_000)
+    adx = _numpy(df)[0]
+    ref = compute_adx_wilder(df).to_numpy()
+    assert np.array_equal(np.isnan(ref), np.isnan(adx))
+    ok = ~np.isnan(ref)
+    assert np.max(np.abs(ref[ok] - adx[ok]) / np.maximum(ref[ok], 1.0)) < 1e-9
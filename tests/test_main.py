@@ -0,0 +1,95 @@
+import pandas as pd
+import pytest
+import main
+import snapshot
+from strategy import compute_signals
+from synthetic import to_4h
+
+SYMBOL = "BTC/USD"
+
+
+@pytest.fixture
+def polling(bars, monkeypatch, tmp_path):
+    """
+    poll_once against in-memory bars that grow one hour per poll, with
+    snapshots under tmp_path. Yields (advance(n), processed frames, saves).
+    """
+    df_1h = bars[0].iloc[:800]
+    upto = {"n": 600}
+    processed, saves = [], []
+
+    def fetch(symbol):
+        one = df_1h.iloc[:upto["n"]]
+        return one, to_4h(one)
+
+    def process(trading, sig, last_iso, symbol):
+        processed.append(sig)
+        return sig.index[-1].isoformat()
+
+    save = snapshot.save
+
+    def record_save(name, obj, path=None):
+        saves.append(obj.ts_1h)
+        save(name, obj, path)
+
+    monkeypatch.setattr(main, "SNAPSHOT", True)
+    monkeypatch.setattr(snapshot, "SNAPSHOT_DIR", tmp_path)
+    monkeypatch.setattr(snapshot, "save", record_save)
+    monkeypatch.setattr(main, "get_1h_and_4h", fetch)
+    monkeypatch.setattr(main, "has_new_bar", lambda *a, **k: True)
+    monkeypatch.setattr(main, "process_signals", process)
+    monkeypatch.setattr(main, "_states", {})
+
+    def advance(n):
+        upto["n"] = n
+        return fetch(SYMBOL)
+
+    yield advance, processed, saves
+
+
+def test_poll_saves_and_resumes_snapshot(polling, monkeypatch):
+    advance, processed, saves = polling
+    last = None
+    for n in range(600, 603):
+        df_1h, df_4h = advance(n)
+        last = main.poll_once(None, last, SYMBOL, check_market=False)
+    assert saves == list(df_1h.index[-3:])
+    assert snapshot.snapshot_path(SYMBOL).exists()
+
+    # restart: a fresh process loads the snapshot and continues it
+    monkeypatch.setattr(main, "_states", {})
+    state = main.load_state(SYMBOL)
+    assert state is not None and state.ts_1h == df_1h.index[-1]
+    stopped = state.ts_1h
+    warm = state.warm
+    calls = []
+    monkeypatch.setattr(state, "warm",
+                        lambda a, b: calls.append(list(a.index)) or warm(a, b))
+
+    df_1h, df_4h = advance(605)
+    main.poll_once(None, last, SYMBOL, check_market=False)
+    assert main._states[SYMBOL] is state
+    # only the bar it stopped at (still open to revision) and the new ones
+    assert calls == [list(df_1h.index[df_1h.index >= stopped])]
+    assert len(calls[0]) == 4
+    expected = compute_signals(df_1h, df_4h).iloc[-1]
+    got = processed[-1].iloc[-1]
+    assert processed[-1].index[-1] == df_1h.index[-1]
+    pd.testing.assert_series_equal(got[expected.index].astype(float),
+                                   expected.astype(float), check_names=False,
+                                   rtol=1e-9)
+
+
+def test_poll_rebuilds_state_that_does_not_line_up(polling, monkeypatch):
+    advance, processed, saves = polling
+    advance(600)
+    main.poll_once(None, None, SYMBOL, check_market=False)
+    stale = main._states[SYMBOL]
+
+    # bars moved past the snapshot with a gap: no continuing it
+    df_1h, df_4h = advance(800)
+    monkeypatch.setattr(main, "get_1h_and_4h",
+                        lambda s: (df_1h.iloc[700:], to_4h(df_1h.iloc[700:])))
+    main.poll_once(None, None, SYMBOL, check_market=False)
+    assert main._states[SYMBOL] is not stale
+    assert saves[-1] == df_1h.index[-1]
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+from strategy import SignalState, compute_signals
+
+FOUR_H = ["4h_open", "4h_high", "4h_low", "4h_close", "4h_volume",
+          "4h_TEMA20", "4h_TEMA70", "LongTrend", "gates", "entry_dir"]
+
+
+def _upto(df_1h, df_4h, i):
+    """
+    The frames as REST would return them right after 1h bar `i` closed:
+    the 4h bar of its bucket only covers the hours up to bar `i`.
+    """
+    one = df_1h.iloc[:i + 1]
+    four = df_4h[df_4h.index <= one.index[-1]].copy()
+    bucket = one.index[-1].floor("4h")
+    hours = one[one.index >= bucket]
+    four.loc[bucket] = [hours["open"].iloc[0], hours["high"].max(),
+                        hours["low"].min(), hours["close"].iloc[-1],
+                        hours["volume"].sum()]
+    return one, four
+
+
+def test_4h_features_ignore_later_1h_bars(bars):
+    df_1h, df_4h = bars
+    full = compute_signals(df_1h, df_4h)
+    for i in (400, 401, 402, 403, 1001, 1999):
+        past = compute_signals(*_upto(df_1h, df_4h, i))
+        pd.testing.assert_series_equal(
+            past[FOUR_H].iloc[-1], full[FOUR_H].iloc[i], check_names=False,
+            rtol=1e-12)
+
+
+def test_forming_4h_bar_is_built_from_hours_seen(bars):
+    df_1h, df_4h = bars
+    sig = compute_signals(df_1h, df_4h)
+    bucket = df_4h.index[200]
+    first = sig.loc[bucket]
+    assert first["4h_close"] == df_1h.loc[bucket, "close"]
+    assert first["4h_high"] == df_1h.loc[bucket, "high"]
+    assert first["4h_close"] != df_4h.loc[bucket, "close"]
+    last = sig.loc[bucket + pd.Timedelta(hours=3)]
+    assert last[["4h_open", "4h_high", "4h_low", "4h_close"]].tolist() == \
+        pytest.approx(df_4h.loc[bucket, ["open", "high", "low", "close"]]
+                      .tolist())
+
+
+def test_signal_state_matches_compute_signals(bars):
+    df_1h, df_4h = bars
+    full = compute_signals(df_1h, df_4h)
+    rows = pd.DataFrame([row for _, row in
+                         SignalState().replay(df_1h, df_4h)],
+                        index=full.index)
+    for c in FOUR_H:
+        np.testing.assert_allclose(rows[c], full[c], rtol=1e-12)
+
+
+def test_unsorted_naive_input_is_normalized(bars):
+    df_1h, df_4h = bars
+    full = compute_signals(df_1h, df_4h)
+    shuffled = df_1h.sample(frac=1.0, random_state=0)
+    shuffled.index = shuffled.index.tz_localize(None)
+    out = compute_signals(shuffled, df_4h)
+    pd.testing.assert_frame_equal(out, full, check_freq=False)
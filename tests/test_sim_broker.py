@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+import pandas as pd
+import pytest
+from alpaca.common.exceptions import APIError
+import diagnostics
+import sim_broker
+from sim_broker import SimTradingClient
+
+SYMBOL = "BTC/USD"
+TS = pd.Timestamp("2026-01-01", tz="UTC")
+
+
+def _bar(price, high=None, low=None):
+    return {"open": price, "high": high or price, "low": low or price,
+            "close": price}
+
+
+def _order(side, qty, tp=None, sl=None):
+    return SimpleNamespace(
+        symbol=SYMBOL, side=side, qty=qty,
+        take_profit=SimpleNamespace(limit_price=tp) if tp else None,
+        stop_loss=SimpleNamespace(stop_price=sl) if sl else None)
+
+
+def test_replay_leaves_live_gate_stats_alone(bars, monkeypatch, tmp_path):
+    gates = tmp_path / "gates.json"
+    monkeypatch.setattr(diagnostics, "_live", {})
+    monkeypatch.setattr(diagnostics, "path", gates)
+    monkeypatch.setattr(diagnostics, "_last_flush", 0.0)  # flush would be due
+
+    record = diagnostics.record
+    result = sim_broker.replay(bars[0].iloc[:600], "BTC/USD")
+    assert result.bars == 600
+    assert diagnostics._live == {}
+    assert not gates.exists()
+    assert diagnostics.record is record
+
+
+def test_opposite_orders_net_open_lots_fifo():
+    sim = SimTradingClient(cash=10_000, is_crypto=True)
+    sim.on_bar(SYMBOL, TS, _bar(100))
+    sim.submit_order(_order("buy", 2, tp=120, sl=90))
+    sim.on_bar(SYMBOL, TS + pd.Timedelta(hours=1), _bar(110))
+    sim.submit_order(_order("buy", 1, tp=130, sl=95))
+
+    # closes the first lot, then half of the second, which keeps its legs
+    sim.submit_order(_order("sell", 2.5))
+    assert [(lot.side, lot.qty, lot.entry, lot.sl) for lot in sim.lots[SYMBOL]] \
+        == [(1, 0.5, 110.0, 95.0)]
+    pos = sim.get_open_position(SYMBOL)
+    assert float(pos.qty) == 0.5 and float(pos.avg_entry_price) == 110.0
+    assert sim.equity == pytest.approx(10_000 + 2 * 10)
+
+    # a sell past the position flips it: the rest opens a short lot
+    sim.submit_order(_order("sell", 1.5, tp=100, sl=115))
+    assert [(lot.side, lot.qty, lot.tp) for lot in sim.lots[SYMBOL]] \
+        == [(-1, 1.0, 100.0)]
+    assert sim.position_qty(SYMBOL) == -1.0
+    assert [(f.side, f.qty, f.reason) for f in sim.fills[-2:]] == \
+        [(-1, 0.5, "close"), (-1, 1.0, "entry")]
+
+    # only the surviving short's stop can fire
+    sim.on_bar(SYMBOL, TS + pd.Timedelta(hours=2), _bar(110, high=116))
+    assert SYMBOL not in {p.symbol for p in sim.get_all_positions()}
+    assert sim.equity == pytest.approx(10_000 + 2 * 10 + 1 * (110 - 115))
+
+
+def test_flat_after_netting_has_no_position():
+    sim = SimTradingClient(cash=10_000, is_crypto=True)
+    sim.on_bar(SYMBOL, TS, _bar(100))
+    sim.submit_order(_order("buy", 0.1))
+    sim.submit_order(_order("buy", 0.2))
+    sim.submit_order(_order("sell", 0.3))  # 0.1 + 0.2 != 0.3 in floats
+    assert sim.lots[SYMBOL] == []
+    with pytest.raises(APIError):
+        sim.get_open_position(SYMBOL)
+    assert sim.equity == pytest.approx(10_000)
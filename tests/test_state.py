@@ -0,0 +1,25 @@
+from state import StateStore
+
+
+def test_cache_sees_other_connections_commits(tmp_path):
+    """
+    Two stores on one database, as fanout workers have: a value cached by
+    one is re-read once the other commits a change.
+    """
+    path = tmp_path / "state.sqlite3"
+    a, b = StateStore(path), StateStore(path)
+    try:
+        a.set("day_start_equity", {"date": "2026-01-01", "equity": 100.0})
+        assert b.get("day_start_equity")["equity"] == 100.0
+        b.record_bar("BTC/USD", "2026-01-01T00:00:00+00:00")
+        assert a.get("last_bar", ns="BTC/USD") == "2026-01-01T00:00:00+00:00"
+
+        a.set("day_start_equity", {"date": "2026-01-02", "equity": 90.0})
+        b.set_cooldown("ETH/USD", "2026-01-02T04:00:00+00:00")
+        assert b.get("day_start_equity")["equity"] == 90.0
+        assert a.get_cooldown("ETH/USD") == "2026-01-02T04:00:00+00:00"
+        # and its own writes still read back
+        assert a.get("last_bar", ns="BTC/USD") == "2026-01-01T00:00:00+00:00"
+    finally:
+        a.close()
+        b.close()
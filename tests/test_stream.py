@@ -0,0 +1,97 @@
+import asyncio
+import threading
+import pandas as pd
+import pytest
+from alpaca.data.live import CryptoDataStream
+import main
+import metrics
+import stream
+from sim_broker import SimTradingClient, _sandbox
+from strategy import compute_signals
+from synthetic import AGG, synthetic_ohlc, to_4h
+from fake_stream import ReplayServer
+
+SYMBOL = "BTC/USD"
+
+
+@pytest.fixture
+def recorded():
+    """
+    600 1h bars of history, then five hours of live minute bars; REST
+    serves the 1h/4h frames of both.
+    """
+    history = synthetic_ohlc(600, end="2026-01-01 00:00")
+    minutes = synthetic_ohlc(300, freq="1min", seed=1,
+                             end="2026-01-01 05:59")
+    df_1h = pd.concat([history, minutes.resample("1h").agg(AGG)])
+    return minutes, df_1h, to_4h(df_1h)
+
+
+def test_ingest_replayed_stream(recorded, monkeypatch):
+    minutes, df_1h, df_4h = recorded
+    loop_threads, io_threads, processed = set(), [], []
+    closes = threading.Event()
+
+    def rest(symbol):
+        io_threads.append(("rest", threading.current_thread()))
+        return df_1h, df_4h
+
+    def save(symbol, state):
+        io_threads.append(("save", threading.current_thread()))
+
+    trading = SimTradingClient(is_crypto=True)
+    process_signals = main.process_signals
+
+    def process(trading, sig, last_iso, symbol):
+        ts = sig.index[-1]
+        processed.append((ts, dict(sig.iloc[-1])))
+        trading.on_bar(symbol, ts, sig.iloc[-1])
+        out = process_signals(trading, sig, last_iso, symbol)
+        if len(processed) == 5:
+            closes.set()
+        return out
+
+    async def on_bar(bar, handler):
+        loop_threads.add(threading.current_thread())
+        return await handler(bar)
+
+    monkeypatch.setattr(stream, "get_1h_and_4h", rest)
+    monkeypatch.setattr(stream, "SNAPSHOT", True)
+    monkeypatch.setattr(stream.snapshot, "save", save)
+    monkeypatch.setattr(stream, "get_last_bar_ts", lambda symbol: None)
+    monkeypatch.setattr(main, "process_signals", process)
+    monkeypatch.setattr(metrics, "maybe_flush", lambda: None)
+
+    feed = stream.LiveBarFeed(SYMBOL)
+    feed_on_bar = feed.on_bar
+    monkeypatch.setattr(feed, "on_bar", lambda bar: on_bar(bar, feed_on_bar))
+
+    async def run():
+        async with ReplayServer(SYMBOL, minutes) as server:
+            ws = CryptoDataStream("key", "secret", url_override=server.url)
+            task = asyncio.create_task(
+                stream.ingest(trading, SYMBOL, ws, feed))
+            assert await asyncio.to_thread(closes.wait, 30)
+            await asyncio.to_thread(ws.stop)
+        # closing the server ends the stream's pending read
+        await asyncio.wait_for(task, 10)
+        return server.sent
+
+    with _sandbox(trading, quiet=True):
+        sent = asyncio.run(run())
+
+    assert sent == len(minutes)
+    hours = df_1h.index[-5:]
+    assert [ts for ts, _ in processed] == list(hours)
+    # the first hour after connecting comes from REST, the rest are
+    # rolled up from the minute bars; either way they match REST
+    pd.testing.assert_frame_equal(feed.df_1h.astype(float).iloc[-5:],
+                                  df_1h.iloc[-5:], check_freq=False)
+    # catch-up and snapshot writes left the stream's event loop
+    assert [kind for kind, _ in io_threads] == ["rest"] + ["save"] * 5
+    assert not loop_threads & {thread for _, thread in io_threads}
+
+    ref = compute_signals(df_1h, df_4h)
+    for ts, row in processed:
+        for c in ("TEMA80", "4h_TEMA20", "4h_TEMA70", "ADX", "entry_dir"):
+            assert row[c] == pytest.approx(ref.loc[ts, c], rel=1e-9), (ts, c)
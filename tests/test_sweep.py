@@ -0,0 +1,16 @@
+import numpy as np
+from strategy import compute_signals
+from sweep import build_features
+
+
+def test_shared_4h_columns_match_compute_signals(bars):
+    df_1h, df_4h = bars
+    grid = {"spans_1h": [(10, 80)], "spans_4h": [(20, 70), (10, 40)]}
+    matrix, col_map, index = build_features(df_1h, df_4h, grid)
+    sig = compute_signals(df_1h, df_4h, spans_4h=(10, 40))
+    ref = compute_signals(df_1h, df_4h)
+    for c, frame in (("4h_TEMA20", ref), ("4h_TEMA70", ref),
+                     ("4h_TEMA10", sig), ("4h_TEMA40", sig)):
+        np.testing.assert_allclose(matrix[col_map[c]], frame[c], rtol=1e-12)
+    np.testing.assert_allclose(matrix[col_map["TEMA80"]], ref["TEMA80"],
+                               rtol=1e-12)
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+from strategy import compute_signals
+from walkforward import FeatureCache, data_fingerprint, fold_features
+
+FOUR_HOURS = pd.Timedelta(hours=4)
+
+
+def _features(cache, df_1h, df_4h):
+    window = df_1h.iloc[500:1500]
+    return window, fold_features(cache, "BTC/USD", window, df_4h, 100,
+                                 [10, 80], [20, 70])
+
+
+def _reference(window, df_4h):
+    four = df_4h[df_4h.index >= window.index[0] - 100 * FOUR_HOURS]
+    return compute_signals(window, four)
+
+
+def test_fold_4h_columns_match_compute_signals(bars):
+    df_1h, df_4h = bars
+    window, cols = _features(FeatureCache(), df_1h, df_4h)
+    ref = _reference(window, df_4h)
+    for c in ("4h_TEMA20", "4h_TEMA70", "TEMA10", "ADX_prev"):
+        np.testing.assert_allclose(cols[c], ref[c], rtol=1e-12)
+
+
+def test_cache_is_keyed_by_input_data(bars, tmp_path):
+    df_1h, df_4h = bars
+    _features(FeatureCache(tmp_path, data_fingerprint(df_1h, df_4h)),
+              df_1h, df_4h)
+
+    revised = df_1h.copy()
+    revised["close"] *= 1.01
+    cache = FeatureCache(tmp_path, data_fingerprint(revised, df_4h))
+    window, cols = _features(cache, revised, df_4h)
+    assert cache.hits == 0
+    np.testing.assert_allclose(cols["TEMA80"],
+                               _reference(window, df_4h)["TEMA80"],
+                               rtol=1e-12)
+
+    again = FeatureCache(tmp_path, data_fingerprint(revised, df_4h))
+    _features(again, revised, df_4h)
+    assert again.misses == 0
@@ -0,0 +1,368 @@
+"""
+Walk-forward optimization of the strategy/risk thresholds.
+
+The bar history is cut into folds: fit on a train window of `train` 1h
+bars, then trade the next `test` bars with the winning parameters (out of
+sample), and move on by `step` bars (rolling) or grow the train window
+(--anchored). Every fold also gets `warmup` bars before its train window
+so indicators start warm, as they are in the live bot.
+
+- Folds run in parallel worker processes. Each one evaluates the whole
+  grid on its train window with sweep.evaluate_arrays (compute_signals
+  columns + backtest.simulate, i.e. broker.py sizing and brackets).
+- Indicator arrays are memoized per (symbol, input data, column/span,
+  fold range) in a FeatureCache. They are kept in memory and in a cache
+  directory as .npy files shared by workers and later runs over the same
+  bars (resumes, reruns with another grid or objective over the same
+  spans); different or revised bars get a different data fingerprint.
+  Indicators are causal, so a request is also served by a cached array
+  that starts at the same bar and runs further.
+- Each finished fold is appended to a JSONL file and flushed. Rerunning
+  with the same settings skips the folds already there, so an interrupted
+  run resumes where it stopped.
+
+    python walkforward.py BARS_1H.csv BARS_4H.csv --train 2000 --test 500 \\
+        --out wf.jsonl
+"""
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from config import BASE_EQUITY, LOOKBACK_1H, LOOKBACK_4H, SYMBOL
+from indicators import tema_batch, tema_step_batch
+from mtf import completed_positions
+from strategy import compute_signals
+from sweep import DEFAULT_GRID, _BASE_COLS, combinations, evaluate_arrays
+from backtest import _read_bars
+
+FOUR_HOURS = pd.Timedelta(hours=4)
+
+# per-worker inputs (set by _init)
+_WF: dict = {}
+
+
+def data_fingerprint(*frames: pd.DataFrame) -> str:
+    """
+    Short digest of the timestamps and values of `frames`.
+    """
+    h = hashlib.blake2b(digest_size=8)
+    for df in frames:
+        h.update(pd.util.hash_pandas_object(df, index=True)
+                 .to_numpy().tobytes())
+    return h.hexdigest()
+
+
+class FeatureCache:
+    """
+    Indicator arrays keyed by (symbol, name, first bar, last bar) ns, for
+    the input bars identified by `fingerprint` (data_fingerprint).
+    """
+
+    def __init__(self, cache_dir: Path | str | None = None,
+                 fingerprint: str = ""):
+        self.fingerprint = fingerprint
+        self.dir = Path(cache_dir) if cache_dir is not None else None
+        if self.dir is not None:
+            self.dir.mkdir(parents=True, exist_ok=True)
+        self._mem: dict[tuple, tuple[int, np.ndarray]] = {}
+        self.hits = self.misses = 0
+
+    def _prefix(self, symbol: str, name: str, start: int) -> str:
+        return f"{symbol.replace('/', '')}_{self.fingerprint}_{name}_{start}_"
+
+    def _file(self, symbol: str, name: str, start: int, end: int) -> Path:
+        return self.dir / f"{self._prefix(symbol, name, start)}{end}.npy"
+
+    def _lookup(self, symbol: str, name: str, start: int, end: int,
+                n: int) -> np.ndarray | None:
+        hit = self._mem.get((symbol, name, start))
+        if hit is not None and hit[0] >= end:
+            return hit[1][:n]
+        if self.dir is None:
+            return None
+        prefix = self._prefix(symbol, name, start)
+        for path in self.dir.glob(prefix + "*.npy"):
+            stop = int(path.stem[len(prefix):])
+            if stop >= end:
+                arr = np.load(path, mmap_mode="r")
+                self._mem[(symbol, name, start)] = (stop, arr)
+                return arr[:n]
+        return None
+
+    def _store(self, symbol: str, name: str, start: int, end: int,
+               arr: np.ndarray):
+        hit = self._mem.get((symbol, name, start))
+        if hit is None or hit[0] < end:
+            self._mem[(symbol, name, start)] = (end, arr)
+        if self.dir is not None:
+            path = self._file(symbol, name, start, end)
+            tmp = path.with_name(f".{path.name}.{os.getpid()}")
+            with open(tmp, "wb") as f:
+                np.save(f, arr)
+            os.replace(tmp, path)
+
+    def get(self, symbol: str, index: pd.DatetimeIndex, names: list[str],
+            compute) -> dict[str, np.ndarray]:
+        """
+        {name: array over `index`}, calling compute(missing_names) ->
+        {name: array} only for names not cached.
+        """
+        start, end, n = int(index.asi8[0]), int(index.asi8[-1]), len(index)
+        out, missing = {}, []
+        for name in names:
+            arr = self._lookup(symbol, name, start, end, n)
+            if arr is None:
+                missing.append(name)
+            else:
+                out[name] = arr
+        self.hits += len(out)
+        self.misses += len(missing)
+        if missing:
+            for name, arr in compute(missing).items():
+                arr = np.ascontiguousarray(arr, dtype=np.float64)
+                self._store(symbol, name, start, end, arr)
+                out[name] = arr
+        return out
+
+
+def fold_features(cache: FeatureCache, symbol: str, df_1h: pd.DataFrame,
+                  df_4h: pd.DataFrame, warmup_4h: int,
+                  spans_1h: list[int], spans_4h: list[int]) -> dict:
+    """
+    Feature columns (as sweep.build_features makes them) over the 1h bars
+    of one fold range, with `warmup_4h` 4h bars before it.
+    """
+    index = df_1h.index
+    four = df_4h[(df_4h.index >= index[0] - warmup_4h * FOUR_HOURS) &
+                 (df_4h.index <= index[-1])]
+
+    def base(names):
+        sig = compute_signals(df_1h, four)
+        return {c: sig[c].to_numpy(dtype=np.float64) for c in names}
+
+    def tema_1h(names):
+        spans = [int(c[4:]) for c in names]
+        t = tema_batch(df_1h["close"], spans)
+        return {c: t[:, j] for j, c in enumerate(names)}
+
+    def tema_4h(names):
+        spans = [int(c.split("@")[0][len("4h_TEMA"):]) for c in names]
+        # the forming 4h bar's close is the 1h close (mtf.py)
+        pos = completed_positions(index, four.index)
+        t = tema_step_batch(four["close"], pos, df_1h["close"], spans)
+        return {c: pd.Series(t[:, j]).ffill().to_numpy()
+                for j, c in enumerate(names)}
+
+    cols = cache.get(symbol, index, list(_BASE_COLS), base)
+    cols.update(cache.get(symbol, index, [f"TEMA{s}" for s in spans_1h],
+                          tema_1h))
+    # the aligned 4h columns also depend on how much 4h history was used
+    t4 = cache.get(symbol, index,
+                   [f"4h_TEMA{s}@{warmup_4h}" for s in spans_4h], tema_4h)
+    cols.update({c.split("@")[0]: a for c, a in t4.items()})
+    return cols
+
+
+def make_folds(n: int, train: int, test: int, step: int | None = None,
+               warmup: int = LOOKBACK_1H, anchored: bool = False) -> list[dict]:
+    """
+    Bar positions of each fold: features over [lo, test_hi), fit on
+    [train_lo, train_hi), trade [train_hi, test_hi).
+    """
+    step = step or test
+    folds = []
+    k = 0
+    while True:
+        train_hi = warmup + k * step + train
+        test_hi = train_hi + test
+        if test_hi > n:
+            break
+        train_lo = warmup if anchored else train_hi - train
+        folds.append({"fold": k, "lo": train_lo - warmup,
+                      "train_lo": train_lo, "train_hi": train_hi,
+                      "test_hi": test_hi})
+        k += 1
+    return folds
+
+
+def _init(df_1h, df_4h, symbol, combos, objective, warmup_4h, cache_dir,
+          equity, fingerprint=""):
+    _WF.update(df_1h=df_1h, df_4h=df_4h, symbol=symbol, combos=combos,
+               objective=objective, warmup_4h=warmup_4h, equity=equity,
+               cache=FeatureCache(cache_dir, fingerprint))
+
+
+def _score(stats: dict, objective: str) -> float:
+    v = stats.get(objective, np.nan)
+    return -np.inf if v is None or v != v else float(v)
+
+
+def _json_params(params: dict) -> dict:
+    return {k: list(v) if isinstance(v, tuple) else v for k, v in params.items()}
+
+
+def run_fold(fold: dict) -> dict:
+    """
+    Fit on the fold's train window, then trade its test window.
+    """
+    df_1h, combos = _WF["df_1h"], _WF["combos"]
+    objective, equity = _WF["objective"], _WF["equity"]
+    lo = fold["lo"]
+    window = df_1h.iloc[lo:fold["test_hi"]]
+    spans_1h = sorted({s for p in combos for s in p["spans_1h"]})
+    spans_4h = sorted({s for p in combos for s in p["spans_4h"]})
+    cols = fold_features(_WF["cache"], _WF["symbol"], window, _WF["df_4h"],
+                         _WF["warmup_4h"], spans_1h, spans_4h)
+    col, index = cols.__getitem__, window.index
+    keys = list(combos[0])
+
+    a, b, c = fold["train_lo"] - lo, fold["train_hi"] - lo, fold["test_hi"] - lo
+    fits = [evaluate_arrays(p, col, index, a, b, equity) for p in combos]
+    best = max(fits, key=lambda r: _score(r, objective))
+    params = {k: best[k] for k in keys}
+    test = evaluate_arrays(params, col, index, b, c, equity)
+    return {
+        "fold": fold["fold"],
+        "train_start": index[a].isoformat(),
+        "test_start": index[b].isoformat(),
+        "test_end": index[c - 1].isoformat(),
+        "params": _json_params(params),
+        "train": {k: v for k, v in best.items() if k not in keys},
+        "test": {k: v for k, v in test.items() if k not in keys},
+    }
+
+
+def _read_jsonl(path: Path) -> list[dict]:
+    rows = []
+    with open(path) as f:
+        for line in f:
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError:
+                break  # torn last line from an interrupted write
+    return rows
+
+
+def run_walkforward(df_1h: pd.DataFrame, df_4h: pd.DataFrame, out: str,
+                    train: int, test: int, step: int | None = None,
+                    anchored: bool = False,
+                    warmup: int = LOOKBACK_1H, warmup_4h: int = LOOKBACK_4H,
+                    grid: dict | None = None,
+                    objective: str = "return_pct",
+                    symbol: str = SYMBOL,
+                    workers: int | None = None,
+                    cache_dir: str | None = None,
+                    equity: float = BASE_EQUITY) -> pd.DataFrame:
+    """
+    Run (or resume) a walk-forward into `out` and return one row per fold.
+    Indicator arrays are cached next to it (`<out>.cache/`) unless
+    `cache_dir` says otherwise.
+    """
+    df_1h, df_4h = df_1h.sort_index(), df_4h.sort_index()
+    grid = {**DEFAULT_GRID, **(grid or {})}
+    combos = combinations(grid)
+    folds = make_folds(len(df_1h), train, test, step, warmup, anchored)
+    header = {"run": {
+        "symbol": symbol, "train": train, "test": test, "step": step or test,
+        "anchored": anchored, "warmup": warmup, "warmup_4h": warmup_4h,
+        "objective": objective, "equity": equity,
+        "grid": {k: [list(v) if isinstance(v, tuple) else v for v in vals]
+                 for k, vals in grid.items()},
+        # the first bar fixes the fold grid; appending data adds folds
+        "first_bar": df_1h.index[0].isoformat(),
+    }}
+
+    path = Path(out)
+    if cache_dir is None:
+        cache_dir = path.with_suffix(".cache")
+    done = set()
+    if path.exists() and path.stat().st_size:
+        rows = _read_jsonl(path)
+        if not rows or rows[0] != json.loads(json.dumps(header)):
+            raise ValueError(f"{path} holds a different walk-forward run; "
+                             "pick another --out or delete it")
+        done = {r["fold"] for r in rows[1:]}
+        # drop a torn tail so appends start on a fresh line
+        with open(path, "w") as f:
+            for r in rows:
+                f.write(json.dumps(r) + "\n")
+    else:
+        with open(path, "w") as f:
+            f.write(json.dumps(header) + "\n")
+    pending = [f for f in folds if f["fold"] not in done]
+
+    init = (df_1h, df_4h, symbol, combos, objective, warmup_4h, cache_dir,
+            equity, data_fingerprint(df_1h, df_4h))
+    with open(path, "a") as sink:
+        def emit(row):
+            sink.write(json.dumps(row) + "\n")
+            sink.flush()
+
+        workers = workers or os.cpu_count() or 1
+        if workers == 1 or len(pending) <= 1:
+            _init(*init)
+            for fold in pending:
+                emit(run_fold(fold))
+        elif pending:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init,
+                                     initargs=init) as pool:
+                for fut in as_completed([pool.submit(run_fold, f)
+                                         for f in pending]):
+                    emit(fut.result())
+
+    return load_results(path)
+
+
+def load_results(path: str | Path) -> pd.DataFrame:
+    """
+    Fold rows of a walk-forward file, flattened (params.*, train.*,
+    test.*), in fold order.
+    """
+    rows = _read_jsonl(Path(path))[1:]
+    if not rows:
+        return pd.DataFrame()
+    table = pd.json_normalize(rows)
+    return table.sort_values("fold", ignore_index=True)
+
+
+def summary(table: pd.DataFrame) -> str:
+    if table.empty:
+        return "no folds"
+    oos = np.prod(1 + table["test.return_pct"].to_numpy() / 100) - 1
+    return (f"folds={len(table)} "
+            f"oos_return={oos * 100:.2f}% "
+            f"oos_trades={int(table['test.trades'].sum())} "
+            f"median_fold_return={table['test.return_pct'].median():.2f}% "
+            f"worst_fold_dd={table['test.max_drawdown_pct'].max():.2f}%")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("bars_1h")
+    ap.add_argument("bars_4h")
+    ap.add_argument("--train", type=int, default=2000, help="1h bars")
+    ap.add_argument("--test", type=int, default=500, help="1h bars")
+    ap.add_argument("--step", type=int, default=None)
+    ap.add_argument("--anchored", action="store_true")
+    ap.add_argument("--objective", default="return_pct")
+    ap.add_argument("--symbol", default=SYMBOL)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--out", default="walkforward.jsonl")
+    ap.add_argument("--cache-dir", default=None,
+                    help="indicator array cache (default: <out>.cache)")
+    args = ap.parse_args()
+
+    table = run_walkforward(
+        _read_bars(args.bars_1h), _read_bars(args.bars_4h), args.out,
+        args.train, args.test, args.step, args.anchored,
+        objective=args.objective, symbol=args.symbol, workers=args.workers,
+        cache_dir=args.cache_dir)
+    cols = ["fold", "test_start", "params.adx_threshold",
+            "params.cmo_threshold", "params.atr_trail_mult",
+            "train.return_pct", "test.return_pct", "test.trades"]
+    print(table[[c for c in cols if c in table.columns]].to_string(index=False))
+    print(summary(table))